@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 # encoding: utf-8
     
-def acoustics(use_petsc=False,kernel_language='Fortran',solver_type='classic',iplot=False,htmlplot=False,outdir='./_output',weno_order=5, disable_output=False):
+def acoustics(use_petsc=False,kernel_language='Fortran',solver_type='classic',iplot=False,htmlplot=False,outdir='./_output',weno_order=5, time_integrator='SSP104', error_tolerance=None, disable_output=False, num_cells=100):
     """
     This example solves the 1-dimensional acoustics equations in a homogeneous
     medium.
@@ -21,6 +21,8 @@ def acoustics(use_petsc=False,kernel_language='Fortran',solver_type='classic',ip
     elif solver_type=='sharpclaw':
         solver = pyclaw.SharpClawSolver1D()
         solver.weno_order=weno_order
+        solver.time_integrator=time_integrator
+        solver.error_tolerance=error_tolerance
     else: raise Exception('Unrecognized value of solver_type.')
 
     #========================================================================
@@ -44,7 +46,7 @@ def acoustics(use_petsc=False,kernel_language='Fortran',solver_type='classic',ip
     #========================================================================
     # Instantiate the domain and set the boundary conditions
     #========================================================================
-    x = pyclaw.Dimension('x',0.0,1.0,100)
+    x = pyclaw.Dimension('x',0.0,1.0,num_cells)
     domain = pyclaw.Domain(x)
     num_eqn = 2
     state = pyclaw.State(domain,num_eqn)
@@ -38,6 +38,602 @@ def test_1d_acoustics():
                                  kernel_languages=('Fortran',), solver_type='sharpclaw',
                                  weno_order=17, disable_output=True)
 
+    rk_tests      = gen_variants(acoustics, verify_expected(0.000231457789089),
+                                 kernel_languages=('Python',), solver_type='sharpclaw',
+                                 time_integrator='SSP43', error_tolerance=1e-5,
+                                 disable_output=True)
+
     from itertools import chain
-    for test in chain(classic_tests, sharp_tests, weno_tests):
+    for test in chain(classic_tests, sharp_tests, weno_tests, rk_tests):
         yield test
+
+
+def test_1d_acoustics_batch():
+    """test_1d_acoustics_batch
+
+    tests that the batched solvers give, for each member of a batch, the
+    solution of the member run alone """
+
+    import numpy as np
+    from clawpack import pyclaw
+    from clawpack.riemann import rp_acoustics
+
+    sound_speeds = [1., 1.5, 0.7]
+    pulses = [0.3, 0.5, 0.75]
+
+    def evolve(solver, state, domain):
+        solver.kernel_language = 'Python'
+        solver.num_waves = rp_acoustics.num_waves
+        solver.rp = rp_acoustics.rp_acoustics_1d
+        solver.bc_lower[0] = pyclaw.BC.wall
+        solver.bc_upper[0] = pyclaw.BC.extrap
+        solver.dt_initial = 0.001
+        solution = pyclaw.Solution(state, domain)
+        solver.evolve_to_time(solution, 0.5)
+        return solution.state.q
+
+    def check_batch(solver_class, batched_solver_class):
+        domain = pyclaw.Domain(pyclaw.Dimension('x', 0.0, 1.0, 100))
+        xc = domain.grid.x.centers
+        batch = pyclaw.BatchedState(domain, 2, batch_size=len(pulses))
+        batch.problem_data['cc'] = sound_speeds
+        batch.problem_data['zz'] = sound_speeds
+        batch.q[0, ...] = np.exp(-100 * (xc[:, np.newaxis] - pulses)**2)
+        batch.q[1, ...] = 0.
+        solver = batched_solver_class()
+        solver.dt_policy = 'member'
+        q_batch = evolve(solver, batch, domain)
+
+        for member in xrange(len(pulses)):
+            state = pyclaw.State(domain, 2)
+            state.problem_data['cc'] = sound_speeds[member]
+            state.problem_data['zz'] = sound_speeds[member]
+            state.q[0, :] = np.exp(-100 * (xc - pulses[member])**2)
+            state.q[1, :] = 0.
+            q = evolve(solver_class(), state, domain)
+            assert np.allclose(q, q_batch[..., member], rtol=1e-12, atol=1e-12)
+
+    yield check_batch, pyclaw.ClawSolver1D, pyclaw.BatchedClawSolver1D
+    yield check_batch, pyclaw.SharpClawSolver1D, pyclaw.BatchedSharpClawSolver1D
+
+
+def test_1d_acoustics_rk_registers():
+    """test_1d_acoustics_rk_registers
+
+    tests that changing the time integrator or the error tolerance after
+    setup gives the same solution as setting it before """
+
+    import numpy as np
+    from clawpack import pyclaw
+    from clawpack.riemann import rp_acoustics
+
+    def evolve(time_integrator, error_tolerance, after_setup):
+        solver = pyclaw.SharpClawSolver1D()
+        solver.kernel_language = 'Python'
+        solver.num_waves = rp_acoustics.num_waves
+        solver.rp = rp_acoustics.rp_acoustics_1d
+        solver.bc_lower[0] = pyclaw.BC.periodic
+        solver.bc_upper[0] = pyclaw.BC.periodic
+        domain = pyclaw.Domain(pyclaw.Dimension('x', 0.0, 1.0, 100))
+        state = pyclaw.State(domain, 2)
+        state.problem_data.update(rho=1., bulk=1., zz=1., cc=1.)
+        state.q[0, :] = np.exp(-100 * (domain.grid.x.centers - 0.5)**2)
+        state.q[1, :] = 0.
+        solution = pyclaw.Solution(state, domain)
+        if after_setup:
+            solver.time_integrator = 'Euler'
+            solver.setup(solution)
+        solver.time_integrator = time_integrator
+        solver.error_tolerance = error_tolerance
+        solver.evolve_to_time(solution, 0.2)
+        return solution.state.q
+
+    def check_registers(time_integrator, error_tolerance):
+        q = evolve(time_integrator, error_tolerance, False)
+        assert np.all(q == evolve(time_integrator, error_tolerance, True))
+
+    for time_integrator in ('SSP33', 'SSP43', 'BS32', 'SSP104'):
+        yield check_registers, time_integrator, None
+    for time_integrator in ('SSP33', 'SSP43', 'BS32'):
+        yield check_registers, time_integrator, 1e-4
+
+
+def test_1d_acoustics_timings():
+    """test_1d_acoustics_timings
+
+    tests that the phases of the steps are timed """
+
+    from acoustics import acoustics
+
+    def check_timings(solver_type):
+        claw = acoustics(kernel_language='Python', solver_type=solver_type,
+                         disable_output=True)
+        timings = claw.solver.timings
+        assert timings.steps > 0
+        assert timings.calls['hyperbolic'] >= timings.steps + timings.rejected_steps
+        for phase in ('q_bcs', 'hyperbolic', 'cfl', 'step', 'evolve_to_time', 'run'):
+            assert timings.seconds[phase] >= 0.
+        assert timings.calls['run'] == 1
+        assert 'hyperbolic' in claw.profile_report()
+
+    yield check_timings, 'classic'
+    yield check_timings, 'sharpclaw'
+
+
+def test_1d_acoustics_bc_hooks():
+    """test_1d_acoustics_bc_hooks
+
+    tests that the ghost cells are filled by qbc_lower/qbc_upper and
+    auxbc_lower/auxbc_upper when a solver class overrides them """
+
+    import numpy as np
+    from clawpack import pyclaw
+
+    class HookSolver(pyclaw.ClawSolver1D):
+        # The solver package (pyclaw) is found from the module of the class
+        __module__ = pyclaw.ClawSolver1D.__module__
+
+        def qbc_upper(self, state, dim, t, qbc, idim):
+            qbc[:, -self.num_ghost:, ...] = 1.
+
+        def auxbc_lower(self, state, dim, t, auxbc, idim):
+            auxbc[:, :self.num_ghost, ...] = 2.
+
+    domain = pyclaw.Domain(pyclaw.Dimension('x', 0.0, 1.0, 10))
+    state = pyclaw.State(domain, 2, 1)
+    state.q[0, :] = np.linspace(1., 2., 10)
+    state.q[1, :] = np.linspace(-1., 1., 10)
+    state.aux[0, :] = 3.
+
+    solver = HookSolver()
+    solver.bc_lower[0] = pyclaw.BC.wall
+    solver.bc_upper[0] = pyclaw.BC.extrap
+    solver.aux_bc_lower[0] = pyclaw.BC.extrap
+    solver.aux_bc_upper[0] = pyclaw.BC.extrap
+    solver.allocate_bc_arrays(state)
+    solver.apply_q_bcs(state)
+
+    num_ghost = solver.num_ghost
+    assert np.all(solver.qbc[:, -num_ghost:] == 1.)
+    assert np.all(solver.qbc[0, :num_ghost] == state.q[0, num_ghost-1::-1])
+    assert np.all(solver.qbc[1, :num_ghost] == -state.q[1, num_ghost-1::-1])
+    assert np.all(solver.auxbc[:, :num_ghost] == 2.)
+    assert np.all(solver.auxbc[:, -num_ghost:] == 3.)
+
+    solver.aux_bc_upper[0] = None
+    try:
+        solver.apply_aux_bcs(state)
+    except Exception as e:
+        assert 'aux_bc_upper' in str(e)
+    else:
+        assert False, 'unspecified aux boundary condition not reported'
+
+
+def test_1d_acoustics_aux_bcs():
+    """test_1d_acoustics_aux_bcs
+
+    tests that custom aux boundary conditions are applied at every step with
+    the current time, and that the ghost cells of aux are filled again after
+    aux is changed in place and mark_aux_changed is called """
+
+    import numpy as np
+    from clawpack import pyclaw
+
+    def check_aux_bcs(solver_type, custom):
+        claw = acoustics_controller(solver_type)
+        solver = claw.solver
+        state = claw.solution.state
+        state.aux = np.ones((1, state.grid.num_cells[0]), order='F')
+
+        times = []
+        def time_dependent_aux(state, dim, t, auxbc, num_ghost):
+            times.append(t)
+            auxbc[:, :num_ghost] = t
+        if custom:
+            solver.aux_bc_lower[0] = pyclaw.BC.custom
+            solver.user_aux_bc_lower = time_dependent_aux
+        else:
+            solver.aux_bc_lower[0] = pyclaw.BC.extrap
+        solver.aux_bc_upper[0] = pyclaw.BC.extrap
+
+        # Change aux in place after the tenth step
+        filled = []
+        def after_step(solver, solution):
+            num_ghost = solver.num_ghost
+            filled.append((solution.t, solver.auxbc[0, 0],
+                           solver.auxbc[0, num_ghost:-num_ghost].copy()))
+            if len(filled) == 10:
+                solution.state.aux[0, :] = 2.
+                solution.state.mark_aux_changed()
+        solver.after_step = after_step
+
+        claw.run()
+
+        assert len(filled) > 20
+        t_start = 0.
+        for i, (t, lower, interior) in enumerate(filled):
+            assert np.all(interior == (1. if i < 10 else 2.))
+            if custom:
+                # The boundary condition is called at the start of each
+                # step, and for SharpClaw also at its later stages
+                assert t_start in times
+                assert t_start - 1e-12 <= lower <= t + 1e-12
+            t_start = t
+
+    for solver_type in ('classic', 'sharpclaw'):
+        for custom in (True, False):
+            yield check_aux_bcs, solver_type, custom
+
+
+def acoustics_controller(solver_type='classic', use_petsc=False):
+    """Return a controller for a short run with the Python kernel, without
+    output"""
+
+    import numpy as np
+    if use_petsc:
+        import clawpack.petclaw as pyclaw
+    else:
+        from clawpack import pyclaw
+    from clawpack.riemann import rp_acoustics
+
+    if solver_type == 'sharpclaw':
+        solver = pyclaw.SharpClawSolver1D()
+    else:
+        solver = pyclaw.ClawSolver1D()
+    solver.kernel_language = 'Python'
+    solver.num_waves = rp_acoustics.num_waves
+    solver.rp = rp_acoustics.rp_acoustics_1d
+    solver.bc_lower[0] = pyclaw.BC.periodic
+    solver.bc_upper[0] = pyclaw.BC.periodic
+    solver.dt_initial = 0.001
+    domain = pyclaw.Domain(pyclaw.Dimension('x', 0.0, 1.0, 100))
+    state = pyclaw.State(domain, 2)
+    state.problem_data.update(rho=1., bulk=1., zz=1., cc=1.)
+    xc = domain.grid.x.centers
+    state.q[0, :] = np.exp(-100 * (xc - 0.75)**2)
+    state.q[1, :] = 0.
+    claw = pyclaw.Controller()
+    claw.solution = pyclaw.Solution(state, domain)
+    claw.solver = solver
+    claw.output_format = None
+    claw.num_output_times = 5
+    claw.tfinal = 0.5
+    return claw
+
+
+def test_1d_acoustics_checkpoint():
+    """test_1d_acoustics_checkpoint
+
+    tests that a run interrupted after a checkpoint and restarted from it
+    ends with the solution of an uninterrupted run """
+
+    import shutil
+    import tempfile
+    import numpy as np
+
+    class Interrupted(Exception):
+        pass
+
+    def controller(checkpoint_dir):
+        claw = acoustics_controller()
+        claw.checkpoint_dir = checkpoint_dir
+        claw.checkpoint_interval = 5
+        return claw
+
+    checkpoint_dir = tempfile.mkdtemp()
+    try:
+        uninterrupted = controller(checkpoint_dir)
+        uninterrupted.run()
+        previous = uninterrupted.checkpoint_numbers(checkpoint_dir)
+
+        interrupted = controller(checkpoint_dir)
+        steps = []
+        def after_step(solver, solution):
+            steps.append(solution.t)
+            if len(steps) == 12:
+                raise Interrupted()
+        interrupted.solver.after_step = after_step
+        try:
+            interrupted.run()
+        except Interrupted:
+            pass
+        else:
+            assert False, 'run was not interrupted'
+        assert interrupted.solver.after_step is after_step
+        # The checkpoints of the first run are kept
+        numbers = interrupted.checkpoint_numbers(checkpoint_dir)
+        assert set(previous) < set(numbers)
+
+        restarted = controller(checkpoint_dir)
+        restarted.restart()
+        assert restarted.solution.t == uninterrupted.solution.t
+        assert np.all(restarted.solution.state.q == uninterrupted.solution.state.q)
+    finally:
+        shutil.rmtree(checkpoint_dir, ignore_errors=True)
+
+
+def test_1d_acoustics_async_output():
+    """test_1d_acoustics_async_output
+
+    tests that the frames written in the background are the frames written
+    by a run without async_output """
+
+    import filecmp
+    import os
+    import shutil
+    import tempfile
+
+    outdir = tempfile.mkdtemp()
+    try:
+        for async_output in (False, True):
+            claw = acoustics_controller()
+            claw.output_format = 'ascii'
+            claw.outdir = os.path.join(outdir, str(async_output))
+            claw.async_output = async_output
+            claw.output_queue_size = 1
+            claw.run()
+        files = sorted(os.listdir(os.path.join(outdir, 'False')))
+        assert len(files) == 2 * (claw.num_output_times + 1)
+        assert files == sorted(os.listdir(os.path.join(outdir, 'True')))
+        match, mismatch, errors = filecmp.cmpfiles(os.path.join(outdir, 'False'),
+                                                   os.path.join(outdir, 'True'),
+                                                   files, shallow=False)
+        assert mismatch == [] and errors == []
+    finally:
+        shutil.rmtree(outdir, ignore_errors=True)
+
+
+def test_1d_acoustics_frame_store():
+    """test_1d_acoustics_frame_store
+
+    tests access to the frames kept by the controller and the memory cap
+    of the frame store """
+
+    import numpy as np
+    from clawpack import pyclaw
+
+    claw = acoustics_controller()
+    claw.keep_copy = True
+    claw.run()
+    frames = claw.frames
+    assert len(frames) == claw.num_output_times + 1
+    assert [frame.t for frame in frames[0:2]] == [0., 0.1]
+    assert frames[-1] is frames[claw.num_output_times]
+    assert frames[-1].t == claw.solution.t
+    assert np.all(frames[-1].state.q == claw.solution.state.q)
+    claw.solution.state.problem_data['rho'] = 2.
+    assert frames[0].state.problem_data['rho'] == 1.
+
+    domain = pyclaw.Domain(pyclaw.Dimension('x', 0.0, 1.0, 10))
+    state = pyclaw.State(domain, 2, 1)
+    solution = pyclaw.Solution(state, domain)
+    for compression in (None, 1):
+        store = pyclaw.frame_store.FrameStore(max_memory=2400,
+                                              compression=compression)
+        for n in xrange(20):
+            state.q[...] = n
+            state.aux[...] = -n
+            solution.t = 0.1 * n
+            store.append(solution)
+            assert store.nbytes <= store.max_memory
+        for n, frame in enumerate(store):
+            assert frame.t == 0.1 * n
+            assert np.all(frame.state.q == n) and np.all(frame.state.aux == -n)
+        store.close()
+
+
+def test_1d_acoustics_petclaw_frame_store():
+    """test_1d_acoustics_petclaw_frame_store
+
+    tests that the frames kept by a PetClaw run are accessed collectively
+    and hold the solution """
+    from nose import SkipTest
+    try:
+        import petsc4py
+    except ImportError:
+        raise SkipTest("Unable to import petsc4py, is it installed?")
+
+    import numpy as np
+    from clawpack.petclaw.frame_store import FrameStore
+    from acoustics import acoustics
+
+    claw = acoustics(use_petsc=True, kernel_language='Python',
+                     disable_output=True)
+    frames = claw.frames
+    assert isinstance(frames, FrameStore)
+    assert frames[-1] is frames[claw.num_output_times]
+    q = frames[-1].state.get_q_global()
+    if q is not None:
+        assert np.all(q == claw.solution.state.get_q_global())
+    assert [frame.t for frame in frames[0:2]] == [0., 0.2]
+
+
+def test_1d_acoustics_gauges():
+    """test_1d_acoustics_gauges
+
+    tests that compute_gauge_values is called for each gauge, or once for
+    all gauges if gauge_values_vectorized is set, with the same results """
+
+    import os
+    import shutil
+    import tempfile
+    import numpy as np
+
+    shapes = []
+    def energy(q, aux):
+        shapes.append(q.shape)
+        return q[0]**2 + q[1]**2
+
+    outdir = tempfile.mkdtemp()
+    try:
+        gauge_data = []
+        for vectorized in (False, True):
+            claw = acoustics_controller()
+            claw.outdir = os.path.join(outdir, str(vectorized))
+            claw.solution.state.keep_gauges = True
+            claw.solution.domain.grid.add_gauges([(0.3,), (0.71,)])
+            claw.solver.compute_gauge_values = energy
+            claw.solver.gauge_values_vectorized = vectorized
+            del shapes[:]
+            claw.run()
+            assert set(shapes) == set([(2, 2)] if vectorized else [(2,)])
+            gauge_data.append(np.array(claw.solution.state.gauge_data))
+        assert gauge_data[0].shape == gauge_data[1].shape
+        assert np.all(gauge_data[0] == gauge_data[1])
+    finally:
+        shutil.rmtree(outdir, ignore_errors=True)
+
+
+def test_1d_acoustics_gauge_interpolation():
+    """test_1d_acoustics_gauge_interpolation
+
+    tests that linearly interpolated gauge values near the periodic edges
+    of the grid use the ghost cells """
+
+    import shutil
+    import tempfile
+    import numpy as np
+
+    gauges = [0.001, 0.3333, 0.999]
+    outdir = tempfile.mkdtemp()
+    try:
+        claw = acoustics_controller()
+        claw.outdir = outdir
+        state = claw.solution.state
+        grid = claw.solution.domain.grid
+        state.keep_gauges = True
+        grid.gauge_interpolation = 'linear'
+        grid.add_gauges([(x,) for x in gauges])
+        claw.run()
+        q = state.q
+        n = grid.num_cells[0]
+        for x, gauge_data in zip(gauges, state.gauge_data):
+            s = x / grid.delta[0] - 0.5
+            left = int(np.floor(s))
+            w = s - left
+            expected = (1. - w) * q[:, left % n] + w * q[:, (left + 1) % n]
+            assert gauge_data[-1, 0] == state.t
+            assert np.allclose(gauge_data[-1, 1:], expected, rtol=1.e-14, atol=0.)
+    finally:
+        shutil.rmtree(outdir, ignore_errors=True)
+
+
+def test_1d_acoustics_fused_riemann_solves():
+    """test_1d_acoustics_fused_riemann_solves
+
+    tests that the fused Riemann solves of the SharpClaw Python kernel give
+    the results of the separate solves, and that the waves of the wave-based
+    reconstruction are reused only when a rejected step is retaken """
+
+    import numpy as np
+
+    for char_decomp in (0, 1):
+        q = []
+        for fuse in (False, True):
+            claw = acoustics_controller('sharpclaw')
+            claw.solver.char_decomp = char_decomp
+            claw.solver.fuse_riemann_solves = fuse
+            claw.run()
+            q.append(claw.solution.state.q)
+        assert np.all(q[0] == q[1])
+
+    # The first step is rejected (its CFL number is 10), which is detected
+    # after its first stage; each evaluation of dq solves three sets of
+    # Riemann problems, except the first stage of a retaken step
+    claw = acoustics_controller('sharpclaw')
+    solver = claw.solver
+    solver.char_decomp = 1
+    solver.dt_initial = 0.1
+    solver.setup(claw.solution)
+    calls = {'rp': 0, 'dq': 0, 'step': 0}
+    def counted(f, name):
+        def g(*args):
+            calls[name] += 1
+            return f(*args)
+        return g
+    solver.rp = counted(solver.rp, 'rp')
+    solver.dq = counted(solver.dq, 'dq')
+    solver.step = counted(solver.step, 'step')
+    status = solver.evolve_to_time(claw.solution, 0.2)
+    rejected = calls['step'] - status['numsteps']
+    assert rejected > 0
+    assert calls['rp'] == 3 * calls['dq'] - rejected
+
+
+def test_1d_acoustics_ensemble():
+    """test_1d_acoustics_ensemble
+
+    tests a two-member ensemble of acoustics runs, resumed from its
+    journal """
+
+    import os
+    import shutil
+    import tempfile
+    import numpy as np
+    from clawpack.pyclaw import ensemble
+    from acoustics import acoustics
+
+    members = ensemble.parameter_grid(kernel_language=['Python'],
+                                      disable_output=[True],
+                                      num_cells=[50, 100])
+    outdir = tempfile.mkdtemp()
+    try:
+        journal = os.path.join(outdir, 'sweep.journal')
+        results = sorted(ensemble.run_ensemble(acoustics, members, processes=2,
+                                               journal=journal),
+                         key=lambda result: result.index)
+        assert [result.error for result in results] == [None, None]
+        assert not any(result.resumed for result in results)
+        for result, num_cells in zip(results, (50, 100)):
+            assert result.value['q'].shape == (2, num_cells)
+            assert result.value['t'] == 1.
+            assert result.value['status']['numsteps'] > 0
+
+        resumed = sorted(ensemble.run_ensemble(acoustics, members, journal=journal),
+                         key=lambda result: result.index)
+        assert all(result.resumed for result in resumed)
+        for result, previous in zip(resumed, results):
+            assert result.kwargs == previous.kwargs
+            assert np.all(result.value['q'] == previous.value['q'])
+
+        result, = ensemble.run_ensemble(acoustics, members[:1], reduce_output=None)
+        assert result.value is None and 'Controller' in result.error
+    finally:
+        shutil.rmtree(outdir, ignore_errors=True)
+
+
+def test_1d_acoustics_deferred_cfl():
+    """test_1d_acoustics_deferred_cfl
+
+    tests that PetClaw runs with the deferred reduction of the CFL number
+    give the results of runs with a reduction at each stage, and that
+    checking the CFL number only every few steps retakes the steps whose
+    CFL number is too large """
+
+    from nose import SkipTest
+    try:
+        import petsc4py
+    except ImportError:
+        raise SkipTest("Unable to import petsc4py, is it installed?")
+    import numpy as np
+
+    for solver_type in ('classic', 'sharpclaw'):
+        q = []
+        for deferred in (False, True):
+            claw = acoustics_controller(solver_type, use_petsc=True)
+            # Start with a time step that is rejected
+            claw.solver.dt_initial = 0.05
+            claw.solver.cfl.deferred = deferred
+            claw.run()
+            q.append(claw.solution.state.get_q_global())
+        if q[0] is not None:
+            assert np.all(q[0] == q[1])
+
+        claw = acoustics_controller(solver_type, use_petsc=True)
+        claw.solver.dt_initial = 0.05
+        claw.solver.cfl.deferred = True
+        claw.solver.cfl.check_interval = 3
+        claw.run()
+        q_interval = claw.solution.state.get_q_global()
+        if q[0] is not None:
+            assert np.max(np.abs(q_interval - q[0])) < 2.e-2
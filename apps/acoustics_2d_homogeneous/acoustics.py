@@ -3,7 +3,8 @@
 
 import numpy as np
 
-def acoustics2D(iplot=False,kernel_language='Fortran',htmlplot=False,use_petsc=False,outdir='./_output',solver_type='classic',  disable_output=False):
+def acoustics2D(iplot=False,kernel_language='Fortran',htmlplot=False,use_petsc=False,outdir='./_output',solver_type='classic',  disable_output=False,num_cells=(100,100),
+                dimensional_split=True,num_threads=1,overlap_ghost_exchange=False):
     """
     Example python script for solving the 2d acoustics equations.
     """
@@ -15,16 +16,24 @@ def acoustics2D(iplot=False,kernel_language='Fortran',htmlplot=False,use_petsc=F
 
     if solver_type=='classic':
         solver=pyclaw.ClawSolver2D()
-        solver.dimensional_split=True
+        solver.dimensional_split=dimensional_split
+        solver.num_threads=num_threads
+        solver.overlap_ghost_exchange=overlap_ghost_exchange
     elif solver_type=='sharpclaw':
         solver=pyclaw.SharpClawSolver2D()
 
-    if kernel_language != 'Fortran':
+    if kernel_language == 'Python':
+        if solver_type != 'classic':
+            raise Exception('The Python kernel is only available for the classic solver in 2D')
+        solver.kernel_language = 'Python'
+        solver.rp = rpn2_acoustics
+        solver.rp_transverse = rpt2_acoustics
+    elif kernel_language == 'Fortran':
+        from clawpack.riemann import rp2_acoustics
+        solver.rp = rp2_acoustics
+    else:
         raise Exception('Unrecognized value of kernel_language for 2D acoustics')
 
-    from clawpack.riemann import rp2_acoustics
-    solver.rp = rp2_acoustics
-
     solver.cfl_max = 0.5
     solver.cfl_desired = 0.45
 
@@ -37,7 +46,7 @@ def acoustics2D(iplot=False,kernel_language='Fortran',htmlplot=False,use_petsc=F
     solver.bc_upper[1]=pyclaw.BC.extrap
 
     # Initialize domain
-    mx=100; my=100
+    mx,my = num_cells
     x = pyclaw.Dimension('x',-1.0,1.0,mx)
     y = pyclaw.Dimension('y',-1.0,1.0,my)
     domain = pyclaw.Domain([x,y])
@@ -91,6 +100,53 @@ def qinit(state,width=0.2):
     state.q[1,:,:] = 0.
     state.q[2,:,:] = 0.
 
+def rpn2_acoustics(q_l,q_r,aux_l,aux_r,problem_data,idir):
+    """
+    Riemann solver for constant coefficient acoustics in 2D, normal to
+    direction idir, for the Python kernel.
+    """
+    num_eqn, num_rp = q_l.shape
+    zz = problem_data['zz']
+    cc = problem_data['cc']
+    mu = 1 + idir
+
+    delta = q_r - q_l
+    a1 = (-delta[0,:] + zz*delta[mu,:]) / (2.0*zz)
+    a2 = ( delta[0,:] + zz*delta[mu,:]) / (2.0*zz)
+
+    wave = np.zeros( (num_eqn, 2, num_rp) )
+    s = np.empty( (2, num_rp) )
+    wave[0,0,:] = -a1*zz
+    wave[mu,0,:] = a1
+    s[0,:] = -cc
+    wave[0,1,:] = a2*zz
+    wave[mu,1,:] = a2
+    s[1,:] = cc
+
+    amdq = s[0,:]*wave[:,0,:]
+    apdq = s[1,:]*wave[:,1,:]
+    return wave, s, amdq, apdq
+
+def rpt2_acoustics(q_l,q_r,aux_below,aux_center,aux_above,problem_data,idir,imp,asdq):
+    """
+    Split the fluctuations asdq normal to direction idir into down- and
+    up-going fluctuations in the transverse direction.
+    """
+    zz = problem_data['zz']
+    cc = problem_data['cc']
+    mv = 2 - idir
+
+    a1 = (-asdq[0,:] + zz*asdq[mv,:]) / (2.0*zz)
+    a2 = ( asdq[0,:] + zz*asdq[mv,:]) / (2.0*zz)
+
+    bmasdq = np.zeros(asdq.shape)
+    bpasdq = np.zeros(asdq.shape)
+    bmasdq[0,:] = cc*a1*zz
+    bmasdq[mv,:] = -cc*a1
+    bpasdq[0,:] = cc*a2*zz
+    bpasdq[mv,:] = cc*a2
+    return bmasdq, bpasdq
+
 if __name__=="__main__":
     import sys
     from clawpack.pyclaw.util import run_app_from_main
@@ -25,7 +25,7 @@ def test_2d_acoustics():
     from acoustics import acoustics2D
 
     classic_tests = gen_variants(acoustics2D, verify_data('verify_classic.txt'),
-                                 kernel_languages=('Fortran',), solver_type='classic', disable_output=True)
+                                 kernel_languages=('Fortran','Python'), solver_type='classic', disable_output=True)
 
     sharp_tests   = gen_variants(acoustics2D, verify_data('verify_sharpclaw.txt'),
                                  kernel_languages=('Fortran',), solver_type='sharpclaw', disable_output=True)
@@ -33,3 +33,43 @@ def test_2d_acoustics():
     from itertools import chain
     for test in chain(classic_tests, sharp_tests):
         yield test
+
+def test_2d_acoustics_threads():
+    """test_2d_acoustics_threads
+
+    tests that the classic Fortran kernel gives the same results on tiles
+    computed by two threads as on the whole grid """
+
+    def check_threads(dimensional_split):
+        import numpy as np
+        from acoustics import acoustics2D
+
+        q = [acoustics2D(kernel_language='Fortran', solver_type='classic',
+                         disable_output=True, dimensional_split=dimensional_split,
+                         num_threads=num_threads).q
+             for num_threads in (1, 2)]
+        assert np.all(q[0] == q[1])
+
+    for dimensional_split in (True, False):
+        yield check_threads, dimensional_split
+
+def test_2d_acoustics_overlap_ghost_exchange():
+    """test_2d_acoustics_overlap_ghost_exchange
+
+    tests that PetClaw gives the same results when the ghost cell exchange
+    is overlapped with the update of the interior cells as when it is not """
+    from nose import SkipTest
+    try:
+        import petsc4py
+    except ImportError:
+        raise SkipTest("Unable to import petsc4py, is it installed?")
+
+    import numpy as np
+    from acoustics import acoustics2D
+
+    q = [acoustics2D(kernel_language='Fortran', solver_type='classic',
+                     use_petsc=True, disable_output=True, dimensional_split=False,
+                     overlap_ghost_exchange=overlap).get_q_global()
+         for overlap in (False, True)]
+    if q[0] is not None:
+        assert np.all(q[0] == q[1])
@@ -77,3 +77,122 @@ def test_acoustics_2d_variable_io():
         except OSError as (errno, strerror):
             print ERROR_STR % {'path' : tempdir, 'error': strerror }
 
+
+
+def io_test_solution(num_cells, num_eqn=3, num_aux=2):
+    """Return a Solution with random q and aux on a grid of num_cells cells"""
+    import numpy as np
+    from clawpack import pyclaw
+
+    names = ['x', 'y', 'z']
+    dimensions = [pyclaw.Dimension(names[i], -1.0, 1.0 + i, n)
+                  for i, n in enumerate(num_cells)]
+    domain = pyclaw.Domain(dimensions)
+    state = pyclaw.State(domain, num_eqn, num_aux)
+    state.t = 0.375
+    random = np.random.RandomState(0)
+    state.q[...] = random.standard_normal(state.q.shape)
+    state.aux[...] = random.standard_normal(state.aux.shape)
+    return pyclaw.Solution(state, domain)
+
+
+def check_io_round_trip(solution, file_format, read_options={}, rtol=0.):
+    """Write solution as frames 0 (with aux) and 1 in file_format, read them
+    back and check that they are unchanged (up to rtol)"""
+    import shutil
+    import tempfile
+    import numpy as np
+    from clawpack import pyclaw
+
+    path = tempfile.mkdtemp()
+    try:
+        solution.write(0, path, file_format=file_format, write_aux=True)
+        solution.write(1, path, file_format=file_format, write_aux=False)
+        for frame in (0, 1):
+            read = pyclaw.Solution()
+            read.read(frame, path, file_format=file_format, read_aux=True,
+                      options=read_options)
+            assert read.t == solution.t
+            assert read.domain.patch.num_cells_global == list(num_cells)
+            assert np.allclose(read.domain.grid.lower, solution.domain.grid.lower)
+            assert np.allclose(read.domain.grid.upper, solution.domain.grid.upper)
+            # aux of frame 1 is read from frame 0
+            assert np.allclose(read.state.q, solution.state.q, rtol=rtol, atol=0.)
+            assert np.allclose(read.state.aux, solution.state.aux, rtol=rtol, atol=0.)
+    finally:
+        shutil.rmtree(path)
+
+
+def test_io_binary_round_trip():
+    """Test writing and reading back frames in the binary format"""
+    solution = io_test_solution((7, 5))
+    yield check_io_round_trip, solution, 'binary'
+    yield check_io_round_trip, solution, 'binary', {'mmap_mode': None}
+    yield check_io_round_trip, io_test_solution((4, 3, 5)), 'binary', {'mmap_mode': 'r'}
+
+
+def test_io_ascii_round_trip():
+    """Test writing and reading back 1D, 2D and 3D frames in the ascii format"""
+    # The ascii format has 8 significant digits
+    for num_cells in ((9,), (7, 5), (4, 3, 5)):
+        yield check_io_round_trip, io_test_solution(num_cells), 'ascii', {}, 1e-7
+
+
+def check_petclaw_io_round_trip(num_cells, file_format):
+    """Write a PetClaw solution with random q and aux as frames 0 (with aux)
+    and 1 in file_format, read them back and check that they are unchanged"""
+    import shutil
+    import tempfile
+    import numpy as np
+    from clawpack import petclaw
+
+    names = ['x', 'y', 'z']
+    dimensions = [petclaw.Dimension(names[i], -1.0, 1.0 + i, n)
+                  for i, n in enumerate(num_cells)]
+    domain = petclaw.Domain(dimensions)
+    state = petclaw.State(domain, 3, 2)
+    state.t = 0.375
+    # Every process draws the whole arrays and keeps the cells it owns
+    random = np.random.RandomState(0)
+    q = random.standard_normal((3,) + tuple(num_cells))
+    aux = random.standard_normal((2,) + tuple(num_cells))
+    owned = (slice(None),) + tuple(slice(start, end)
+                                   for start, end in state.q_da.getRanges())
+    state.q = q[owned]
+    state.aux = aux[owned]
+    solution = petclaw.Solution(state, domain)
+
+    path = tempfile.mkdtemp()
+    try:
+        solution.write(0, path, file_format=file_format, write_aux=True)
+        solution.write(1, path, file_format=file_format, write_aux=False)
+        for frame, read_aux in ((0, True), (1, False)):
+            read = petclaw.Solution()
+            read.read(frame, path, file_format=file_format, read_aux=read_aux)
+            assert read.t == solution.t
+            assert read.domain.patch.num_cells_global == list(num_cells)
+            read_q = read.state.get_q_global()
+            if read_q is not None:
+                assert np.all(read_q == q)
+            if read_aux:
+                read_aux_values = read.state.get_aux_global()
+                if read_aux_values is not None:
+                    assert np.all(read_aux_values == aux)
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def test_petclaw_io_hdf5_round_trip():
+    """Test writing and reading back PetClaw frames in the hdf5 format"""
+    from nose import SkipTest
+    try:
+        import petsc4py
+    except ImportError:
+        raise SkipTest("Unable to import petsc4py, is it installed?")
+    try:
+        import h5py
+    except ImportError:
+        raise SkipTest("Unable to import h5py, is it installed?")
+
+    for num_cells in ((9,), (7, 5), (4, 3, 5)):
+        yield check_petclaw_io_round_trip, num_cells, 'hdf5'
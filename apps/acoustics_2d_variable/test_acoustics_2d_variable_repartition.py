@@ -0,0 +1,94 @@
+r"""
+Test that PetClaw output can be read by a run on a different number of
+processes.  The application is run on one number of processes, its output
+is read on another one, checked and written again as HDF5, and this file is
+read and checked on the first number of processes.  The runs are started
+with mpiexec, so this test must not itself be run under MPI.
+"""
+import os
+import sys
+
+thisdir = os.path.dirname(os.path.abspath(__file__))
+thisfile = os.path.splitext(os.path.abspath(__file__))[0] + '.py'
+verify_dir = os.path.join(thisdir,'io_test_verification')
+
+def check_frame(frame,path,file_format,read_aux):
+    r"""
+    Read frame in file_format from path and compare it with the expected
+    values.  Return whether they agree (always True except on process 0)
+    and the solution read.
+    """
+    from clawpack import pyclaw, petclaw
+    from clawpack.pyclaw.util import check_diff
+
+    expected = pyclaw.Solution()
+    expected.read(frame,path=verify_dir,file_format='ascii',read_aux=read_aux)
+    solution = petclaw.Solution()
+    solution.read(frame,path=path,file_format=file_format,read_aux=read_aux)
+    if read_aux:
+        test, reference = solution.state.get_aux_global(), expected.state.aux
+    else:
+        test, reference = solution.state.get_q_global(), expected.state.q
+    if test is None:
+        return True, solution
+    return check_diff(reference,test,reltol=1e-4) is None, solution
+
+def read_frames(path,file_format):
+    r"""
+    Check the aux array of frame 0 and q of frame 20 in file_format, and
+    write them again as HDF5 files (after checking petsc files) if parallel
+    HDF5 is available.
+    """
+    passed = True
+    for frame,read_aux in ((0,True),(20,False)):
+        frame_passed, solution = check_frame(frame,path,file_format,read_aux)
+        passed = passed and frame_passed
+        if file_format == 'petsc' and parallel_hdf5():
+            solution.write(frame,path,'hdf5',write_aux=read_aux)
+    return passed
+
+def parallel_hdf5():
+    try:
+        import h5py
+    except ImportError:
+        return False
+    return h5py.get_config().mpi
+
+def mpiexec(num_procs,*args):
+    import subprocess
+    return subprocess.call(['mpiexec','-n',str(num_procs),sys.executable]+list(args),
+                           cwd=thisdir)
+
+def run_repartition(write_procs,read_procs):
+    import shutil
+    import tempfile
+    outdir = tempfile.mkdtemp()
+    try:
+        assert mpiexec(write_procs,'acoustics.py','use_petsc=True','outdir=%s' % outdir) == 0
+        assert mpiexec(read_procs,thisfile,outdir,'petsc') == 0, \
+            'petsc output of %s processes read on %s processes differs' % (write_procs,read_procs)
+        if parallel_hdf5():
+            assert mpiexec(write_procs,thisfile,outdir,'hdf5') == 0, \
+                'hdf5 output of %s processes read on %s processes differs' % (read_procs,write_procs)
+    finally:
+        shutil.rmtree(outdir,ignore_errors=True)
+
+def test_acoustics_2d_variable_repartition():
+    """Test reading 2D variable-coefficient acoustics output on a different number of processes"""
+    from distutils.spawn import find_executable
+    from nose import SkipTest
+    try:
+        import petsc4py
+    except ImportError:
+        raise SkipTest("Unable to import petsc4py, is it installed?")
+    if find_executable('mpiexec') is None:
+        raise SkipTest("mpiexec not found")
+    if 'OMPI_COMM_WORLD_SIZE' in os.environ or 'PMI_SIZE' in os.environ:
+        raise SkipTest("Cannot start MPI runs from an MPI run")
+
+    for write_procs,read_procs in ((1,4),(4,1),(2,3)):
+        yield run_repartition, write_procs, read_procs
+
+if __name__ == '__main__':
+    # mpiexec -n <n> python test_acoustics_2d_variable_repartition.py <path> <format>
+    sys.exit(0 if read_frames(sys.argv[1],sys.argv[2]) else 1)
@@ -3,7 +3,7 @@
 
 import numpy as np
 
-def acoustics3D(iplot=False,htmlplot=False,use_petsc=False,outdir='./_output',solver_type='classic',disable_output=False,**kwargs):
+def acoustics3D(iplot=False,htmlplot=False,use_petsc=False,outdir='./_output',solver_type='classic',disable_output=False,num_cells=None,kernel_language='Fortran',**kwargs):
     """
     Example python script for solving the 3d acoustics equations.
     """
@@ -18,8 +18,15 @@ def acoustics3D(iplot=False,htmlplot=False,use_petsc=False,outdir='./_output',so
     else:
         raise Exception('Unrecognized solver_type.')
 
-    from clawpack import riemann
-    solver.rp = riemann.rp3_vc_acoustics
+    if kernel_language == 'Python':
+        solver.kernel_language = 'Python'
+        solver.rp = rpn3_vc_acoustics
+        solver.rp_transverse = rpt3_vc_acoustics
+    elif kernel_language == 'Fortran':
+        from clawpack import riemann
+        solver.rp = riemann.rp3_vc_acoustics
+    else:
+        raise Exception('Unrecognized value of kernel_language for 3D acoustics')
     solver.num_waves = 2
     solver.limiters = pyclaw.limiters.tvd.MC
 
@@ -67,6 +74,9 @@ def acoustics3D(iplot=False,htmlplot=False,use_petsc=False,outdir='./_output',so
 
     solver.limiters = pyclaw.limiters.tvd.MC
 
+    if num_cells is not None:
+        mx,my,mz = num_cells
+
     # Initialize domain
     x = pyclaw.Dimension('x',-1.0,1.0,mx)
     y = pyclaw.Dimension('y',-1.0,1.0,my)
@@ -146,6 +156,55 @@ def acoustics3D(iplot=False,htmlplot=False,use_petsc=False,outdir='./_output',so
         
         return
 
+def rpn3_vc_acoustics(q_l,q_r,aux_l,aux_r,problem_data,idir):
+    """
+    Riemann solver for variable coefficient acoustics in 3D, normal to
+    direction idir, for the Python kernel.  aux[0] is the impedance and
+    aux[1] the sound speed.
+    """
+    num_eqn, num_rp = q_l.shape
+    z_l = aux_l[0,:]
+    z_r = aux_r[0,:]
+    mu = 1 + idir
+
+    delta = q_r - q_l
+    a1 = (-delta[0,:] + z_r*delta[mu,:]) / (z_l + z_r)
+    a2 = ( delta[0,:] + z_l*delta[mu,:]) / (z_l + z_r)
+
+    wave = np.zeros( (num_eqn, 2, num_rp) )
+    s = np.empty( (2, num_rp) )
+    wave[0,0,:] = -a1*z_l
+    wave[mu,0,:] = a1
+    s[0,:] = -aux_l[1,:]
+    wave[0,1,:] = a2*z_r
+    wave[mu,1,:] = a2
+    s[1,:] = aux_r[1,:]
+
+    amdq = s[0,:]*wave[:,0,:]
+    apdq = s[1,:]*wave[:,1,:]
+    return wave, s, amdq, apdq
+
+def rpt3_vc_acoustics(q_l,q_r,aux_below,aux_center,aux_above,problem_data,idir,imp,asdq,jdir):
+    """
+    Split the fluctuations asdq into down- and up-going fluctuations in
+    the transverse direction jdir.
+    """
+    z_below = aux_below[0,:]
+    z = aux_center[0,:]
+    z_above = aux_above[0,:]
+    mt = 1 + jdir
+
+    a1 = (-asdq[0,:] + z*asdq[mt,:]) / (z_below + z)
+    a2 = ( asdq[0,:] + z*asdq[mt,:]) / (z + z_above)
+
+    bmasdq = np.zeros(asdq.shape)
+    bpasdq = np.zeros(asdq.shape)
+    bmasdq[0,:] = aux_below[1,:]*a1*z_below
+    bmasdq[mt,:] = -aux_below[1,:]*a1
+    bpasdq[0,:] = aux_above[1,:]*a2*z_above
+    bpasdq[mt,:] = aux_above[1,:]*a2
+    return bmasdq, bpasdq
+
 if __name__=="__main__":
     import sys
     from clawpack.pyclaw.util import run_app_from_main
@@ -31,7 +31,7 @@ def test_3d_acoustics():
                                        disable_output=True)
 
     heterogeneous_tests = gen_variants(acoustics3D, acoustics_verify_heterogeneous,
-                                       kernel_languages=('Fortran',), 
+                                       kernel_languages=('Fortran','Python'), 
                                        solver_type='classic', test='heterogeneous',
                                        disable_output=True)
     
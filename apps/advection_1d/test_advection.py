@@ -33,7 +33,7 @@ def test_1d_advection():
                                  solver_type='sharpclaw', outdir=None)
 
     weno_tests    = gen_variants(advection, verify_expected(7.489618e-06),
-                                 kernel_languages=('Fortran',),
+                                 kernel_languages=('Python','Fortran'),
                                  solver_type='sharpclaw', weno_order=17,
                                  outdir=None)
 
@@ -41,5 +41,75 @@ def test_1d_advection():
     for test in chain(classic_tests, sharp_tests, weno_tests):
         yield test
 
+def check_weno_order(k, use_compiled):
+    """Check the WENO reconstruction of order k against known results"""
+    import numpy as np
+    from fractions import Fraction
+    from nose import SkipTest
+    from clawpack.pyclaw.limiters import recon
+    from clawpack.pyclaw.limiters.reconstruct import WENOReconstructor
+
+    weno = WENOReconstructor(k, use_compiled=use_compiled)
+    if use_compiled and not weno.compiled:
+        raise SkipTest("The compiled WENO reconstruction of order %s is not built" % k)
+    k2 = (k+1)/2
+
+    # Optimal weights and coefficients of the fifth order reconstruction
+    # (Jiang and Shu, 1996) and exactness of the linear reconstruction of
+    # order k for the polynomials of degree k-1
+    coefficients, weights, betas = recon.weno_coefficients(k)
+    if k == 5:
+        assert np.allclose(weights, [[0.1, 0.6, 0.3], [0.3, 0.6, 0.1]])
+        assert np.allclose(coefficients[1], [[1./3, 5./6, -1./6],
+                                             [-1./6, 5./6, 1./3],
+                                             [1./3, -7./6, 11./6]])
+    for p in xrange(k):
+        # Averages of x**p over the cells [j-1/2,j+1/2], j = -(k2-1),...,k2-1
+        averages = [float((Fraction(2*j+1, 2)**(p+1) - Fraction(2*j-1, 2)**(p+1))/(p+1))
+                    for j in xrange(-(k2-1), k2)]
+        for side, edge in enumerate((-0.5, 0.5)):
+            terms = np.array([weights[side, r]*coefficients[side, r]*averages[k2-1-r:2*k2-1-r]
+                              for r in xrange(k2)])
+            assert abs(np.sum(terms) - edge**p) < 1.e-14*np.sum(np.abs(terms))
+
+    # The reconstruction of smooth data converges with order k (checked
+    # for the orders whose errors stay well above roundoff), and is exact
+    # for the polynomials of degree (k-1)/2
+    num_cells = 3*k
+    interior = slice(k2, num_cells-k2)
+    if k <= 9:
+        error = []
+        for dx in (k/30., k/60.):
+            x = dx*np.arange(num_cells+1)
+            q = ((np.exp(x[1:]) - np.exp(x[:-1]))/dx).reshape(1, -1)
+            ql, qr = weno(q)
+            error.append(max(np.max(np.abs(ql[0, interior]/np.exp(x[:-1][interior]) - 1.)),
+                             np.max(np.abs(qr[0, interior]/np.exp(x[1:][interior]) - 1.))))
+        assert np.log2(error[0]/error[1]) > k - 0.6
+    x = 0.1*np.arange(num_cells+1) + 1.
+    q = np.array([(x[1:]**(p+1) - x[:-1]**(p+1))/(0.1*(p+1)) for p in xrange(k2)])
+    ql, qr = weno(q)
+    for p in xrange(k2):
+        assert np.allclose(ql[p, interior], x[:-1][interior]**p, rtol=1.e-12, atol=0.)
+        assert np.allclose(qr[p, interior], x[1:][interior]**p, rtol=1.e-12, atol=0.)
+
+    # The compiled and NumPy reconstructions agree up to the roundoff
+    # errors amplified by the smoothness indicators of the high orders
+    if use_compiled:
+        q = np.cumsum(np.random.RandomState(k).randn(3, 100), axis=1)
+        for compiled_edge, numpy_edge in zip(weno(q), recon.weno_numpy(k, q)):
+            assert np.allclose(compiled_edge, numpy_edge, rtol=1.e-8, atol=0.)
+
+def test_weno_reconstruction():
+    """test_weno_reconstruction
+
+    tests the WENO reconstructions of each order, compiled and in NumPy,
+    against known results """
+
+    for k in xrange(3, 19, 2):
+        yield check_weno_order, k, False
+        if k >= 5:
+            yield check_weno_order, k, True
+
 if __name__=='__main__':
     test_1d_advection()
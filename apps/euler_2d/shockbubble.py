@@ -154,7 +154,7 @@ def dq_Euler_radial(solver,state,dt):
 
     return dq
 
-def shockbubble(use_petsc=False,kernel_language='Fortran',solver_type='classic',iplot=False,htmlplot=False, outdir='_output', disable_output=False):
+def shockbubble(use_petsc=False,kernel_language='Fortran',solver_type='classic',iplot=False,htmlplot=False, outdir='_output', disable_output=False, num_cells=(160,40)):
     """
     Solve the Euler equations of compressible fluid dynamics.
     This example involves a bubble of dense gas that is impacted by a shock.
@@ -180,7 +180,7 @@ def shockbubble(use_petsc=False,kernel_language='Fortran',solver_type='classic',
         solver.step_source=step_Euler_radial
 
     # Initialize domain
-    mx=160; my=40
+    mx,my = num_cells
     x = pyclaw.Dimension('x',0.0,2.0,mx)
     y = pyclaw.Dimension('y',0.0,0.5,my)
     domain = pyclaw.Domain([x,y])
@@ -118,7 +118,7 @@ def gauge_pfunction(q,aux):
 
 def psystem2D(iplot=False,kernel_language='Fortran',htmlplot=False,
               use_petsc=False,outdir='./_output',solver_type='classic',
-              disable_output=False):
+              disable_output=False,num_cells=None):
 
     """
     Solve the p-system in 2D with variable coefficients
@@ -137,6 +137,8 @@ def psystem2D(iplot=False,kernel_language='Fortran',htmlplot=False,
     # cells per layer
     Ng=10
     mx=(x_upper-x_lower)*Ng; my=(y_upper-y_lower)*Ng
+    if num_cells is not None:
+        mx,my = num_cells
     # Initial condition parameters
     A=10.
     x0=0.25 # Center of initial perturbation
@@ -190,7 +192,8 @@ def psystem2D(iplot=False,kernel_language='Fortran',htmlplot=False,
     claw.outdir = outdir
     
     if restart_from_frame is not None:
-        claw.solution = pyclaw.Solution(restart_from_frame, format='petsc',read_aux=False)
+        claw.solution = pyclaw.Solution(restart_from_frame,file_format='petsc',
+                                        path=outdir,read_aux=False)
         claw.solution.state.mp = 1
         grid = claw.solution.domain.grid
         claw.solution.state.aux = setaux(grid.x.centers,grid.y.centers)
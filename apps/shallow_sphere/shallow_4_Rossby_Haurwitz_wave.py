@@ -365,7 +365,7 @@ def auxbc_upper_y(state,dim,t,auxbc,num_ghost):
     auxbc[:,:,-num_ghost:] = auxtemp[:,:,-num_ghost:]
 
 
-def shallow_4_Rossby_Haurwitz(use_petsc=False,solver_type='classic',iplot=0,htmlplot=False,outdir='./_output', disable_output=False):
+def shallow_4_Rossby_Haurwitz(use_petsc=False,solver_type='classic',iplot=0,htmlplot=False,outdir='./_output', disable_output=False, num_cells=(40,20)):
 
     # Import pyclaw module
     if use_petsc:
@@ -440,11 +440,11 @@ def shallow_4_Rossby_Haurwitz(use_petsc=False,solver_type='classic',iplot=0,html
     # ====
     xlower = -3.0
     xupper = 1.0
-    mx = 40
+    mx = num_cells[0]
 
     ylower = -1.0
     yupper = 1.0
-    my = 20
+    my = num_cells[1]
 
     # Check whether or not the even number of cells are used in in both 
     # directions. If odd numbers are used a message is print at screen and the 
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Time writing and reading of ascii (fort.q) output frames in 1D, 2D and 3D,
+comparing the current clawpack.pyclaw.io.ascii routines with the cell by cell
+loops they replaced, and check that both write identical files.
+
+Usage: python ascii_io_timer.py [output directory]
+"""
+
+import os
+import sys
+import time
+import filecmp
+import tempfile
+
+import numpy as np
+
+from clawpack import pyclaw
+from clawpack.pyclaw.io import ascii
+
+
+def loop_write_q(q,file_name):
+    """Cell by cell writer of the q data of a fort.q file, as it used to be."""
+    f = open(file_name,'w')
+    num_eqn = q.shape[0]
+    if q.ndim == 2:
+        for k in xrange(q.shape[1]):
+            for m in xrange(num_eqn):
+                f.write("%18.8e" % q[m,k])
+            f.write('\n')
+    elif q.ndim == 3:
+        for j in xrange(q.shape[2]):
+            for k in xrange(q.shape[1]):
+                for m in xrange(num_eqn):
+                    f.write("%18.8e" % q[m,k,j])
+                f.write('\n')
+            f.write('\n')
+    elif q.ndim == 4:
+        for l in xrange(q.shape[3]):
+            for j in xrange(q.shape[2]):
+                for k in xrange(q.shape[1]):
+                    for m in xrange(num_eqn):
+                        f.write("%18.8e" % q[m,k,j,l])
+                    f.write('\n')
+            f.write('\n')
+        f.write('\n')
+    f.close()
+
+def loop_read_q(q,file_name):
+    """Line by line reader of the q data written by loop_write_q."""
+    f = open(file_name,'r')
+    num_eqn = q.shape[0]
+    for index in np.ndindex(*q.shape[:0:-1]):
+        l = []
+        while len(l) < num_eqn:
+            l = l + f.readline().split()
+        for m in xrange(num_eqn):
+            q[(m,)+index[::-1]] = float(l[m])
+    f.close()
+
+def new_write_q(q,file_name):
+    f = open(file_name,'w')
+    ascii.write_array(f,q,blank_line_after_y=False,blank_line_at_end=True)
+    f.close()
+
+def new_read_q(q,file_name):
+    f = open(file_name,'r')
+    q[...] = ascii.read_array(f.read(),0,q.shape)[0]
+    f.close()
+
+def timed(function,*args):
+    start = time.time()
+    function(*args)
+    return time.time() - start
+
+
+path = sys.argv[1] if len(sys.argv) > 1 else tempfile.mkdtemp()
+num_eqn = 3
+print "%8s %14s %10s %10s %10s %10s" % ('dim','cells','loop write','write','loop read','read')
+for num_cells in [(100000,),(300,300),(50,50,50)]:
+    dimensions = [pyclaw.Dimension(name,0.,1.,n) for name,n in zip('xyz',num_cells)]
+    state = pyclaw.State(pyclaw.Domain(dimensions),num_eqn)
+    state.q[...] = np.random.randn(*state.q.shape)
+
+    loop_file = os.path.join(path,'loop.q')
+    new_file = os.path.join(path,'new.q')
+    t_loop_write = timed(loop_write_q,state.q,loop_file)
+    t_write = timed(new_write_q,state.q,new_file)
+    assert filecmp.cmp(loop_file,new_file,shallow=False)
+
+    q_loop = np.empty_like(state.q)
+    q_new = np.empty_like(state.q)
+    t_loop_read = timed(loop_read_q,q_loop,loop_file)
+    t_read = timed(new_read_q,q_new,new_file)
+    assert (q_loop == q_new).all()
+
+    print "%8i %14s %10.3f %10.3f %10.3f %10.3f" % (len(num_cells),
+            'x'.join(str(n) for n in num_cells),
+            t_loop_write,t_write,t_loop_read,t_read)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Time an ensemble of small 1D acoustics problems, which differ in the sound
+speed and the position of the initial pulse, run one after the other with
+ClawSolver1D or SharpClawSolver1D and as one batch with the batched solvers
+(with each dt policy).  The final solutions are compared.
+
+Usage: python batched_timer.py [number of members] [number of cells]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from clawpack import pyclaw
+from clawpack.riemann import rp_acoustics
+
+
+def make_solver(solver_class,dt_policy=None):
+    solver = solver_class()
+    solver.kernel_language = 'Python'
+    solver.num_waves = rp_acoustics.num_waves
+    solver.rp = rp_acoustics.rp_acoustics_1d
+    solver.limiters = pyclaw.limiters.tvd.MC
+    solver.bc_lower[0] = pyclaw.BC.periodic
+    solver.bc_upper[0] = pyclaw.BC.periodic
+    solver.dt_initial = 1.e-3
+    if dt_policy is not None:
+        solver.dt_policy = dt_policy
+    return solver
+
+def set_member(q,xc,x0):
+    q[0,...] = np.exp(-100*(xc-x0)**2)
+    q[1,...] = 0.
+
+def run(state,solver,domain,tend=1.):
+    claw = pyclaw.Controller()
+    claw.solution = pyclaw.Solution(state,domain)
+    claw.solver = solver
+    claw.output_format = None
+    claw.tfinal = tend
+    claw.num_output_times = 1
+    claw.run()
+    return claw.solution.state.q
+
+def run_members(solver_class,domain,sound_speeds,pulses):
+    q = []
+    for cc,x0 in zip(sound_speeds,pulses):
+        state = pyclaw.State(domain,2)
+        state.problem_data['cc'] = cc
+        state.problem_data['zz'] = cc
+        set_member(state.q,domain.grid.x.centers,x0)
+        q.append(run(state,make_solver(solver_class),domain).copy())
+    return np.dstack(q)
+
+def run_batch(solver_class,dt_policy,domain,sound_speeds,pulses):
+    state = pyclaw.BatchedState(domain,2,batch_size=len(sound_speeds))
+    state.problem_data['cc'] = sound_speeds
+    state.problem_data['zz'] = sound_speeds
+    xc = domain.grid.x.centers
+    for b,x0 in enumerate(pulses):
+        set_member(state.q[...,b],xc,x0)
+    return run(state,make_solver(solver_class,dt_policy),domain)
+
+def timed(function,*args):
+    start = time.time()
+    result = function(*args)
+    return time.time() - start, result
+
+
+batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+num_cells = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+domain = pyclaw.Domain(pyclaw.Dimension('x',0.,1.,num_cells))
+sound_speeds = np.linspace(0.5,1.5,batch_size)
+pulses = np.linspace(0.25,0.75,batch_size)
+
+print "%10s %12s %12s %12s %12s %12s" % ('solver','one by one','shared dt','difference',
+                                         'member dt','difference')
+for name,single,batched in (('classic',pyclaw.ClawSolver1D,pyclaw.BatchedClawSolver1D),
+                            ('sharpclaw',pyclaw.SharpClawSolver1D,pyclaw.BatchedSharpClawSolver1D)):
+    t_single,q_single = timed(run_members,single,domain,sound_speeds,pulses)
+    t_shared,q_shared = timed(run_batch,batched,'shared',domain,sound_speeds,pulses)
+    t_member,q_member = timed(run_batch,batched,'member',domain,sound_speeds,pulses)
+    print "%10s %12.4f %12.4f %12.2e %12.4f %12.2e" % (name,t_single,t_shared,
+                                                       np.abs(q_shared-q_single).max(),t_member,
+                                                       np.abs(q_member-q_single).max())
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# encoding: utf-8
+r"""
+Benchmark suite running representative applications of apps/ at several
+resolutions, with the classic and SharpClaw solvers and the Fortran and
+Python kernels they support.
+
+Each case is set up by the application itself (whose Controller.run is
+intercepted), and then takes a fixed number of time steps, after one
+untimed step, with output disabled; it runs in a new process (see
+:func:`clawpack.pyclaw.ensemble.run_ensemble`), so that its peak memory is
+its own.  For each case the suite reports the cell updates per second, the
+time per step, broken down by phase as recorded in solver.timings (see
+:class:`clawpack.pyclaw.profiling.Timings`: boundary conditions, hyperbolic
+kernel, source terms, CFL reduction, gauges, and so on), and the peak
+memory.  The results are stored in a JSON file, and two result
+files, for instance from two commits, can be compared.
+
+Usage::
+
+    python benchmark_apps.py [--apps acoustics_1d,euler_2d] [--levels 0,1,2]
+                             [--steps 20] [--output results.json]
+    python benchmark_apps.py --compare old.json new.json [--threshold 0.1]
+
+Cases that cannot run here (for instance because a Fortran module is not
+built) are recorded with their error instead of timings.
+"""
+
+import os
+import sys
+import time
+import json
+import shutil
+import platform
+import tempfile
+
+import numpy as np
+
+from clawpack.pyclaw import ensemble
+
+apps_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),'..','apps')
+
+# name: (module, application, supported (solver_type,kernel_language),
+#        num_cells at each resolution level)
+applications = {
+    'acoustics_1d': ('acoustics_1d_homogeneous.acoustics','acoustics',
+                     [('classic','Fortran'),('classic','Python'),
+                      ('sharpclaw','Fortran'),('sharpclaw','Python')],
+                     [1000,10000,100000]),
+    'acoustics_2d': ('acoustics_2d_homogeneous.acoustics','acoustics2D',
+                     [('classic','Fortran'),('classic','Python'),
+                      ('sharpclaw','Fortran')],
+                     [(100,100),(200,200),(400,400)]),
+    'acoustics_3d': ('acoustics_3d_variable.acoustics','acoustics3D',
+                     [('classic','Fortran')],
+                     [(30,30,30),(60,60,60),(90,90,90)]),
+    'euler_2d': ('euler_2d.shockbubble','shockbubble',
+                 [('classic','Fortran'),('sharpclaw','Fortran')],
+                 [(160,40),(320,80),(640,160)]),
+    'psystem_2d': ('psystem_2d.psystem','psystem2D',
+                   [('classic','Fortran'),('sharpclaw','Fortran')],
+                   [(200,200),(400,400),(800,800)]),
+    'shallow_sphere': ('shallow_sphere.shallow_4_Rossby_Haurwitz_wave',
+                       'shallow_4_Rossby_Haurwitz',
+                       [('classic','Fortran')],
+                       [(80,40),(160,80),(320,160)]),
+}
+
+# Application arguments that not all applications accept
+optional_arguments = ('kernel_language',)
+
+
+class _Captured(Exception):
+    def __init__(self,controller):
+        self.controller = controller
+
+def capture_controller(application,**kwargs):
+    r"""
+    Call application(\*\*kwargs) and return the Controller it sets up,
+    without running it.
+    """
+    import inspect
+    from clawpack.pyclaw import Controller
+
+    def run(controller):
+        raise _Captured(controller)
+
+    accepted = inspect.getargspec(application).args
+    for name in optional_arguments:
+        if name in kwargs and name not in accepted:
+            if kwargs.pop(name) != 'Fortran':
+                raise NotImplementedError('%s is not an argument of %s'
+                                          % (name,application.__name__))
+    original_run = Controller.run
+    Controller.run = run
+    try:
+        application(**kwargs)
+    except _Captured, captured:
+        return captured.controller
+    finally:
+        Controller.run = original_run
+    raise Exception('%s did not run a Controller' % application.__name__)
+
+
+def peak_memory():
+    r"""Peak resident memory of this process, in MB."""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak/2.**20
+    return peak/2.**10
+
+def run_case(app,solver_type,kernel_language,num_cells,num_steps):
+    r"""Run one case and return its results (a dict)."""
+    import importlib
+
+    if apps_dir not in sys.path:
+        sys.path.insert(0,apps_dir)
+    module,function = applications[app][:2]
+    application = getattr(importlib.import_module(module),function)
+
+    memory_before = peak_memory()
+    outdir = tempfile.mkdtemp()
+    claw = capture_controller(application,solver_type=solver_type,
+                              kernel_language=kernel_language,
+                              num_cells=num_cells,disable_output=True,
+                              outdir=outdir)
+    solver = claw.solver
+    solution = claw.solution
+    grid = solution.patch.grid
+    if len(grid.gauges)>0:
+        grid.setup_gauge_files(outdir)
+    solver.setup(solution)
+    solver.dt = solver.dt_initial
+    claw.check_validity()
+
+    solver.evolve_to_time(solution)
+    solver.timings.reset()
+    start = time.time()
+    for i in xrange(num_steps):
+        solver.evolve_to_time(solution)
+    elapsed = time.time() - start
+    solver.flush_gauge_values()
+    solver.teardown()
+    shutil.rmtree(outdir,ignore_errors=True)
+
+    phases = dict((phase,t/num_steps) for phase,t in solver.timings.seconds.iteritems())
+    phases['other'] = elapsed/num_steps - sum(phases.values())
+    num_cells = int(np.prod(grid.num_cells))
+    return {'app': app,
+            'solver_type': solver_type,
+            'kernel_language': kernel_language,
+            'num_cells': list(grid.num_cells),
+            'num_steps': num_steps,
+            'rejected_steps': solver.timings.rejected_steps,
+            'seconds': elapsed,
+            'time_per_step': elapsed/num_steps,
+            'cell_updates_per_second': num_cells*num_steps/elapsed,
+            'phases': phases,
+            'peak_memory_mb': peak_memory(),
+            'memory_increase_mb': peak_memory() - memory_before}
+
+def case_key(case):
+    return (case['app'],case['solver_type'],case['kernel_language'],
+            tuple(np.atleast_1d(case['num_cells']).tolist()))
+
+def run_suite(apps,levels,num_steps):
+    r"""
+    Run the cases of the given applications and resolution levels, and
+    return the results, with information on the version and the machine.
+    """
+    import subprocess
+
+    members = []
+    for app in apps:
+        module,function,variants,resolutions = applications[app]
+        for solver_type,kernel_language in variants:
+            for level in levels:
+                if level < len(resolutions):
+                    members.append({'app': app,'solver_type': solver_type,
+                                    'kernel_language': kernel_language,
+                                    'num_cells': resolutions[level],
+                                    'num_steps': num_steps})
+    try:
+        commit = subprocess.Popen(['git','rev-parse','HEAD'],stdout=subprocess.PIPE,
+                                  stderr=subprocess.PIPE,
+                                  cwd=os.path.dirname(apps_dir)).communicate()[0].strip()
+    except OSError:
+        commit = None
+
+    results = []
+    for result in ensemble.run_ensemble(run_case,members,processes=1):
+        if result.error is None:
+            case = result.value
+        else:
+            case = dict(result.kwargs)
+            case['error'] = result.error.strip().splitlines()[-1]
+        print_case(case)
+        results.append(case)
+    results.sort(key=case_key)
+    return {'commit': commit,
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'host': platform.node(),
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'results': results}
+
+def case_name(case):
+    app,solver_type,kernel_language,num_cells = case_key(case)
+    return '%-15s %-10s %-8s %-16s' % (app,solver_type,kernel_language,
+                                       'x'.join(str(n) for n in num_cells))
+
+def print_case(case):
+    name = case_name(case)
+    if 'error' in case:
+        print name, 'failed:', case['error']
+    else:
+        phases = ' '.join('%s %.1f%%' % (phase,100*t/case['time_per_step'])
+                          for phase,t in sorted(case['phases'].items()))
+        print name, '%10.3e cells/s %9.2e s/step %8.1f MB  %s' % (
+            case['cell_updates_per_second'],case['time_per_step'],
+            case['peak_memory_mb'],phases)
+
+def compare(old,new,threshold=0.1):
+    r"""
+    Print the change of the cell updates per second of each case between
+    two result files, and return the number of cases that are slower by
+    more than the fraction threshold.
+    """
+    old_cases = dict((case_key(case),case) for case in old['results'] if 'error' not in case)
+    regressions = 0
+    print 'old: %s %s' % (old.get('commit'),old.get('date'))
+    print 'new: %s %s' % (new.get('commit'),new.get('date'))
+    for case in new['results']:
+        old_case = old_cases.get(case_key(case))
+        if old_case is None or 'error' in case:
+            continue
+        ratio = case['cell_updates_per_second']/old_case['cell_updates_per_second']
+        flag = ''
+        if ratio < 1. - threshold:
+            flag = 'REGRESSION'
+            regressions += 1
+        print '%s %10.3e %10.3e %7.2f %s' % (case_name(case),old_case['cell_updates_per_second'],
+                                             case['cell_updates_per_second'],ratio,flag)
+    return regressions
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark the applications.')
+    parser.add_argument('--apps',default=','.join(sorted(applications)),
+                        help='comma separated applications (%s)' % ', '.join(sorted(applications)))
+    parser.add_argument('--levels',default='0,1,2',
+                        help='comma separated resolution levels')
+    parser.add_argument('--steps',type=int,default=20,help='number of timed steps')
+    parser.add_argument('--output',default='benchmark_results.json',
+                        help='file the results are written to')
+    parser.add_argument('--compare',nargs=2,metavar=('OLD','NEW'),
+                        help='compare two result files instead of running')
+    parser.add_argument('--threshold',type=float,default=0.1,
+                        help='relative slowdown reported as a regression')
+    args = parser.parse_args()
+
+    if args.compare:
+        old,new = [json.load(open(path)) for path in args.compare]
+        sys.exit(1 if compare(old,new,args.threshold) else 0)
+
+    results = run_suite(args.apps.split(','),[int(level) for level in args.levels.split(',')],
+                        args.steps)
+    output = open(args.output,'w')
+    json.dump(results,output,indent=1,sort_keys=True)
+    output.close()
+    print 'Results written to %s' % args.output
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Time the classic 2D solver with the Fortran kernels (step2ds and step2) and
+with the vectorized Python kernel on the homogeneous acoustics problem of
+apps/acoustics_2d_homogeneous, and check that both give the same solution.
+
+Usage: python classic_python_timer.py [number of cells in each direction]
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+from clawpack import pyclaw
+
+sys.path.insert(0,os.path.join(os.path.dirname(__file__),'..','apps',
+                               'acoustics_2d_homogeneous'))
+import acoustics
+
+
+def run(kernel_language,dimensional_split,transverse_waves,num_cells):
+    solver = pyclaw.ClawSolver2D()
+    solver.kernel_language = kernel_language
+    solver.dimensional_split = dimensional_split
+    solver.transverse_waves = transverse_waves
+    if kernel_language == 'Python':
+        solver.rp = acoustics.rpn2_acoustics
+        solver.rp_transverse = acoustics.rpt2_acoustics
+    else:
+        from clawpack.riemann import rp2_acoustics
+        solver.rp = rp2_acoustics
+    solver.num_waves = 2
+    solver.limiters = pyclaw.limiters.tvd.MC
+    solver.cfl_max = 0.5
+    solver.cfl_desired = 0.45
+    solver.bc_lower[0] = pyclaw.BC.extrap
+    solver.bc_upper[0] = pyclaw.BC.extrap
+    solver.bc_lower[1] = pyclaw.BC.extrap
+    solver.bc_upper[1] = pyclaw.BC.extrap
+
+    x = pyclaw.Dimension('x',-1.0,1.0,num_cells)
+    y = pyclaw.Dimension('y',-1.0,1.0,num_cells)
+    domain = pyclaw.Domain([x,y])
+    state = pyclaw.State(domain,3)
+    state.problem_data['rho'] = 1.0
+    state.problem_data['bulk'] = 4.0
+    state.problem_data['cc'] = 2.0
+    state.problem_data['zz'] = 2.0
+    acoustics.qinit(state)
+    solver.dt_initial = np.min(domain.grid.delta)/2.0*solver.cfl_desired
+
+    claw = pyclaw.Controller()
+    claw.output_format = None
+    claw.keep_copy = True
+    claw.verbosity = 0
+    claw.solution = pyclaw.Solution(state,domain)
+    claw.solver = solver
+    claw.tfinal = 0.12
+    claw.num_output_times = 1
+
+    start = time.time()
+    claw.run()
+    return time.time() - start, claw.frames[-1].q
+
+
+num_cells = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+print "%24s %10s %10s %12s" % ('method','Fortran','Python','difference')
+for name,dimensional_split,transverse_waves in [
+        ('dimensional splitting',True,pyclaw.ClawSolver2D.trans_inc),
+        ('unsplit, no_trans',False,pyclaw.ClawSolver2D.no_trans),
+        ('unsplit, trans_inc',False,pyclaw.ClawSolver2D.trans_inc),
+        ('unsplit, trans_cor',False,pyclaw.ClawSolver2D.trans_cor)]:
+    t_fortran,q_fortran = run('Fortran',dimensional_split,transverse_waves,num_cells)
+    t_python,q_python = run('Python',dimensional_split,transverse_waves,num_cells)
+    print "%24s %10.3f %10.3f %12.2e" % (name,t_fortran,t_python,
+                                         np.max(np.abs(q_fortran-q_python)))
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Time the classic 2D Fortran solver on the homogeneous acoustics problem of
+apps/acoustics_2d_homogeneous with the step taken on 1, 2, 4, ... tiles in
+a pool of threads (solver.num_threads), and check that the solutions are
+identical.
+
+Usage: python tiled_step_timer.py [number of cells in each direction] [maximum number of threads]
+"""
+
+import multiprocessing
+import os
+import sys
+import time
+
+import numpy as np
+
+from clawpack import pyclaw
+
+sys.path.insert(0,os.path.join(os.path.dirname(__file__),'..','apps',
+                               'acoustics_2d_homogeneous'))
+import acoustics
+
+
+def run(num_threads,dimensional_split,num_cells):
+    from clawpack.riemann import rp2_acoustics
+    solver = pyclaw.ClawSolver2D()
+    solver.num_threads = num_threads
+    solver.dimensional_split = dimensional_split
+    solver.transverse_waves = pyclaw.ClawSolver2D.trans_cor
+    solver.rp = rp2_acoustics
+    solver.num_waves = 2
+    solver.limiters = pyclaw.limiters.tvd.MC
+    solver.cfl_max = 0.5
+    solver.cfl_desired = 0.45
+    solver.bc_lower[0] = pyclaw.BC.extrap
+    solver.bc_upper[0] = pyclaw.BC.extrap
+    solver.bc_lower[1] = pyclaw.BC.extrap
+    solver.bc_upper[1] = pyclaw.BC.extrap
+
+    x = pyclaw.Dimension('x',-1.0,1.0,num_cells)
+    y = pyclaw.Dimension('y',-1.0,1.0,num_cells)
+    domain = pyclaw.Domain([x,y])
+    state = pyclaw.State(domain,3)
+    state.problem_data['rho'] = 1.0
+    state.problem_data['bulk'] = 4.0
+    state.problem_data['cc'] = 2.0
+    state.problem_data['zz'] = 2.0
+    acoustics.qinit(state)
+    solver.dt_initial = np.min(domain.grid.delta)/2.0*solver.cfl_desired
+
+    claw = pyclaw.Controller()
+    claw.output_format = None
+    claw.keep_copy = True
+    claw.verbosity = 0
+    claw.solution = pyclaw.Solution(state,domain)
+    claw.solver = solver
+    claw.tfinal = 0.12
+    claw.num_output_times = 1
+
+    start = time.time()
+    claw.run()
+    return time.time() - start, claw.frames[-1].q
+
+
+num_cells = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+max_threads = int(sys.argv[2]) if len(sys.argv) > 2 else multiprocessing.cpu_count()
+print "%24s %8s %10s %10s %12s" % ('method','threads','time','speedup','difference')
+for name,dimensional_split in [('dimensional splitting',True),
+                               ('unsplit, trans_cor',False)]:
+    t_serial,q_serial = run(1,dimensional_split,num_cells)
+    num_threads = 1
+    while num_threads <= max_threads:
+        t,q = run(num_threads,dimensional_split,num_cells)
+        print "%24s %8i %10.3f %10.2f %12.2e" % (name,num_threads,t,t_serial/t,
+                                                 np.max(np.abs(q-q_serial)))
+        num_threads *= 2
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Time the WENO reconstructions used by the Python SharpClaw kernel for each
+order: the NumPy implementation, and the compiled PyWENO module applied to
+all equations at once and, as it used to be, one equation at a time.  The
+results of the NumPy and compiled reconstructions are compared.
+
+Usage: python weno_timer.py [number of cells] [number of equations]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from clawpack.pyclaw.limiters import reconstruct
+
+
+def compiled_by_equation(k,q):
+    """Compiled reconstruction called for each equation, with new arrays."""
+    k2 = (k+1)/2
+    sigma = np.zeros((q.shape[1],k2))
+    weights = np.zeros((q.shape[1],k2))
+    ql = np.zeros(q.shape)
+    qr = np.zeros(q.shape)
+    smoothness = getattr(reconstruct.compiled,'smoothness_k' + str(k2))
+    weights_l = getattr(reconstruct.compiled,'weights_left_k' + str(k2))
+    weights_r = getattr(reconstruct.compiled,'weights_right_k' + str(k2))
+    reconstruct_l = getattr(reconstruct.compiled,'reconstruct_left_k' + str(k2))
+    reconstruct_r = getattr(reconstruct.compiled,'reconstruct_right_k' + str(k2))
+    for m in range(q.shape[0]):
+        f = q[m,:].copy()
+        smoothness(f,sigma)
+        weights_l(sigma,weights)
+        reconstruct_l(f,weights,ql[m,:])
+        weights_r(sigma,weights)
+        reconstruct_r(f,weights,qr[m,:])
+    return ql,qr
+
+def timed(function,q,repeat=20):
+    start = time.time()
+    for i in xrange(repeat):
+        result = function(q)
+    return (time.time() - start)/repeat, result
+
+
+num_cells = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+num_eqn = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+q = np.cumsum(np.random.randn(num_eqn,num_cells),axis=1)
+has_compiled = reconstruct.compiled is not None
+if not has_compiled:
+    print "The compiled reconstruction is not built; only NumPy is timed."
+
+print "%6s %10s %12s %12s %12s" % ('order','NumPy','compiled','by equation','difference')
+for k in xrange(3,19,2):
+    numpy_weno = reconstruct.WENOReconstructor(k,use_compiled=False)
+    t_numpy,(ql,qr) = timed(numpy_weno,q)
+    ql,qr = ql.copy(),qr.copy()
+    if has_compiled and k >= 5:
+        compiled_weno = reconstruct.WENOReconstructor(k)
+        t_compiled,(cl,cr) = timed(compiled_weno,q)
+        t_loop = timed(lambda q: compiled_by_equation(k,q),q)[0]
+        k2 = (k+1)/2
+        difference = max(np.max(np.abs(cl-ql)[:,k2:-k2]),
+                         np.max(np.abs(cr-qr)[:,k2:-k2]))
+        print "%6i %10.5f %12.5f %12.5f %12.2e" % (k,t_numpy,t_compiled,t_loop,difference)
+    else:
+        print "%6i %10.5f %12s %12s %12s" % (k,t_numpy,'-','-','-')
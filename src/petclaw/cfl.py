@@ -3,12 +3,55 @@ Module for the cfl object, responsible for computing and enforcing the Courant-F
 """
 
 class CFL(object):
+    r"""
+    CFL number of the current step, maximized over all processes.
+
+    By default the local maximum is reduced over the processes each time it
+    is updated, i.e. after every classic step and after every Runge-Kutta
+    stage of SharpClaw, and each reduction synchronizes all the processes.
+
+    .. attribute:: deferred
+
+        If True, the local maxima of the stages of a step are only recorded,
+        and their maximum is reduced over the processes once at the end of
+        the step, or once every check_interval steps (see
+        :meth:`finish_step`).  Between the stages of a step the global
+        maximum is not known: :meth:`get_cached_max` returns 0, so the
+        solver does not stop a step early when a stage exceeds the CFL
+        limit.  ``default = False``
+
+    .. attribute:: check_interval
+
+        With deferred set, number of steps between the reductions,
+        ``default = 1``.  The steps in between are accepted provisionally
+        and all take the time step chosen at the last reduction, which is
+        reduced by safety_factor.  If a reduction shows that the CFL number
+        of one of them exceeded cfl_max, the solution is restored to its
+        value at the previous reduction and the steps are retaken with a
+        smaller time step; the after_step function and the gauges then see
+        these steps twice.  The last step of each call of evolve_to_time is
+        always checked.
+
+    .. attribute:: safety_factor
+
+        Factor applied to the time step chosen at each reduction when
+        check_interval is larger than 1, so that the wave speeds may grow
+        until the next reduction without exceeding cfl_max.
+        ``default = 0.9``
+    """
     def __init__(self, global_max):
         from petsc4py import PETSc
         self._local_max = global_max
         self._global_max = global_max
         self._reduce_vec = PETSc.Vec().createWithArray([0])
-        
+        self.deferred = False
+        self.check_interval = 1
+        self.safety_factor = 0.9
+        # Local maximum over the stages of the steps not yet checked, and
+        # their number
+        self._unchecked_max = 0.
+        self._num_unchecked = 0
+
     def get_global_max(self):
         r"""
         Compute the maximum CFL number over all processes for the current step.
@@ -27,6 +70,49 @@ class CFL(object):
         self._local_max = new_local_max
 
     def update_global_max(self,new_local_max):
+        if self.deferred:
+            self._unchecked_max = max(self._unchecked_max,new_local_max)
+            self._global_max = 0.
+            return
         self._reduce_vec.array = new_local_max
         self._global_max = self._reduce_vec.max()[1]
 
+    def finish_step(self,last=False):
+        r"""
+        Called by the solver at the end of each step, once the local maxima
+        of all its stages are recorded; last is True for the last step of
+        evolve_to_time.  Return whether the CFL number of the steps taken
+        since it was last checked is known; :meth:`get_cached_max` then
+        returns its maximum over these steps and all processes.
+
+        With deferred set, the maximum is reduced over the processes here,
+        after every check_interval-th step and after the last step;
+        otherwise False is returned.
+        """
+        if not self.deferred:
+            return True
+        self._num_unchecked += 1
+        if self._num_unchecked < self.check_interval and not last:
+            return False
+        self._reduce_vec.array = self._unchecked_max
+        self._global_max = self._reduce_vec.max()[1]
+        self.discard_steps()
+        return True
+
+    def discard_steps(self):
+        r"""
+        Forget the local maxima of the steps not checked yet, which the
+        solver is retaking.
+        """
+        self._unchecked_max = 0.
+        self._num_unchecked = 0
+
+    def step_size_factor(self):
+        r"""
+        Factor applied by the solver to the time step it chooses from the
+        CFL number: safety_factor if the CFL number is checked only every
+        check_interval > 1 steps, and 1 otherwise.
+        """
+        if self.deferred and self.check_interval > 1:
+            return self.safety_factor
+        return 1.
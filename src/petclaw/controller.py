@@ -16,6 +16,58 @@ class Controller(pyclawController):
         rank = PETSc.Comm.getRank(PETSc.COMM_WORLD)
         return rank == 0
 
+    def checkpoint_file(self,directory,number):
+        r"""
+        Name of checkpoint file number *number* of this process; each
+        process writes its own part of the solution.
+        """
+        from petsc4py import PETSc
+        rank = PETSc.Comm.getRank(PETSc.COMM_WORLD)
+        return super(Controller,self).checkpoint_file(directory,number)+'.'+str(rank)
+
+    def latest_checkpoint(self,directory):
+        r"""
+        Number of the most recent checkpoint written completely by all
+        processes, or None.
+        """
+        from petsc4py import PETSc
+        number = super(Controller,self).latest_checkpoint(directory)
+        reduce_vec = PETSc.Vec().createWithArray([-1 if number is None else number])
+        number = int(reduce_vec.min()[1])
+        if number < 0:
+            return None
+        return number
+
+    def new_frame_store(self,num_frames):
+        r"""
+        Return the empty :class:`~petclaw.frame_store.FrameStore` that holds
+        the frames of a run; its frames must be accessed collectively.
+        """
+        from .frame_store import FrameStore
+        return FrameStore(num_frames=num_frames,**self.frame_store_options)
+
+    def start_output(self):
+        r"""
+        Output is written collectively by all processes, so it cannot be
+        written in the background.
+        """
+        if self.async_output and self.output_format is not None:
+            raise NotImplementedError("async_output is not supported by PetClaw")
+
+    def profile_report(self,trace_path=None):
+        r"""
+        Return the table of the times of this process (see
+        :meth:`clawpack.pyclaw.controller.Controller.profile_report`).  Each
+        process writes its own trace file, with its rank appended to
+        trace_path and used as the process id of the events, so that the
+        files can be merged.
+        """
+        from petsc4py import PETSc
+        if trace_path is not None:
+            rank = PETSc.Comm.getRank(PETSc.COMM_WORLD)
+            self.solver.timings.write_chrome_trace(trace_path+'.'+str(rank),rank)
+        return super(Controller,self).profile_report()
+
     def log_info(self, str):
         import logging
         if self.is_proc_0():
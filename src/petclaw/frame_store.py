@@ -0,0 +1,39 @@
+r"""
+Module for the PetClaw frame store.  It is identical to the PyClaw frame
+store except that its frames are accessed collectively.
+"""
+
+from clawpack.pyclaw.frame_store import FrameStore as pyclawFrameStore
+
+class FrameStore(pyclawFrameStore):
+    r"""
+    See the corresponding PyClaw class documentation.
+
+    The frames are PetClaw Solutions holding the values of this process.
+    Building one creates the DAs of its states and copies the stored values
+    into their Vecs, which is collective, so all the processes must access
+    the same frames in the same order (this is checked on each access,
+    which is itself collective: a frame accessed by some processes only
+    hangs).  The Solution of a frame is built again on all processes if
+    any of them no longer holds it.
+    """
+    def __init__(self,*args,**kwargs):
+        from petsc4py import PETSc
+        super(FrameStore,self).__init__(*args,**kwargs)
+        self._reduce_vec = PETSc.Vec().createWithArray([0])
+
+    def _reduce_max(self,value):
+        self._reduce_vec.array = value
+        return self._reduce_vec.max()[1]
+
+    def __getitem__(self,n):
+        if isinstance(n,slice):
+            return super(FrameStore,self).__getitem__(n)
+        n = self._frame_number(n)
+        if self._reduce_max(n) != -self._reduce_max(-n):
+            raise Exception("All processes must access the same frame of a FrameStore")
+        solution = self._solutions.get(n)
+        if self._reduce_max(solution is None):
+            solution = self._solution(n)
+            self._solutions[n] = solution
+        return solution
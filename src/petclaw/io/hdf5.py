@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# encoding: utf-8
+r"""
+Routines for reading and writing a HDF5 output file in parallel.
+
+All processes write their part of the solution into one file, using the
+MPI-IO driver of HDF5 through h5py; nothing is gathered on a single
+process.  The file has the layout of the files written by
+:func:`clawpack.pyclaw.io.hdf5.write_hdf5`: a group ``patch<n>`` for each
+state, whose attributes hold the time, the number of equations and the
+global extent of each dimension, with datasets ``q`` and ``aux`` of shape
+(num_eqn, num_cells[0], num_cells[1], ...) holding the whole patch.  Each
+process writes and reads the hyperslab of the cells it owns in the PETSc
+DA, so a file can be read by a run on a different number of processes.
+
+This requires h5py built against a parallel HDF5 library (``h5py.get_config().mpi``)
+and mpi4py; in a serial run any h5py will do.  Compression filters are not
+supported by parallel HDF5 and are not used.
+"""
+
+import os
+import logging
+logger = logging.getLogger('io')
+
+import h5py
+
+def _communicator():
+    r"""
+    Return the mpi4py communicator of PETSc.COMM_WORLD, or None if the run
+    is serial and h5py has no MPI support.
+    """
+    from petsc4py import PETSc
+    if h5py.get_config().mpi:
+        return PETSc.COMM_WORLD.tompi4py()
+    if PETSc.COMM_WORLD.getSize() > 1:
+        raise IOError('Parallel HDF5 output requires h5py built with MPI support')
+    return None
+
+def _open(filename,mode):
+    comm = _communicator()
+    if comm is None:
+        return h5py.File(filename,mode)
+    return h5py.File(filename,mode,driver='mpio',comm=comm)
+
+def _owned_cells(da):
+    r"""
+    Return the index of the cells owned by this process in an array of
+    shape (dof, num_cells...) holding the whole patch.
+    """
+    return (slice(None),) + tuple(slice(start,end) for start,end in da.getRanges())
+
+def _write_dataset(group,name,da,values):
+    dataset = group.create_dataset(name,tuple([da.dof]+list(da.getSizes())),
+                                   dtype=values.dtype)
+    if hasattr(dataset,'collective'):
+        with dataset.collective:
+            dataset[_owned_cells(da)] = values
+    else:
+        dataset[_owned_cells(da)] = values
+
+def _read_dataset(dataset,da):
+    if hasattr(dataset,'collective'):
+        with dataset.collective:
+            return dataset[_owned_cells(da)]
+    return dataset[_owned_cells(da)]
+
+
+def write_hdf5(solution,frame,path='./',file_prefix='claw',write_aux=False,
+               options={},write_p=False):
+    r"""
+    Write out a Solution to a HDF5 file, collectively from all processes.
+
+    :Input:
+     - *solution* - (:class:`~pyclaw.solution.Solution`) petclaw
+       object to be output
+     - *frame* - (int) Frame number
+     - *path* - (string) Root path
+     - *file_prefix* - (string) Prefix for the file name. ``default =
+        'claw'``
+     - *write_aux* - (bool) Boolean controlling whether the associated
+       auxiliary array should be written out. ``default = False``
+     - *options* - (dict) Optional argument dictionary, see
+       `Parallel HDF5 Option Table`_
+
+    .. _`Parallel HDF5 Option Table`:
+
+    clobber  : if True (Default), files will be overwritten
+    """
+    import pickle
+
+    clobber = options.get('clobber',True)
+
+    filename = os.path.join(path,'%s%s.hdf' %
+                                (file_prefix,str(frame).zfill(4)))
+    if not clobber and os.path.exists(filename):
+        raise IOError('Cowardly refusing to clobber %s!' % filename)
+
+    # Every process makes the same calls to create the groups, attributes
+    # and datasets, which are collective
+    f = _open(filename,'w')
+    try:
+        for state in solution.states:
+            patch = state.patch
+            subgroup = f.create_group('patch%s' % patch.patch_index)
+
+            subgroup.attrs['t'] = state.t
+            subgroup.attrs['num_eqn'] = state.mp if write_p else state.num_eqn
+            subgroup.attrs['num_aux'] = state.num_aux
+            subgroup.attrs['patch_index'] = patch.patch_index
+            subgroup.attrs['level'] = patch.level
+            subgroup.attrs['problem_data'] = pickle.dumps(state.problem_data)
+
+            subgroup.attrs['dimensions'] = patch.name
+            for dim in patch.dimensions:
+                for attr in ['num_cells','lower','upper','units']:
+                    if getattr(dim,attr,None) is not None:
+                        subgroup.attrs['%s.%s' % (dim.name,attr)] = getattr(dim,attr)
+
+            if write_p:
+                _write_dataset(subgroup,'q',state._p_da,state.p)
+            else:
+                _write_dataset(subgroup,'q',state.q_da,state.q)
+            if write_aux and state.num_aux > 0:
+                _write_dataset(subgroup,'aux',state.aux_da,state.aux)
+    finally:
+        f.close()
+
+def read_hdf5(solution,frame,path='./',file_prefix='claw',read_aux=True,
+              options={}):
+    r"""
+    Read in a HDF5 file written by :func:`write_hdf5` into a Solution,
+    collectively from all processes.
+
+    The patches are distributed over the processes of this run, whose number
+    need not be the number of processes that wrote the file; each process
+    reads only the cells it owns.
+
+    :Input:
+     - *solution* - (:class:`~pyclaw.solution.Solution`) Solution object to
+       read the data into.
+     - *frame* - (int) Frame number to be read in
+     - *path* - (string) Path to the current directory of the file
+     - *file_prefix* - (string) Prefix of the files to be read in.
+       ``default = 'claw'``
+     - *read_aux* (bool) Whether or not the auxiliary array will try to be
+       read in.  ``default = True``
+     - *options* - (dict) Optional argument dictionary, unused for reading.
+    """
+    import pickle
+    from clawpack import petclaw
+
+    if frame < 0:
+        # Don't construct file names with negative frameno values.
+        raise IOError("Frame " + str(frame) + " does not exist ***")
+
+    filename = os.path.join(path,'%s%s.hdf' %
+                                (file_prefix,str(frame).zfill(4)))
+
+    f = _open(filename,'r')
+    try:
+        patches = []
+        for name in sorted(f.keys()):
+            subgroup = f[name]
+
+            dimensions = []
+            for dim_name in subgroup.attrs['dimensions']:
+                dim = petclaw.Dimension(str(dim_name),
+                                        subgroup.attrs['%s.lower' % dim_name],
+                                        subgroup.attrs['%s.upper' % dim_name],
+                                        subgroup.attrs['%s.num_cells' % dim_name])
+                units = subgroup.attrs.get('%s.units' % dim_name,None)
+                if units is not None:
+                    dim.units = units
+                dimensions.append(dim)
+            patch = petclaw.Patch(dimensions)
+            patch.patch_index = int(subgroup.attrs['patch_index'])
+            patch.level = int(subgroup.attrs['level'])
+
+            num_aux = 0
+            if read_aux and 'aux' in subgroup:
+                num_aux = int(subgroup.attrs['num_aux'])
+            state = petclaw.State(patch,int(subgroup.attrs['num_eqn']),num_aux)
+            state.t = subgroup.attrs['t']
+            state.problem_data = pickle.loads(str(subgroup.attrs['problem_data']))
+
+            state.q = _read_dataset(subgroup['q'],state.q_da)
+            if num_aux > 0:
+                state.aux = _read_dataset(subgroup['aux'],state.aux_da)
+
+            solution.states.append(state)
+            patches.append(patch)
+        solution.domain = petclaw.geometry.Domain(patches)
+    finally:
+        f.close()
@@ -14,12 +14,36 @@ from petsc4py import PETSc
 import pickle
     
 
+def _view_natural(da,vec,viewer):
+    r"""
+    View the global Vec vec of the DA da in the natural ordering of the cells.
+    """
+    natural = da.createNaturalVec()
+    da.globalToNatural(vec,natural)
+    natural.view(viewer)
+    natural.destroy()
+
+def _load_natural(da,vec,viewer):
+    r"""
+    Load the global Vec vec of the DA da from data in the natural ordering
+    of the cells, scattering them to the processes that own the cells.
+    """
+    natural = da.createNaturalVec()
+    natural.load(viewer)
+    da.naturalToGlobal(natural,vec)
+    natural.destroy()
+
 def write_petsc(solution,frame,path='./',file_prefix='claw',write_aux=False,options={},write_p=False):
     r"""
         Write out pickle and PETSc data files representing the
         solution.  Common data is written from process 0 in pickle
         files.  Shared data is written from all processes into PETSc
-        data files.
+        data files, in the natural ordering of the cells, so that it
+        does not depend on the decomposition of the patches.  The
+        number of processes, the process grid and the number of ghost
+        cells of the run are recorded in the pickle file; read_petsc
+        takes the presence of the number of processes to mean that the
+        data are in the natural ordering.
         
     :Input:
      - *solution* - (:class:`~pyclaw.solution.Solution`) pyclaw
@@ -108,16 +132,24 @@ def write_petsc(solution,frame,path='./',file_prefix='claw',write_aux=False,opti
         if rank==0:
             pickle.dump({'level':patch.level,
                          'names':patch.name,'lower':patch.lower_global,
-                         'num_cells':patch.num_cells_global,'delta':patch.delta}, pickle_file)
+                         'num_cells':patch.num_cells_global,'delta':patch.delta,
+                         'num_procs':PETSc.COMM_WORLD.getSize(),
+                         'proc_sizes':state.q_da.getProcSizes(),
+                         'num_ghost':state.q_da.getStencilWidth()}, pickle_file)
 #       we will reenable this bad boy when we switch over to petsc-dev
 #        state.q_da.view(viewer)
         if write_p:
-            state.gpVec.view(viewer)
+            da, vec = state._p_da, state.gpVec
         else:
-            state.gqVec.view(viewer)
+            da, vec = state.q_da, state.gqVec
+        if options['format'] == 'vtk':
+            # The VTK viewer needs the DA of the Vec
+            vec.view(viewer)
+        else:
+            _view_natural(da,vec,viewer)
         
         if write_aux:
-            state.gauxVec.view(aux_viewer)
+            _view_natural(state.aux_da,state.gauxVec,aux_viewer)
     
     viewer.flush()
     viewer.destroy()
@@ -130,6 +162,13 @@ def write_petsc(solution,frame,path='./',file_prefix='claw',write_aux=False,opti
 def read_petsc(solution,frame,path='./',file_prefix='claw',read_aux=False,options={}):
     r"""
     Read in pickles and PETSc data files representing the solution
+
+    The data are distributed over the processes of this run, whose number
+    and process grid need not be those of the run that wrote the files.
+    Frames written before the data were stored in the natural ordering
+    (whose pickle file has no ``num_procs`` entry) are in the ordering of
+    the DA of the run that wrote them, and are loaded as they are; they
+    can only be read on the same number of processes.
     
     :Input:
      - *solution* - (:class:`~pyclaw.solution.Solution`) Solution object to 
@@ -232,10 +271,14 @@ def read_petsc(solution,frame,path='./',file_prefix='claw',read_aux=False,option
 
 #       DA View/Load is broken in Petsc-3.1.8, we can load/view the DA if needed in petsc-3.2
 #       state.q_da.load(viewer)
-        state.gqVec.load(viewer)
-        
-        if read_aux:
-            state.gauxVec.load(aux_viewer)
+        if 'num_procs' in patch_dict:
+            _load_natural(state.q_da,state.gqVec,viewer)
+            if read_aux:
+                _load_natural(state.aux_da,state.gauxVec,aux_viewer)
+        else:
+            state.gqVec.load(viewer)
+            if read_aux:
+                state.gauxVec.load(aux_viewer)
         
         solution.states.append(state)
         patches.append(state.patch)
@@ -1,7 +1,15 @@
 import clawpack.pyclaw
 
 class State(clawpack.pyclaw.State):
-    r"""  See the corresponding PyClaw class documentation."""
+    r"""
+    See the corresponding PyClaw class documentation.
+
+    The arrays q, aux, p and F, and those returned by get_qbc_from_q and
+    get_auxbc_from_aux, are views of the memory of the PETSc Vecs.  They
+    are created once and kept until the Vec is replaced (by
+    set_num_ghost), and setting q or aux copies the values directly into
+    the Vec.
+    """
 
     @property
     def num_eqn(self):
@@ -53,15 +61,13 @@ class State(clawpack.pyclaw.State):
         setting q itself.
         """
         if self.q_da is None: return 0
-        shape = self.grid.num_cells
-        shape.insert(0,self.num_eqn)
-        q=self.gqVec.getArray().reshape(shape, order = 'F')
-        return q
+        return self._vec_view('q',self.gqVec)
     @q.setter
     def q(self,val):
         num_eqn = val.shape[0]
         if self.gqVec is None: self._init_q_da(num_eqn)
-        self.gqVec.setArray(val.reshape([-1], order = 'F'))
+        q = self.q
+        if val is not q: q[...] = val
 
     @property
     def p(self):
@@ -69,15 +75,13 @@ class State(clawpack.pyclaw.State):
         Array containing values of derived quantities for output.
         """
         if self._p_da is None: return 0
-        shape = self.grid.num_cells
-        shape.insert(0,self.mp)
-        p=self.gpVec.getArray().reshape(shape, order = 'F')
-        return p
+        return self._vec_view('p',self.gpVec)
     @p.setter
     def p(self,val):
         mp = val.shape[0]
         if self.gpVec is None: self.init_p_da(mp)
-        self.gpVec.setArray(val.reshape([-1], order = 'F'))
+        p = self.p
+        if val is not p: p[...] = val
 
     @property
     def F(self):
@@ -86,15 +90,13 @@ class State(clawpack.pyclaw.State):
         This is just used as temporary workspace before summing.
         """
         if self._F_da is None: return 0
-        shape = self.grid.num_cells
-        shape.insert(0,self.mF)
-        F=self.gFVec.getArray().reshape(shape, order = 'F')
-        return F
+        return self._vec_view('F',self.gFVec)
     @F.setter
-    def fset(self,val):
+    def F(self,val):
         mF = val.shape[0]
         if self.gFVec is None: self.init_F_da(mF)
-        self.gFVec.setArray(val.reshape([-1], order = 'F'))
+        F = self.F
+        if val is not F: F[...] = val
 
     @property
     def aux(self):
@@ -104,10 +106,7 @@ class State(clawpack.pyclaw.State):
         the aux values to file; everywhere else we use the local vector.
         """
         if self.aux_da is None: return None
-        shape = self.grid.num_cells
-        shape.insert(0,self.num_aux)
-        aux=self.gauxVec.getArray().reshape(shape, order = 'F')
-        return aux
+        return self._vec_view('aux',self.gauxVec)
     @aux.setter
     def aux(self,val):
         # It would be nice to make this work also for parallel
@@ -115,7 +114,9 @@ class State(clawpack.pyclaw.State):
         if self.aux_da is None: 
             num_aux=val.shape[0]
             self._init_aux_da(num_aux)
-        self.gauxVec.setArray(val.reshape([-1], order = 'F'))
+        aux = self.aux
+        if val is not aux: aux[...] = val
+        self.mark_aux_changed()
     @property
     def num_dim(self):
         return self.patch.num_dim
@@ -123,8 +124,8 @@ class State(clawpack.pyclaw.State):
 
     def __init__(self,geom,num_eqn,num_aux=0):
         r"""
-        Here we don't call super because q and aux must be properties in PetClaw
-        but should not be properties in PyClaw.
+        Here we don't call super because q and aux are held in PETSc Vecs in
+        PetClaw.
 
         :attributes:
         patch - The patch this state lives on
@@ -148,6 +149,15 @@ class State(clawpack.pyclaw.State):
         self._F_da = None
         self.gFVec = None
 
+        # Views of the arrays of the Vecs, by name: (Vec, array)
+        self._views = {}
+        # Global-to-local scatter of q_da, as (q_da, scatter), and the
+        # scatter started by start_ghost_exchange
+        self._q_scatter = None
+        self._ghost_scatter = None
+        # Version of aux, replaced by mark_aux_changed
+        self._aux_version = 0
+
         # ========== Attribute Definitions ===================================
         self.problem_data = {}
         r"""(dict) - Dictionary of global values for this patch, 
@@ -177,6 +187,7 @@ class State(clawpack.pyclaw.State):
         self.aux_da = self._create_DA(num_aux,num_ghost)
         self.gauxVec = self.aux_da.createGlobalVector()
         self.lauxVec = self.aux_da.createLocalVector()
+        self.mark_aux_changed()
  
     def _init_q_da(self,num_eqn,num_ghost=0):
         r"""
@@ -188,6 +199,21 @@ class State(clawpack.pyclaw.State):
         self.gqVec = self.q_da.createGlobalVector()
         self.lqVec = self.q_da.createLocalVector()
 
+    def _vec_view(self,name,vec,num_ghost=0):
+        r"""
+        Return the array of vec as an array of shape (dof,num_cells...),
+        with num_ghost ghost cells on each side.  The array shares the
+        memory of vec, and the same array is returned as long as vec is not
+        replaced.
+        """
+        view = self._views.get(name)
+        if view is None or view[0] is not vec:
+            shape = [n + 2*num_ghost for n in self.grid.num_cells]
+            shape.insert(0,-1)
+            view = (vec,vec.getArray().reshape(shape, order = 'F'))
+            self._views[name] = view
+        return view[1]
+
     def _create_DA(self,dof,num_ghost=0):
         r"""Returns a PETSc DA and associated global Vec.
         Note that no local vector is returned.
@@ -265,24 +291,47 @@ class State(clawpack.pyclaw.State):
     def get_qbc_from_q(self,num_ghost,qbc):
         """
         Returns q with ghost cells attached.  For PetSolver,
-        this means returning the local vector.  
+        this means returning the local vector.  The exchange of the ghost
+        cell values is completed here if it was started by
+        start_ghost_exchange.
         """
-        shape = [n + 2*num_ghost for n in self.grid.num_cells]
-        
-        self.q_da.globalToLocal(self.gqVec, self.lqVec)
-        shape.insert(0,self.num_eqn)
-        return self.lqVec.getArray().reshape(shape, order = 'F')
+        if self._ghost_scatter is not None:
+            from petsc4py import PETSc
+            self._ghost_scatter.end(self.gqVec, self.lqVec,
+                                    PETSc.InsertMode.INSERT_VALUES,
+                                    PETSc.ScatterMode.FORWARD)
+            self._ghost_scatter = None
+        else:
+            self.q_da.globalToLocal(self.gqVec, self.lqVec)
+        return self._vec_view('qbc',self.lqVec,num_ghost)
+
+    def start_ghost_exchange(self):
+        r"""
+        Start the scatter of q, ghost cells included, into the local
+        vector, so that work on the values of q owned by this process can
+        be done while the ghost cell values arrive; get_qbc_from_q
+        completes it.  This needs the global-to-local scatter of the DA,
+        the first of the scatters (gtol, ltol) returned by DA.getScatter in
+        petsc4py; without it the scatter is done at once by get_qbc_from_q.
+        """
+        if not hasattr(self.q_da,'getScatter'):
+            return
+        from petsc4py import PETSc
+        if self._q_scatter is None or self._q_scatter[0] is not self.q_da:
+            gtol, ltol = self.q_da.getScatter()
+            self._q_scatter = (self.q_da,gtol)
+        self._ghost_scatter = self._q_scatter[1]
+        self._ghost_scatter.begin(self.gqVec, self.lqVec,
+                                  PETSc.InsertMode.INSERT_VALUES,
+                                  PETSc.ScatterMode.FORWARD)
             
     def get_auxbc_from_aux(self,num_ghost,auxbc):
         """
         Returns aux with ghost cells attached.  For PetSolver,
         this means returning the local vector.  
         """
-        shape = [n + 2*num_ghost for n in self.grid.num_cells]
-        
         self.aux_da.globalToLocal(self.gauxVec, self.lauxVec)
-        shape.insert(0,self.num_aux)
-        return self.lauxVec.getArray().reshape(shape, order = 'F')
+        return self._vec_view('auxbc',self.lauxVec,num_ghost)
 
     def set_num_ghost(self,num_ghost):
         r"""
@@ -13,18 +13,19 @@ logging.config.fileConfig(_DEFAULT_LOG_CONFIG_PATH)
 __all__ = []
 
 # Module imports
-__all__.extend(['Controller','Dimension','Patch','Domain','Solution','State','CFL','plot'])
+__all__.extend(['Controller','Dimension','Patch','Domain','Solution','State','BatchedState','CFL','plot'])
 from .controller import Controller
 from .solution import Solution
 from .geometry import Dimension, Patch, Domain
-from .state import State
+from .state import State, BatchedState
 from .cfl import CFL
 
 import plot
 
-__all__.extend(['ClawSolver1D','ClawSolver2D','ClawSolver3D','SharpClawSolver1D','SharpClawSolver2D'])
-from .classic.solver import ClawSolver1D, ClawSolver2D, ClawSolver3D
-from .sharpclaw.solver import SharpClawSolver1D, SharpClawSolver2D
+__all__.extend(['ClawSolver1D','ClawSolver2D','ClawSolver3D','SharpClawSolver1D','SharpClawSolver2D',
+                'BatchedClawSolver1D','BatchedSharpClawSolver1D'])
+from .classic.solver import ClawSolver1D, ClawSolver2D, ClawSolver3D, BatchedClawSolver1D
+from .sharpclaw.solver import SharpClawSolver1D, SharpClawSolver2D, BatchedSharpClawSolver1D
 
 
 # Sub-packages
@@ -24,3 +24,25 @@ class CFL(object):
     def update_global_max(self,new_local_max):
         self._global_max = new_local_max
 
+    def finish_step(self,last=False):
+        r"""
+        Called by the solver at the end of each step.  Return whether the
+        CFL number of the steps taken since it was last checked is known;
+        in PyClaw it always is (see
+        :meth:`clawpack.petclaw.cfl.CFL.finish_step`).
+        """
+        return True
+
+    def discard_steps(self):
+        r"""
+        Called by the solver when the steps whose CFL number is not known
+        yet are retaken.
+        """
+        pass
+
+    def step_size_factor(self):
+        r"""
+        Factor applied by the solver to the time step it chooses from the
+        CFL number.
+        """
+        return 1.
@@ -5,13 +5,31 @@ This module contains the pure and wrapped classic clawpack solvers.  All
 clawpack solvers inherit from the :class:`ClawSolver` superclass which in turn 
 inherits from the :class:`~pyclaw.solver.Solver` superclass.  These
 are both pure virtual classes; the only solver classes that should be instantiated
-are the dimension-specific ones, :class:`ClawSolver1D` and :class:`ClawSolver2D`.
+are the dimension-specific ones, :class:`ClawSolver1D`, :class:`ClawSolver2D`
+and :class:`ClawSolver3D`.
 """
 
-from ..solver import Solver
+from ..solver import Solver, BatchedSolver
 
 from ..limiters import tvd
 
+def _cpointer_address(cpointer):
+    r"""
+    Return the address of the Fortran routine wrapped by the _cpointer
+    (PyCObject or PyCapsule) of an f2py Fortran object.
+    """
+    import ctypes
+    api = ctypes.pythonapi
+    if type(cpointer).__name__ == 'PyCObject':
+        function = api.PyCObject_AsVoidPtr
+        function.argtypes = [ctypes.py_object]
+        function.restype = ctypes.c_void_p
+        return function(cpointer)
+    function = api.PyCapsule_GetPointer
+    function.argtypes = [ctypes.py_object,ctypes.c_char_p]
+    function.restype = ctypes.c_void_p
+    return function(cpointer,None)
+
 # ============================================================================
 #  Generic Clawpack solver class
 # ============================================================================
@@ -126,12 +144,18 @@ class ClawSolver(Solver):
         """
 
         if self.before_step is not None:
+            self.timings.start('before_step')
             self.before_step(self,solution.states[0])
+            self.timings.stop()
 
         if self.source_split == 2 and self.step_source is not None:
+            self.timings.start('source')
             self.step_source(self,solution.states[0],self.dt/2.0)
+            self.timings.stop()
     
+        self.timings.start('hyperbolic')
         self.step_hyperbolic(solution)
+        self.timings.stop()
 
         # Check here if the CFL condition is satisfied. 
         # If not, return # immediately to evolve_to_time and let it deal with
@@ -140,6 +164,7 @@ class ClawSolver(Solver):
             return False
 
         if self.step_source is not None:
+            self.timings.start('source')
             # Strang splitting
             if self.source_split == 2:
                 self.step_source(self,solution.states[0],self.dt/2.0)
@@ -147,6 +172,7 @@ class ClawSolver(Solver):
             # Godunov Splitting
             if self.source_split == 1:
                 self.step_source(self,solution.states[0],self.dt)
+            self.timings.stop()
                 
         return True
             
@@ -216,8 +242,10 @@ class ClawSolver(Solver):
                 self.fmod = __import__(so_name,fromlist=['clawpack.pyclaw.classic'])
             self.set_fortran_parameters(solution)
             self.allocate_workspace(solution)
-        elif self.num_dim>1:
-            raise Exception('Only Fortran kernels are supported in multi-D.')
+        elif self.num_dim>1 and not self.dimensional_split \
+                and self.transverse_waves != self.no_trans:
+            if self.rp_transverse is None:
+                raise Exception('Set solver.rp_transverse to use transverse waves with the Python kernel.')
 
         self.allocate_bc_arrays(solution.states[0])
 
@@ -245,6 +273,259 @@ class ClawSolver(Solver):
         if(self.kernel_language == 'Fortran'):
             del self.fmod
 
+    # ========== Python kernel in multi-D ===================================
+    def python_step_hyperbolic(self,solution):
+        r"""
+        Take one time step on the homogeneous hyperbolic system with the
+        vectorized Python implementation of the wave propagation algorithm
+        in 2D or 3D.
+
+        Each sweep solves the Riemann problems at all the interfaces normal
+        to one direction with a single call to :attr:`rp`, whose signature is
+
+            rp(q_l,q_r,aux_l,aux_r,problem_data,idir)
+
+        where idir is the direction (0 for x, 1 for y, 2 for z) and the
+        other arguments and the outputs are as for the 1D Python Riemann
+        solvers, with all interfaces of the grid along the last axis.
+        Without dimensional splitting, the transverse fluctuations are
+        computed by :attr:`rp_transverse` (see
+        :meth:`python_transverse_update`).
+        """
+        state = solution.states[0]
+
+        self.apply_q_bcs(state)
+        if state.num_aux > 0:
+            self.update_aux_bcs(state)
+            aux = self.auxbc
+        else:
+            aux = None
+
+        cfl = 0.0
+        if self.dimensional_split:
+            # Each sweep starts from the result of the previous one
+            for idir in xrange(self.num_dim):
+                cfl = max(cfl,self.python_sweep(state,self.qbc,self.qbc,aux,idir))
+        else:
+            qold = self.qbc.copy('F')
+            transverse = self.transverse_waves != self.no_trans
+            for idir in xrange(self.num_dim):
+                cfl = max(cfl,self.python_sweep(state,qold,self.qbc,aux,idir,transverse))
+
+        self.timings.start('cfl')
+        self.cfl.update_global_max(cfl)
+        self.timings.stop()
+        state.set_q_from_qbc(self.num_ghost,self.qbc)
+
+    def python_sweep(self,state,qold,qnew,aux,idir,transverse=False):
+        r"""
+        Add to qnew the update computed from the Riemann problems at the
+        interfaces of qold normal to direction idir, and return the CFL
+        number of the sweep.  qold may be the same array as qnew.
+
+        The arrays are handled with direction idir as the last axis, so
+        that the rows of interfaces are laid end to end when flattened for
+        the Riemann solver, and are limited together by :func:`tvd.limit`.
+        """
+        import numpy as np
+
+        grid = state.grid
+        num_eqn,num_ghost = state.num_eqn,self.num_ghost
+        n = grid.num_cells[idir] + 2*num_ghost
+        last = qold.ndim - 1
+
+        q = np.rollaxis(qold,idir+1,qold.ndim)
+        dq = np.rollaxis(qnew,idir+1,qnew.ndim)
+        shape = q.shape[1:-1] + (n-1,)
+        q_l = q[...,:-1].reshape(num_eqn,-1)
+        q_r = q[...,1:].reshape(num_eqn,-1)
+        if aux is not None:
+            num_aux = aux.shape[0]
+            auxd = np.rollaxis(aux,idir+1,aux.ndim)
+            aux_l = auxd[...,:-1].reshape(num_aux,-1)
+            aux_r = auxd[...,1:].reshape(num_aux,-1)
+        else:
+            auxd = None
+            aux_l = None
+            aux_r = None
+
+        # dt/dx at each cell
+        dtdx = np.empty(q.shape[1:])
+        if state.index_capa >= 0:
+            capa = np.rollaxis(aux[state.index_capa],idir,last)
+            dtdx[...] = self.dt / (grid.delta[idir] * capa)
+        else:
+            capa = None
+            dtdx.fill(self.dt/grid.delta[idir])
+        dtdx_l = dtdx[...,:-1]
+        dtdx_r = dtdx[...,1:]
+
+        wave,s,amdq,apdq = self.rp(q_l,q_r,aux_l,aux_r,state.problem_data,idir)
+        num_waves = wave.shape[1]
+        wave = wave.reshape((num_eqn,num_waves)+shape)
+        s = s.reshape((num_waves,)+shape)
+        amdq = amdq.reshape((num_eqn,)+shape)
+        apdq = apdq.reshape((num_eqn,)+shape)
+
+        # Godunov update
+        dq[...,1:] -= dtdx_r*apdq
+        dq[...,:-1] -= dtdx_l*amdq
+
+        # Maximum wave speed at the interfaces of the interior cells
+        edges = slice(num_ghost-1,n-num_ghost)
+        cfl = max(np.max(dtdx_r[...,edges]*s[...,edges]),
+                  np.max(-dtdx_l[...,edges]*s[...,edges]))
+
+        if self.order == 2:
+            limiter = np.array(self._mthlim,ndmin=1)
+            if (limiter > 0).any():
+                wave = tvd.limit(num_eqn,wave,s,limiter,dtdx)
+
+            # Correction fluxes for the second order q_{xx} terms
+            sabs = np.abs(s)
+            om = 1.0 - sabs*0.5*(dtdx_l+dtdx_r)
+            if self.fwave:
+                coeff = np.sign(s) * om
+            else:
+                coeff = sabs * om
+            cqxx = np.sum(coeff*wave,axis=1)
+            dq[...,1:-1] -= 0.5 * dtdx[...,1:-1] * (cqxx[...,1:] - cqxx[...,:-1])
+        else:
+            cqxx = None
+
+        if transverse:
+            self.python_transverse_update(state,q_l,q_r,auxd,capa,dtdx,
+                                          amdq,apdq,cqxx,dq,idir)
+
+        return cfl
+
+    def python_transverse_update(self,state,q_l,q_r,aux,capa,dtdx,amdq,apdq,cqxx,dq,idir):
+        r"""
+        Split the fluctuations amdq and apdq at the interfaces normal to
+        direction idir into fluctuations propagating in the transverse
+        directions with :attr:`rp_transverse`, and add their contribution to
+        dq.  If cqxx is not None, the correction fluxes cqxx are propagated
+        as well when transverse_waves asks for transverse correction waves.
+        In 3D, the transverse fluctuations are split once more in the other
+        transverse direction when transverse_waves is 11, 21 or 22 (see
+        :class:`ClawSolver3D`), which gives the corner transport terms of
+        the unsplit algorithm of step3.f90.
+
+        All arrays have direction idir as their last axis; the transverse
+        directions are the axes in between, in increasing order.  The
+        signature of rp_transverse is
+
+            rp_transverse(q_l,q_r,aux_below,aux_center,aux_above,problem_data,idir,imp,asdq)
+
+        in 2D and
+
+            rp_transverse(q_l,q_r,aux_below,aux_center,aux_above,problem_data,idir,imp,asdq,jdir)
+
+        in 3D.  asdq holds fluctuations that enter the cells to the left
+        (imp = 0) or right (imp = 1) of the interfaces, or in 3D the
+        neighbours of these cells in a transverse direction; they are split
+        in the transverse direction jdir.  The aux values are those of the
+        cells that asdq enters and of their neighbours in the transverse
+        direction, and the output is the pair (bmasdq,bpasdq) of the
+        fluctuations going down and up in that direction.
+        """
+        import numpy as np
+
+        grid = state.grid
+        num_eqn = state.num_eqn
+        num_dim = grid.num_dim
+        if num_dim == 2:
+            corrections = self.transverse_waves == self.trans_cor
+            corner_waves = 0
+        else:
+            corrections,corner_waves = divmod(self.transverse_waves,10)
+            corrections = corrections == 2
+        if not corrections:
+            cqxx = None
+
+        # Transverse axes of the arrays and the directions they stand for
+        axes = range(1,num_dim)
+        tdir = dict(zip(axes,[d for d in xrange(num_dim) if d != idir]))
+
+        # The interfaces that are not in the outer layer of rows are split
+        rows = slice(1,-1)
+        inner = (slice(None),) + (rows,)*(num_dim-1) + (slice(None),)
+        interior = amdq[inner].shape
+        q_l = q_l.reshape(amdq.shape)[inner].reshape(num_eqn,-1)
+        q_r = q_r.reshape(amdq.shape)[inner].reshape(num_eqn,-1)
+
+        def cells_of(side,shift={}):
+            # Index of the cells next to the split interfaces, shifted
+            # by shift[axis] along the transverse axes
+            index = [slice(None)]
+            for axis in axes:
+                offset = shift.get(axis,0)
+                index.append(slice(1+offset,offset-1 if offset < 1 else None))
+            return tuple(index + [side])
+
+        def split(asdq,imp,side,axis,shift={}):
+            if aux is not None:
+                num_aux = aux.shape[0]
+                neighbours = []
+                for k in (-1,0,1):
+                    neighbour = dict(shift)
+                    neighbour[axis] = shift.get(axis,0) + k
+                    neighbours.append(aux[cells_of(side,neighbour)].reshape(num_aux,-1))
+                aux_below,aux_center,aux_above = neighbours
+            else:
+                aux_below = aux_center = aux_above = None
+            args = (q_l,q_r,aux_below,aux_center,aux_above,
+                    state.problem_data,idir,imp,asdq.reshape(num_eqn,-1))
+            if num_dim == 3:
+                args += (tdir[axis],)
+            bmasdq,bpasdq = self.rp_transverse(*args)
+            return bmasdq.reshape(interior),bpasdq.reshape(interior)
+
+        # Modifications of the fluxes through the lower and upper faces
+        # of each cell in each transverse direction
+        g_down = dict((axis,np.zeros(dq.shape)) for axis in axes)
+        g_up = dict((axis,np.zeros(dq.shape)) for axis in axes)
+        for imp,(asdq,side,sign) in enumerate([(amdq,slice(None,-1),1.),
+                                               (apdq,slice(1,None),-1.)]):
+            asdq = asdq[inner]
+            cells = cells_of(side)
+            dtdx_cells = dtdx[cells[1:]]
+            if cqxx is not None:
+                increment = asdq + sign*cqxx[inner]
+            else:
+                increment = asdq
+            for axis in axes:
+                bmasdq,bpasdq = split(increment,imp,side,axis)
+                g_down[axis][cells] -= 0.5*dtdx_cells*bmasdq
+                g_up[axis][cells] -= 0.5*dtdx_cells*bpasdq
+
+            if corner_waves:
+                if cqxx is not None and corner_waves == 2:
+                    increment = asdq + 1.5*sign*cqxx[inner]
+                else:
+                    increment = asdq
+                for axis in axes:
+                    other = 3 - axis
+                    coeff = dtdx_cells*self.dt/grid.delta[tdir[other]]/6.
+                    csasdq = split(increment,imp,side,other)
+                    for offset,fluctuation in zip((-1,1),csasdq):
+                        shifted = cells_of(side,{other:offset})
+                        bmcsasdq,bpcsasdq = split(fluctuation,imp,side,axis,{other:offset})
+                        g_down[axis][cells] += offset*coeff*bmcsasdq
+                        g_up[axis][cells] += offset*coeff*bpcsasdq
+                        g_down[axis][shifted] -= offset*coeff*bmcsasdq
+                        g_up[axis][shifted] -= offset*coeff*bpcsasdq
+
+        if capa is None:
+            capa = np.ones(dtdx.shape)
+        for axis in axes:
+            dtdy = self.dt/grid.delta[tdir[axis]]
+            def along(index):
+                return (slice(None),)*axis + (index,)
+            center,below,above = along(rows),along(slice(None,-2)),along(slice(2,None))
+            dq[center] -= dtdy/capa[center[1:]] * (g_up[axis][center] - g_down[axis][center])
+            dq[below] -= dtdy/capa[below[1:]] * g_down[axis][center]
+            dq[above] += dtdy/capa[above[1:]] * g_up[axis][center]
 
 
 # ============================================================================
@@ -291,7 +572,7 @@ class ClawSolver1D(ClawSolver):
 
         self.apply_q_bcs(state)
         if state.num_aux > 0:
-            self.apply_aux_bcs(state)
+            self.update_aux_bcs(state)
             
         num_eqn,num_ghost = state.num_eqn,self.num_ghost
           
@@ -305,11 +586,6 @@ class ClawSolver1D(ClawSolver):
             
         elif(self.kernel_language == 'Python'):
  
-            q   = self.qbc
-            aux = self.auxbc
-            # Limiter to use in the pth family
-            limiter = np.array(self._mthlim,ndmin=1)  
-        
             dtdx = np.zeros( (2*self.num_ghost+grid.num_cells[0]) )
 
             # Find local value for dt/dx
@@ -317,76 +593,136 @@ class ClawSolver1D(ClawSolver):
                 dtdx = self.dt / (grid.delta[0] * state.aux[state.index_capa,:])
             else:
                 dtdx += self.dt/grid.delta[0]
-        
-            # Solve Riemann problem at each interface
-            q_l=q[:,:-1]
-            q_r=q[:,1:]
-            if state.aux is not None:
-                aux_l=aux[:,:-1]
-                aux_r=aux[:,1:]
-            else:
-                aux_l = None
-                aux_r = None
-            wave,s,amdq,apdq = self.rp(q_l,q_r,aux_l,aux_r,state.problem_data)
-            
-            # Update loop limits, these are the limits for the Riemann solver
-            # locations, which then update a grid cell value
-            # We include the Riemann problem just outside of the grid so we can
-            # do proper limiting at the grid edges
-            #        LL    |                               |     UL
-            #  |  LL |     |     |     |  ...  |     |     |  UL  |     |
-            #              |                               |
 
-            LL = self.num_ghost - 1
-            UL = self.num_ghost + grid.num_cells[0] + 1 
+            aux = self.auxbc if state.aux is not None else None
+            s = self.python_step1(state,self.qbc,aux,dtdx)
 
-            # Update q for Godunov update
-            for m in xrange(num_eqn):
-                q[m,LL:UL] -= dtdx[LL:UL]*apdq[m,LL-1:UL-1]
-                q[m,LL-1:UL-1] -= dtdx[LL-1:UL-1]*amdq[m,LL-1:UL-1]
-        
             # Compute maximum wave speed
+            LL = self.num_ghost - 1
+            UL = self.num_ghost + grid.num_cells[0] + 1 
             cfl = 0.0
-            for mw in xrange(wave.shape[1]):
+            for mw in xrange(s.shape[0]):
                 smax1 = np.max(dtdx[LL:UL]*s[mw,LL-1:UL-1])
                 smax2 = np.max(-dtdx[LL-1:UL-1]*s[mw,LL-1:UL-1])
                 cfl = max(cfl,smax1,smax2)
 
-            # If we are doing slope limiting we have more work to do
-            if self.order == 2:
-                # Initialize flux corrections
-                f = np.zeros( (num_eqn,grid.num_cells[0] + 2*self.num_ghost) )
-            
-                # Apply Limiters to waves
-                if (limiter > 0).any():
-                    wave = tvd.limit(state.num_eqn,wave,s,limiter,dtdx)
-
-                # Compute correction fluxes for second order q_{xx} terms
-                dtdxave = 0.5 * (dtdx[LL-1:UL-1] + dtdx[LL:UL])
-                if self.fwave:
-                    for mw in xrange(wave.shape[1]):
-                        sabs = np.abs(s[mw,LL-1:UL-1])
-                        om = 1.0 - sabs*dtdxave[:UL-LL]
-                        ssign = np.sign(s[mw,LL-1:UL-1])
-                        for m in xrange(num_eqn):
-                            f[m,LL:UL] += 0.5 * ssign * om * wave[m,mw,LL-1:UL-1]
-                else:
-                    for mw in xrange(wave.shape[1]):
-                        sabs = np.abs(s[mw,LL-1:UL-1])
-                        om = 1.0 - sabs*dtdxave[:UL-LL]
-                        for m in xrange(num_eqn):
-                            f[m,LL:UL] += 0.5 * sabs * om * wave[m,mw,LL-1:UL-1]
-
-                # Update q by differencing correction fluxes
-                for m in xrange(num_eqn):
-                    q[m,LL:UL-1] -= dtdx[LL:UL-1] * (f[m,LL+1:UL] - f[m,LL:UL-1]) 
-
         else: raise Exception("Unrecognized kernel_language; choose 'Fortran' or 'Python'")
 
+        self.timings.start('cfl')
         self.cfl.update_global_max(cfl)
+        self.timings.stop()
         state.set_q_from_qbc(num_ghost,self.qbc)
+
+    def python_step1(self,state,q,aux,dtdx):
+        r"""
+        Take one step of the Python kernel on the array q, which includes
+        the ghost cells, in place, and return the wave speeds s at the
+        interfaces between its cells.
+
+        :Input:
+         - *state* - (:class:`~pyclaw.state.State`) State whose
+           problem_data is passed to the Riemann solver
+         - *q* - (ndarray(num_eqn,n)) Solution with ghost cells
+         - *aux* - (ndarray(num_aux,n)) Auxiliary fields with ghost cells, or
+           None
+         - *dtdx* - (ndarray(n)) :math:`\Delta t / \Delta x` at each cell
+        """
+        import numpy as np
+
+        num_eqn = q.shape[0]
+        # Limiter to use in the pth family
+        limiter = np.array(self._mthlim,ndmin=1)  
+
+        # Solve Riemann problem at each interface
+        q_l=q[:,:-1]
+        q_r=q[:,1:]
+        if aux is not None:
+            aux_l=aux[:,:-1]
+            aux_r=aux[:,1:]
+        else:
+            aux_l = None
+            aux_r = None
+        wave,s,amdq,apdq = self.rp(q_l,q_r,aux_l,aux_r,state.problem_data)
+        
+        # Update loop limits, these are the limits for the Riemann solver
+        # locations, which then update a grid cell value
+        # We include the Riemann problem just outside of the grid so we can
+        # do proper limiting at the grid edges
+        #        LL    |                               |     UL
+        #  |  LL |     |     |     |  ...  |     |     |  UL  |     |
+        #              |                               |
+
+        LL = self.num_ghost - 1
+        UL = q.shape[1] - self.num_ghost + 1
+
+        # Update q for Godunov update
+        for m in xrange(num_eqn):
+            q[m,LL:UL] -= dtdx[LL:UL]*apdq[m,LL-1:UL-1]
+            q[m,LL-1:UL-1] -= dtdx[LL-1:UL-1]*amdq[m,LL-1:UL-1]
+
+        # If we are doing slope limiting we have more work to do
+        if self.order == 2:
+            # Initialize flux corrections
+            f = np.zeros( (num_eqn,q.shape[1]) )
+        
+            # Apply Limiters to waves
+            if (limiter > 0).any():
+                wave = tvd.limit(num_eqn,wave,s,limiter,dtdx)
+
+            # Compute correction fluxes for second order q_{xx} terms
+            dtdxave = 0.5 * (dtdx[LL-1:UL-1] + dtdx[LL:UL])
+            if self.fwave:
+                for mw in xrange(wave.shape[1]):
+                    sabs = np.abs(s[mw,LL-1:UL-1])
+                    om = 1.0 - sabs*dtdxave[:UL-LL]
+                    ssign = np.sign(s[mw,LL-1:UL-1])
+                    for m in xrange(num_eqn):
+                        f[m,LL:UL] += 0.5 * ssign * om * wave[m,mw,LL-1:UL-1]
+            else:
+                for mw in xrange(wave.shape[1]):
+                    sabs = np.abs(s[mw,LL-1:UL-1])
+                    om = 1.0 - sabs*dtdxave[:UL-LL]
+                    for m in xrange(num_eqn):
+                        f[m,LL:UL] += 0.5 * sabs * om * wave[m,mw,LL-1:UL-1]
+
+            # Update q by differencing correction fluxes
+            for m in xrange(num_eqn):
+                q[m,LL:UL-1] -= dtdx[LL:UL-1] * (f[m,LL+1:UL] - f[m,LL:UL-1]) 
+
+        return s
+
+
+class BatchedClawSolver1D(BatchedSolver,ClawSolver1D):
+    r"""
+    Clawpack solver advancing a batch of independent 1D problems at once.
+
+    The problems, held by a :class:`~pyclaw.state.BatchedState`, share the
+    grid and the solver settings, and differ in their initial data, aux
+    arrays and problem_data.  One step of the Python kernel of
+    :class:`ClawSolver1D`, with a single call to the (vectorized) Riemann
+    solver, advances the whole batch; the boundary conditions and the
+    bookkeeping of evolve_to_time are also done once for the batch.  See
+    :class:`~pyclaw.solver.BatchedSolver` for the choice of step sizes.
+    """
+    def step_hyperbolic(self,solution):
+        r"""
+        Take one time step on the homogeneous hyperbolic system, for all the
+        members of the batch.
+        """
+        state = solution.states[0]
+
+        self.apply_q_bcs(state)
         if state.num_aux > 0:
-            state.set_aux_from_auxbc(num_ghost,self.auxbc)
+            self.update_aux_bcs(state)
+            aux = self.batch_view(self.auxbc)
+        else:
+            aux = None
+
+        dtdx = self.batch_dtdx(state)
+        s = self.python_step1(state,self.batch_view(self.qbc),aux,dtdx)
+        self.update_batch_cfl(s,dtdx)
+
+        state.set_q_from_qbc(self.num_ghost,self.qbc)
    
 
 # ============================================================================
@@ -426,7 +762,34 @@ class ClawSolver2D(ClawSolver):
         ClawSolver2D.trans_cor: Transverse increment waves and transverse
         correction waves are computed and propagated.
 
-    Note that only the fortran routines are supported for now in 2D.
+    .. attribute:: rp_transverse
+
+        Transverse Riemann solver used by the Python kernel when
+        dimensional_split is False and transverse_waves is not no_trans; see
+        :meth:`~ClawSolver.python_transverse_update` for its signature.
+        With the Python kernel, :attr:`rp` is the normal Riemann solver
+        described in :meth:`~ClawSolver.python_step_hyperbolic`.
+        ``Default = None``
+
+    .. attribute:: num_threads
+
+        Number of threads used by the Fortran kernel.  If it is larger than
+        1, each step (or each sweep, with dimensional splitting) is taken on
+        that many tiles of the grid in a pool of threads; see
+        :meth:`tiled_step`.  The Riemann solvers must not write to shared
+        variables (such as common blocks used as workspace) nor use the
+        indices of the common block comxyt, which are not set by the tiles.
+        ``Default = 1``
+
+    .. attribute:: overlap_ghost_exchange
+
+        If True, the unsplit Fortran kernel updates the cells that do not
+        depend on ghost cell values while the ghost cell values are
+        exchanged between processes (see :meth:`overlapped_step`).  This
+        hides the latency of the exchange in PetClaw runs on many
+        processes; it has no effect with dimensional splitting, with more
+        than one thread, or on patches of at most 2*num_ghost cells in
+        some direction.  ``Default = False``
     """
 
     no_trans  = 0
@@ -443,12 +806,20 @@ class ClawSolver2D(ClawSolver):
         self.transverse_waves = self.trans_inc
 
         self.num_dim = 2
+        self.rp_transverse = None
 
         self.aux1 = None
         self.aux2 = None
         self.aux3 = None
         self.work = None
 
+        self.num_threads = 1
+        self._thread_pool = None
+        self._tile_workspaces = []
+        self._tile_arrays = {}
+        self.overlap_ghost_exchange = False
+        self._overlap_aux_key = None
+
         super(ClawSolver2D,self).__init__(riemann_solver)
 
     def check_cfl_settings(self):
@@ -492,6 +863,210 @@ class ClawSolver2D(ClawSolver):
         self.aux3 = np.empty((num_aux,maxm+2*num_ghost),order='F')
         mwork = (maxm+2*num_ghost) * (5*num_eqn + num_waves + num_eqn*num_waves)
         self.work = np.empty((mwork),order='F')
+        self._tile_workspaces = []
+        self._tile_arrays = {}
+
+    def teardown(self):
+        r"""
+        Close the pool of threads used by :meth:`tiled_step` and delete
+        Fortran objects.
+        """
+        if self._thread_pool is not None:
+            self._thread_pool.close()
+            self._thread_pool = None
+        super(ClawSolver2D,self).teardown()
+
+    def tiled_step(self,state,qold,idir=None):
+        r"""
+        Update self.qbc with the Fortran kernel, called in parallel on
+        num_threads tiles of the grid, and return the CFL number.
+
+        If idir is None, take an unsplit step with step2.  The grid is split
+        into strips along y; each tile holds num_ghost rows of its
+        neighbours on each side, and only its own rows are copied back.
+
+        If idir is 1 or 2, take the x or y sweep of a dimensionally split
+        step with step2ds.  The sweeps along different rows (columns) are
+        independent, so the rows (columns) of qbc, ghost cells included,
+        are split into disjoint blocks.
+
+        The tiles along y are contiguous parts of qold, qbc and auxbc, which
+        are passed without copies; the x sweep updates qbc in place, and an
+        unsplit step updates a copy of the strip of qold in an array kept
+        for each tile.  The tiles of the y sweep are copied to and from
+        arrays kept for each tile.  Each tile has its own work arrays, and
+        the result is identical to that of a single call on the whole grid.
+        The tiles are computed by step2_by_address and step2ds_by_address,
+        which take the Riemann solvers by address rather than as f2py
+        call-back arguments, do not write the indices of the common block
+        comxyt, and release the GIL, so that they run concurrently.
+        """
+        import numpy as np
+        from multiprocessing.pool import ThreadPool
+
+        num_ghost = self.num_ghost
+        dx,dy = state.grid.delta
+        mx,my = state.grid.num_cells
+        maxm = max(mx,my)
+        rpn2 = _cpointer_address(self.rp.rpn2._cpointer)
+        rpt2 = _cpointer_address(self.rp.rpt2._cpointer)
+
+        # Extents of the tiles in qbc along the tiled axis
+        if idir is None:
+            axis = 2
+            n = self.num_threads
+            bounds = [(k*my)/n for k in xrange(n+1)]
+            extents = [(a,b+2*num_ghost) for a,b in zip(bounds[:-1],bounds[1:]) if b > a]
+        else:
+            axis = 3 - idir
+            size = self.qbc.shape[axis]
+            n = max(1,min(self.num_threads,size/(2*num_ghost+1)))
+            bounds = [(k*size)/n for k in xrange(n+1)]
+            extents = zip(bounds[:-1],bounds[1:])
+
+        while len(self._tile_workspaces) < len(extents):
+            self._tile_workspaces.append((np.empty(self.aux1.shape,order='F'),
+                                          np.empty(self.aux2.shape,order='F'),
+                                          np.empty(self.aux3.shape,order='F'),
+                                          np.empty(self.work.shape,order='F')))
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPool(self.num_threads)
+
+        def tile_copy(k,name,block):
+            # Copy of block in the array kept for tile k
+            copy = self._tile_arrays.get((k,name))
+            if copy is None or copy.shape != block.shape:
+                copy = np.empty(block.shape,order='F')
+                self._tile_arrays[(k,name)] = copy
+            copy[...] = block
+            return copy
+
+        def step_tile(k):
+            a,b = extents[k]
+            aux1,aux2,aux3,work = self._tile_workspaces[k]
+            mx_t,my_t = mx,my
+            if axis == 1:
+                mx_t = b - a - 2*num_ghost
+                qnew_t = tile_copy(k,'q',self.qbc[:,a:b,:])
+                qold_t = qnew_t
+                aux_t = tile_copy(k,'aux',self.auxbc[:,a:b,:])
+            else:
+                my_t = b - a - 2*num_ghost
+                qold_t = qold[:,:,a:b]
+                aux_t = self.auxbc[:,:,a:b]
+                if idir is None:
+                    qnew_t = tile_copy(k,'q',qold_t)
+                else:
+                    qnew_t = self.qbc[:,:,a:b]
+            if idir is None:
+                return self.fmod.step2_by_address(maxm,num_ghost,mx_t,my_t,
+                      qold_t,qnew_t,aux_t,dx,dy,self.dt,self._method,self._mthlim,
+                      aux1,aux2,aux3,work,self.fwave,rpn2,rpt2)
+            else:
+                return self.fmod.step2ds_by_address(maxm,num_ghost,mx_t,my_t,
+                      qold_t,qnew_t,aux_t,dx,dy,self.dt,self._method,self._mthlim,
+                      aux1,aux2,aux3,work,idir,self.fwave,rpn2,rpt2)
+
+        results = self._thread_pool.map(step_tile,range(len(extents)))
+
+        cfl = 0.
+        for (a,b),(qnew_t,cfl_t) in zip(extents,results):
+            if idir is None:
+                self.qbc[:,:,a+num_ghost:b-num_ghost] = qnew_t[:,:,num_ghost:-num_ghost]
+            elif axis == 1:
+                self.qbc[:,a:b,:] = qnew_t
+            cfl = max(cfl,cfl_t)
+        return cfl
+
+    def overlapped_step(self,state,aux_filled=True):
+        r"""
+        Take an unsplit step with the Fortran kernel while the ghost cell
+        values of q are exchanged between processes, and return the CFL
+        number.
+
+        The exchange is started first (see :meth:`start_q_bcs`), and the
+        cells at least num_ghost cells away from the edges of the patch,
+        whose update only needs values of q owned by this process, are
+        updated from state.q.  Then the exchange is completed, the boundary
+        conditions are applied, and the four strips of num_ghost cells
+        along the edges are updated.  As in :meth:`tiled_step`, each part
+        is computed on a block of the grid extended by num_ghost cells on
+        each side, so that the result is identical to that of a single call
+        on the whole grid.
+
+        state.q and the blocks of the lower and upper strips along y are
+        contiguous and are passed without copies.  The blocks of the strips
+        along x, and the block of auxbc of the interior, are copied to
+        arrays kept between steps; the blocks of auxbc are copied again
+        only if aux_filled is True (auxbc was filled for this step, see
+        :meth:`~pyclaw.solver.Solver.update_aux_bcs`) or auxbc was filled
+        since they were copied.
+        """
+        import numpy as np
+
+        num_ghost = self.num_ghost
+        dx,dy = state.grid.delta
+        mx,my = state.grid.num_cells
+        maxm = max(mx,my)
+        rpn2 = self.rp.rpn2._cpointer
+        rpt2 = self.rp.rpt2._cpointer
+
+        copy_aux = aux_filled or self._overlap_aux_key != self._aux_bc_key
+        self._overlap_aux_key = self._aux_bc_key
+
+        def block_copy(name,block,refresh=True):
+            # Copy of block in the array kept for name
+            copy = self._tile_arrays.get(('overlap',name))
+            if copy is None or copy.shape != block.shape:
+                copy = np.empty(block.shape,order='F')
+                self._tile_arrays[('overlap',name)] = copy
+            elif not refresh:
+                return copy
+            copy[...] = block
+            return copy
+
+        def step_block(qold_b,aux_b,name):
+            # Update the cells of a block at least num_ghost cells away from
+            # its edges, in a copy of qold_b kept for name
+            qnew_b, cfl_b = self.fmod.step2(maxm,num_ghost,
+                  qold_b.shape[1]-2*num_ghost,qold_b.shape[2]-2*num_ghost,
+                  qold_b,block_copy(name,qold_b),aux_b,dx,dy,self.dt,
+                  self._method,self._mthlim,self.aux1,self.aux2,self.aux3,self.work,
+                  self.fwave,rpn2,rpt2)
+            return qnew_b[:,num_ghost:-num_ghost,num_ghost:-num_ghost], cfl_b
+
+        self.start_q_bcs(state)
+
+        # Cells away from the edges, from the values of q owned by this
+        # process (whose indices are those of qbc shifted by num_ghost)
+        interior, cfl = step_block(state.q,
+                                   block_copy('aux',self.auxbc[:,num_ghost:mx+num_ghost,
+                                                               num_ghost:my+num_ghost],copy_aux),
+                                   'q')
+
+        self.apply_q_bcs(state)
+        # The strips read qbc, which is only updated once they are computed
+        x_lower, x_upper = slice(0,3*num_ghost), slice(mx-num_ghost,mx+2*num_ghost)
+        y_inner = slice(num_ghost,my+num_ghost)
+        strips = [step_block(self.qbc[:,:,:3*num_ghost],self.auxbc[:,:,:3*num_ghost],
+                             'y_lower'),
+                  step_block(self.qbc[:,:,my-num_ghost:],self.auxbc[:,:,my-num_ghost:],
+                             'y_upper'),
+                  step_block(block_copy('x_lower_old',self.qbc[:,x_lower,y_inner]),
+                             block_copy('x_lower_aux',self.auxbc[:,x_lower,y_inner],copy_aux),
+                             'x_lower'),
+                  step_block(block_copy('x_upper_old',self.qbc[:,x_upper,y_inner]),
+                             block_copy('x_upper_aux',self.auxbc[:,x_upper,y_inner],copy_aux),
+                             'x_upper')]
+
+        self.qbc[:,2*num_ghost:mx,2*num_ghost:my] = interior
+        for (x0,x1,y0,y1),(q_b,cfl_b) in zip([(num_ghost,mx+num_ghost,num_ghost,2*num_ghost),
+                                            (num_ghost,mx+num_ghost,my,my+num_ghost),
+                                            (num_ghost,2*num_ghost,2*num_ghost,my),
+                                            (mx,mx+num_ghost,2*num_ghost,my)],strips):
+            self.qbc[:,x0:x1,y0:y1] = q_b
+            cfl = max(cfl,cfl_b)
+        return cfl
 
 
     # ========== Hyperbolic Step =====================================
@@ -509,16 +1084,29 @@ class ClawSolver2D(ClawSolver):
             dx,dy = grid.delta
             mx,my = grid.num_cells
             maxm = max(mx,my)
+            overlap = self.overlap_ghost_exchange and not self.dimensional_split \
+                      and self.num_threads == 1 and min(mx,my) > 2*self.num_ghost
             
-            self.apply_q_bcs(state)
-            if state.num_aux > 0:
-                self.apply_aux_bcs(state)
-            qold = self.qbc.copy('F')
+            aux_filled = state.num_aux > 0 and self.update_aux_bcs(state)
+            if not overlap:
+                self.apply_q_bcs(state)
+                qold = self.qbc.copy('F')
             
             rpn2 = self.rp.rpn2._cpointer
             rpt2 = self.rp.rpt2._cpointer
 
-            if self.dimensional_split:
+            if overlap:
+                cfl = self.overlapped_step(state,aux_filled)
+
+            elif self.num_threads > 1:
+                if self.dimensional_split:
+                    cfl_x = self.tiled_step(state,qold,1)
+                    cfl_y = self.tiled_step(state,self.qbc,2)
+                    cfl = max(cfl_x,cfl_y)
+                else:
+                    cfl = self.tiled_step(state,qold)
+
+            elif self.dimensional_split:
                 #Right now only Godunov-dimensional-splitting is implemented.
                 #Strang-dimensional-splitting could be added following dimsp2.f in Clawpack.
 
@@ -538,13 +1126,15 @@ class ClawSolver2D(ClawSolver):
                       qold,self.qbc,self.auxbc,dx,dy,self.dt,self._method,self._mthlim,\
                       self.aux1,self.aux2,self.aux3,self.work,self.fwave,rpn2,rpt2)
 
+            self.timings.start('cfl')
             self.cfl.update_global_max(cfl)
+            self.timings.stop()
             state.set_q_from_qbc(self.num_ghost,self.qbc)
-            if state.num_aux > 0:
-                state.set_aux_from_auxbc(self.num_ghost,self.auxbc)
 
-        else:
-            raise NotImplementedError("No python implementation for step_hyperbolic in 2D.")
+        elif(self.kernel_language == 'Python'):
+            self.python_step_hyperbolic(solution)
+
+        else: raise Exception("Unrecognized kernel_language; choose 'Fortran' or 'Python'")
 
 # ============================================================================
 #  ClawPack 3d Solver Class
@@ -583,8 +1173,20 @@ class ClawSolver3D(ClawSolver):
         ClawSolver3D.trans_cor: Transverse increment waves and transverse
         correction waves are computed and propagated.
 
-    Note that only Fortran routines are supported for now in 3D --
-    there is no pure-python version.
+        As in Clawpack, the values 10, 20 and 21 may also be used: the
+        tens digit selects transverse increment waves (1) or increment and
+        correction waves (2), and the units digit whether none (0), the
+        increment waves (1) or both kinds of waves (2) are split again in
+        the other transverse direction.
+
+    .. attribute:: rp_transverse
+
+        Transverse Riemann solver used by the Python kernel when
+        dimensional_split is False and transverse_waves is not no_trans; see
+        :meth:`~ClawSolver.python_transverse_update` for its signature.
+        With the Python kernel, :attr:`rp` is the normal Riemann solver
+        described in :meth:`~ClawSolver.python_step_hyperbolic`.
+        ``Default = None``
     """
 
     no_trans  = 0
@@ -602,6 +1204,7 @@ class ClawSolver3D(ClawSolver):
         self.transverse_waves = self.trans_cor
 
         self.num_dim = 3
+        self.rp_transverse = None
 
         self.aux1 = None
         self.aux2 = None
@@ -658,7 +1261,7 @@ class ClawSolver3D(ClawSolver):
             
             self.apply_q_bcs(state)
             if state.num_aux > 0:
-                self.apply_aux_bcs(state)
+                self.update_aux_bcs(state)
             qnew = self.qbc
             qold = qnew.copy('F')
             
@@ -690,10 +1293,12 @@ class ClawSolver3D(ClawSolver):
                       qold,qnew,self.auxbc,dx,dy,dz,self.dt,self._method,self._mthlim,\
                       self.aux1,self.aux2,self.aux3,self.work,rpn3,rpt3,rptt3)
 
+            self.timings.start('cfl')
             self.cfl.update_global_max(cfl)
+            self.timings.stop()
             state.set_q_from_qbc(self.num_ghost,self.qbc)
-            if state.num_aux > 0:
-                state.set_aux_from_auxbc(self.num_ghost,self.auxbc)
 
-        else:
-            raise NotImplementedError("No python implementation for step_hyperbolic in 3D.")
+        elif(self.kernel_language == 'Python'):
+            self.python_step_hyperbolic(solution)
+
+        else: raise Exception("Unrecognized kernel_language; choose 'Fortran' or 'Python'")
@@ -2,7 +2,7 @@
     subroutine step2(maxm,num_eqn,num_waves,num_aux,num_ghost,mx,my, &
     qold,qnew,aux,dx,dy,dt,method,mthlim,cfl, &
     qadd,fadd,gadd,q1d,dtdx1d,dtdy1d, &
-    aux1,aux2,aux3,work,mwork,use_fwave,rpn2,rpt2)
+    aux1,aux2,aux3,work,mwork,use_fwave,rpn2,rpt2,set_comxyt)
 !     ==========================================================
 
 !     # Take one time step, updating q.
@@ -15,6 +15,11 @@
 !     # fadd and gadd are used to return flux increments from flux2.
 !     # See the flux2 documentation for more information.
 
+!     # If set_comxyt is true (the default when called from Python), the
+!     # index of each slice is stored in the common block comxyt for the
+!     # Riemann solvers.  Calls running concurrently on parts of the grid
+!     # pass false, so that they do not write to the shared common block.
+
 
     implicit double precision (a-h,o-z)
     external :: rpn2,rpt2
@@ -35,13 +40,14 @@
     double precision :: dtdx1d(1-num_ghost:maxm+num_ghost)
     double precision :: dtdy1d(1-num_ghost:maxm+num_ghost)
     integer :: method(7),mthlim(num_waves)
-    logical ::          use_fwave
+    logical ::          use_fwave,set_comxyt
     double precision :: work(mwork)
 
     common /comxyt/ dtcom,dxcom,dycom,tcom,icom,jcom
 
 !f2py intent(out) cfl
 !f2py intent(in,out) qnew
+!f2py logical optional, intent(in) :: set_comxyt = 1
 !f2py optional q1d, qadd, fadd, gadd, dtdx1d, dtdy1d
 
 ! Dummy interfaces just so f2py doesn't complain:
@@ -117,7 +123,7 @@
     !     # Store the value of j along this slice in the common block
     !        # comxyt in case it is needed in the Riemann solver (for
     !        # variable coefficient problems)
-        jcom = j
+        if (set_comxyt) jcom = j
     
     !        # compute modifications fadd and gadd to fluxes along this slice:
         call flux2(1,maxm,num_eqn,num_waves,num_aux,num_ghost,mx, &
@@ -199,7 +205,7 @@
     !     # Store the value of i along this slice in the common block
     !        # comxyt in case it is needed in the Riemann solver (for
     !        # variable coefficient problems)
-        icom = i
+        if (set_comxyt) icom = i
     
     !        # compute modifications fadd and gadd to fluxes along this slice:
         call flux2(2,maxm,num_eqn,num_waves,num_aux,num_ghost,my, &
@@ -249,3 +255,59 @@
 
     return
     end subroutine step2
+
+
+!     ==========================================================
+    subroutine step2_by_address(maxm,num_eqn,num_waves,num_aux,num_ghost, &
+    mx,my,qold,qnew,aux,dx,dy,dt,method,mthlim,cfl, &
+    aux1,aux2,aux3,work,mwork,use_fwave,rpn2_address,rpt2_address)
+!     ==========================================================
+
+!     # Call step2 with the Riemann solvers given by their addresses.
+!     # f2py keeps the state of call-back arguments such as those of step2
+!     # in global variables; this routine has none, so it can be called
+!     # from several threads at once (the GIL is released during the call).
+!     # The slice indices are not stored in the common block comxyt, which
+!     # the threads would share.
+
+    use iso_c_binding, only: c_funptr, c_f_procpointer
+    implicit double precision (a-h,o-z)
+    double precision :: qold(num_eqn,1-num_ghost:mx+num_ghost, &
+    1-num_ghost:my+num_ghost)
+    double precision :: qnew(num_eqn,1-num_ghost:mx+num_ghost, &
+    1-num_ghost:my+num_ghost)
+    double precision :: aux(num_aux, 1-num_ghost:mx+num_ghost, &
+    1-num_ghost:my+num_ghost)
+    double precision :: aux1(num_aux, 1-num_ghost:maxm+num_ghost)
+    double precision :: aux2(num_aux, 1-num_ghost:maxm+num_ghost)
+    double precision :: aux3(num_aux, 1-num_ghost:maxm+num_ghost)
+    integer :: method(7),mthlim(num_waves)
+    logical ::          use_fwave
+    double precision :: work(mwork)
+    integer(kind=8) :: rpn2_address,rpt2_address
+
+    double precision ::  q1d(num_eqn,1-num_ghost:maxm+num_ghost)
+    double precision :: qadd(num_eqn,1-num_ghost:maxm+num_ghost)
+    double precision :: fadd(num_eqn,1-num_ghost:maxm+num_ghost)
+    double precision :: gadd(num_eqn, 2, 1-num_ghost:maxm+num_ghost)
+    double precision :: dtdx1d(1-num_ghost:maxm+num_ghost)
+    double precision :: dtdy1d(1-num_ghost:maxm+num_ghost)
+    type(c_funptr) :: rpn2_cptr,rpt2_cptr
+    procedure(), pointer :: rpn2,rpt2
+
+!f2py intent(out) cfl
+!f2py intent(in,out) qnew
+!f2py threadsafe
+
+    rpn2_cptr = transfer(rpn2_address,rpn2_cptr)
+    rpt2_cptr = transfer(rpt2_address,rpt2_cptr)
+    call c_f_procpointer(rpn2_cptr,rpn2)
+    call c_f_procpointer(rpt2_cptr,rpt2)
+
+    call step2(maxm,num_eqn,num_waves,num_aux,num_ghost,mx,my, &
+    qold,qnew,aux,dx,dy,dt,method,mthlim,cfl, &
+    qadd,fadd,gadd,q1d,dtdx1d,dtdy1d, &
+    aux1,aux2,aux3,work,mwork,use_fwave,rpn2,rpt2,.false.)
+
+    return
+    end subroutine step2_by_address
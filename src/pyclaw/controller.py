@@ -12,9 +12,11 @@ running of compiled fortran binaries.
 import logging
 import sys
 import os
-import copy
+import re
+import time
 
 from .solver import Solver
+from .frame_store import FrameStore
 from .util import FrameCounter
 
 class Controller(object):
@@ -46,6 +48,12 @@ class Controller(object):
     def F_path(self):
         r"""(string) - Full path to output file for functionals"""
         return os.path.join(self.outdir,self.F_file_name+'.txt')
+    @property
+    def checkpoint_path(self):
+        r"""(string) - Directory used for checkpoints"""
+        if self.checkpoint_dir is None:
+            return os.path.join(self.outdir,'_checkpoints')
+        return self.checkpoint_dir
 
     #  ======================================================================
     #   Initialization routines
@@ -104,7 +112,13 @@ class Controller(object):
         r"""(bool) - Keep a copy in memory of every output time, 
         ``default = False``"""
         self.frames = []
-        r"""(list) - List of saved frames if ``keep_copy`` is set to ``True``"""
+        r"""(:class:`~pyclaw.frame_store.FrameStore`) - Saved frames if 
+        ``keep_copy`` is set to ``True``; ``frames[i]`` is the solution at
+        output frame i"""
+        self.frame_store_options = {}
+        r"""(dict) - Options of the :class:`~pyclaw.frame_store.FrameStore`
+        holding the saved frames: ``dtype``, ``max_memory``, ``compression``
+        and ``spill_dir``.  ``default = {}``"""
         self.write_aux_init = False
         r"""(bool) - Write out initial auxiliary array, ``default = False``"""
         self.write_aux_always = False
@@ -120,6 +134,14 @@ class Controller(object):
         self.output_options = {}
         r"""(dict) - Output options passed to function writing and reading 
         data in output_format's format.  ``default = {}``"""
+        self.async_output = False
+        r"""(bool) - Write output frames in a background thread while time
+        stepping continues (see :class:`~pyclaw.io.async_writer.AsyncWriter`),
+        ``default = False``"""
+        self.output_queue_size = 2
+        r"""(int) - Maximum number of output frames waiting to be written when
+        ``async_output`` is set; when it is reached time stepping waits for
+        the writer, ``default = 2``"""
         
         # Classic output parameters, used in run convenience method
         self.tfinal = 1.0
@@ -158,6 +180,31 @@ class Controller(object):
         self.F_file_name = 'F'
         r"""(string) - Name of text file containing functionals"""
 
+        # Checkpointing
+        self.checkpoint_interval = None
+        r"""(int) - Number of time steps between checkpoints, or None for no
+        step-based checkpoints.  ``default = None``"""
+        self.checkpoint_wall_interval = None
+        r"""(float) - Wall-clock time in seconds between checkpoints, or None
+        for no time-based checkpoints.  ``default = None``"""
+        self.num_checkpoints = 2
+        r"""(int) - Number of most recent checkpoints of a run to keep, 
+        ``default = 2``"""
+        self.checkpoint_dir = None
+        r"""(string) - Directory for checkpoint files; if None, 
+        ``outdir/_checkpoints`` is used.  ``default = None``"""
+        self._restart_file = None
+        self._checkpoint_number = -1
+        self._first_checkpoint_number = 0
+        self._last_checkpoint_time = None
+        self._steps_since_checkpoint = 0
+        self._user_after_step = None
+        self._frame = None
+        self._output_times = None
+        self._output_index = 1
+        self._steps_in_frame = 0
+        self._output_writer = None
+
     # ========== Access methods ===============================================
     def __str__(self):        
         output = "Controller attributes:\n"
@@ -206,11 +253,15 @@ class Controller(object):
         
         This function uses the run parameters and solver parameters to evolve
         the solution to the end time specified in run_data, outputting at the
-        appropriate times.
-        
+        appropriate times.  If checkpoint_interval or checkpoint_wall_interval
+        is set, checkpoints are written between output times (see
+        :meth:`write_checkpoint`).  The times of the phases of the run,
+        including the output, are recorded in solver.timings, which is reset
+        first (see :meth:`profile_report`).
+
         :Input:
             None
-            
+
         :Ouput:
             (dict) - Return a dictionary of the status of the solver.
             
@@ -219,25 +270,39 @@ class Controller(object):
         
         import numpy as np
 
-        self.start_frame = self.solution.start_frame
+        checkpoint = None
+        if self._restart_file is not None:
+            checkpoint = self.read_checkpoint(self._restart_file)
+            self._restart_file = None
+            self.start_frame = checkpoint['start_frame']
+        else:
+            self.start_frame = self.solution.start_frame
         if len(self.solution.patch.grid.gauges)>0:
-            self.solution.patch.grid.setup_gauge_files(self.outdir)
+            if checkpoint is None:
+                self.solution.patch.grid.setup_gauge_files(self.outdir)
+            else:
+                self.solution.patch.grid.setup_gauge_files(self.outdir,
+                                            checkpoint['gauge_sizes'])
         frame = FrameCounter()
 
         frame.set_counter(self.start_frame)
-        if self.keep_copy:
-            self.frames = []
                     
         self.solver.setup(self.solution)
         self.solver.dt = self.solver.dt_initial
+        if checkpoint is not None:
+            self.load_checkpoint(checkpoint)
+            frame.set_counter(checkpoint['frame'])
             
         self.check_validity()
 
-        # Write initial gauge values
-        self.solver.write_gauge_values(self.solution)
+        timings = self.solver.timings
+        timings.reset()
+        timings.start('run')
 
         # Output styles
-        if self.output_style == 1:
+        if checkpoint is not None:
+            output_times = checkpoint['output_times']
+        elif self.output_style == 1:
             output_times = np.linspace(self.solution.t,
                     self.tfinal,self.num_output_times+1
                     -self.start_frame)
@@ -248,72 +313,385 @@ class Controller(object):
                                     -self.start_frame))
         else:
             raise Exception("Invalid output style %s" % self.output_style)  
-         
-        # Output and save initial frame
+
+        if self.keep_copy:
+            self.frames = self.new_frame_store(len(output_times))
+
+        checkpointing = False
+        self.start_output()
+        try:
+            if checkpoint is None:
+                # Write initial gauge values
+                self.solver.write_gauge_values(self.solution)
+                timings.start('output')
+                self.write_initial_output(frame)
+                timings.stop()
+                first_output = 1
+                steps_done = 0
+            else:
+                # The gauge values at the restart time were recorded before
+                self.solver.write_gauge_values(self.solution,record=False)
+                first_output = checkpoint['output_index']
+                steps_done = checkpoint['steps_in_frame']
+                self.log_info("Restarted from checkpoint at time t=%f" 
+                                % self.solution.t)
+
+            # Set up checkpointing
+            self._frame = frame
+            self._output_times = output_times
+            self._steps_in_frame = 0
+            checkpointing = self.checkpoint_interval is not None or \
+                            self.checkpoint_wall_interval is not None
+            if checkpointing:
+                self.start_checkpointing()
+
+            status = self.solver.status
+            for i in xrange(first_output,len(output_times)):
+                t = output_times[i]
+                self._output_index = i
+                if self.output_style < 3:
+                    status = self.solver.evolve_to_time(self.solution,t)
+                else:
+                    # Take nstepout steps and output
+                    for n in xrange(steps_done,self.nstepout):
+                        self._steps_in_frame = n
+                        status = self.solver.evolve_to_time(self.solution)
+                    steps_done = 0
+                    self._steps_in_frame = 0
+                frame.increment()
+                timings.start('output')
+                if self.keep_copy:
+                    self.frames.append(self.solution)
+                if self.output_format is not None:
+                    self.write_output(frame,self.write_aux_always)
+                self.write_F()
+                timings.stop()
+
+                self.log_info("Solution %s computed for time t=%f"
+                    % (frame,self.solution.t))
+                self.solver.flush_gauge_values()
+        except:
+            error = sys.exc_info()
+            self.finish_output(raise_errors=False)
+            raise error[0],error[1],error[2]
+        finally:
+            if checkpointing:
+                self.solver.after_step = self._user_after_step
+        timings.start('output')
+        self.finish_output()
+        timings.stop()
+            
+        self.solver.teardown()
+        self.solver.flush_gauge_values()
+        for gfile in self.solution.state.grid.gauge_files: gfile.close()
+        timings.stop()
+
+        # Return the current status of the solver
+        return status
+
+    def profile_report(self,trace_path=None):
+        r"""
+        Return a table of the time spent in each phase of the last run (see
+        :class:`~pyclaw.profiling.Timings`): boundary conditions, kernel,
+        source terms, CFL reduction, gauges, output, and so on.
+
+        If trace_path is given and solver.timings.trace was set before the
+        run, the timed calls are also written to trace_path as a Chrome
+        trace file.
+        """
+        if trace_path is not None:
+            self.solver.timings.write_chrome_trace(trace_path)
+        return self.solver.timings.report()
+
+    def write_initial_output(self,frame):
+        r"""
+        Output and save the initial frame.
+        """
         if self.keep_copy:
-            self.frames.append(copy.deepcopy(self.solution))
+            self.frames.append(self.solution)
         if self.output_format is not None:
             if os.path.exists(self.outdir) and self.overwrite==False:
                 raise Exception("Refusing to overwrite existing output data. \
                  \nEither delete/move the directory or set controller.overwrite=True.")
-            if self.compute_p is not None:
-                self.compute_p(self.solution.state)
-                self.solution.write(frame,self.outdir_p,
-                                        self.output_format,
-                                        self.file_prefix_p,
-                                        write_aux = False,
-                                        options = self.output_options,
-                                        write_p = True) 
-
-            self.solution.write(frame,self.outdir,
-                                        self.output_format,
-                                        self.output_file_prefix,
-                                        self.write_aux_init,
-                                        self.output_options)
+            self.write_output(frame,self.write_aux_init)
 
         self.write_F('w')
 
         self.log_info("Solution %s computed for time t=%f" % 
                         (frame,self.solution.t) )
 
-        for t in output_times[1:]:                
-            if self.output_style < 3:
-                status = self.solver.evolve_to_time(self.solution,t)
-            else:
-                # Take nstepout steps and output
-                for n in xrange(self.nstepout):
-                    status = self.solver.evolve_to_time(self.solution)
-            frame.increment()
-            if self.keep_copy:
-                # Save current solution to dictionary with frame as key
-                self.frames.append(copy.deepcopy(self.solution))
-            if self.output_format is not None:
-                if self.compute_p is not None:
-                    self.compute_p(self.solution.state)
-                    self.solution.write(frame,self.outdir_p,
-                                            self.output_format,
-                                            self.file_prefix_p,
-                                            write_aux = False, 
-                                            options = self.output_options,
-                                            write_p = True) 
-                
-                self.solution.write(frame,self.outdir,
-                                            self.output_format,
-                                            self.output_file_prefix,
-                                            self.write_aux_always,
-                                            self.output_options)
-            self.write_F()
-
-            self.log_info("Solution %s computed for time t=%f"
-                % (frame,self.solution.t))
-            for gfile in self.solution.state.grid.gauge_files: 
-                gfile.flush()
-            
-        self.solver.teardown()
-        for gfile in self.solution.state.grid.gauge_files: gfile.close()
+    def write_output(self,frame,write_aux=False):
+        r"""
+        Write the solution and, if compute_p is set, the derived quantities
+        as output frame *frame*.  With async_output the frame is queued to
+        be written in the background.
+        """
+        if self._output_writer is not None:
+            write = self._output_writer.write
+        else:
+            write = lambda solution,*args,**kargs: solution.write(*args,**kargs)
+        if self.compute_p is not None:
+            self.compute_p(self.solution.state)
+            write(self.solution,frame,self.outdir_p,
+                                    self.output_format,
+                                    self.file_prefix_p,
+                                    write_aux = False,
+                                    options = self.output_options,
+                                    write_p = True) 
 
-        # Return the current status of the solver
-        return status
+        write(self.solution,frame,self.outdir,
+                                    self.output_format,
+                                    self.output_file_prefix,
+                                    write_aux,
+                                    self.output_options)
+
+    def new_frame_store(self,num_frames):
+        r"""
+        Return the empty :class:`~pyclaw.frame_store.FrameStore` that holds
+        the frames of a run with num_frames output times when keep_copy is
+        set.
+        """
+        return FrameStore(num_frames=num_frames,**self.frame_store_options)
+
+    def start_output(self):
+        r"""
+        Start the background writer if async_output is set.
+        """
+        if self.async_output and self.output_format is not None:
+            from .io.async_writer import AsyncWriter
+            self._output_writer = AsyncWriter(self.output_queue_size)
+
+    def wait_for_output(self):
+        r"""
+        Wait until the frames queued by an asynchronous run are written.
+        """
+        if self._output_writer is not None:
+            self._output_writer.wait()
+
+    def finish_output(self,raise_errors=True):
+        r"""
+        Write the remaining queued frames and stop the background writer.
+        An exception raised while writing is re-raised here if raise_errors
+        is True.
+        """
+        if self._output_writer is not None:
+            writer = self._output_writer
+            self._output_writer = None
+            writer.close(raise_errors)
+
+    def restart(self,path=None):
+        r"""
+        Continue a run from a checkpoint written by :meth:`write_checkpoint`.
+
+        The controller, solver and solution must be set up as for the
+        original run (usually by running the same script), but
+        :meth:`restart` is called instead of :meth:`run`.  The solution
+        values, time, problem_data, solver time step, CFL number and status,
+        output frame counter and gauge and functional files are restored,
+        and the run continues exactly where it stopped.  Frames computed
+        before the restart are not added to frames when keep_copy is set.
+
+        :Input:
+         - *path* - (string) Checkpoint file, or directory from which the
+           most recent checkpoint is used.  In parallel, give a directory.
+           ``default = checkpoint_path``
+
+        :Output:
+         - (dict) - Status dictionary returned by :meth:`run`
+        """
+        if path is None:
+            path = self.checkpoint_path
+        if os.path.isdir(path):
+            number = self.latest_checkpoint(path)
+            if number is None:
+                raise IOError('No checkpoint found in %s' % path)
+            path = self.checkpoint_file(path,number)
+        self._restart_file = path
+        return self.run()
+
+    # ========== Checkpointing ============================================
+
+    checkpoint_version = 1
+    r"""(int) - Version of the checkpoint file format"""
+
+    def checkpoint_file(self,directory,number):
+        r"""Name of checkpoint file number *number* of this process."""
+        return os.path.join(directory,'checkpoint.pkl'+str(number).zfill(4))
+
+    def checkpoint_numbers(self,directory):
+        r"""Sorted list of the checkpoints of this process in *directory*."""
+        if not os.path.isdir(directory):
+            return []
+        prefix,suffix = os.path.basename(self.checkpoint_file(directory,0)).split('0000')
+        pattern = re.compile('^%s(\d+)%s$' % (re.escape(prefix),re.escape(suffix)))
+        numbers = []
+        for name in os.listdir(directory):
+            match = pattern.match(name)
+            if match is not None:
+                numbers.append(int(match.group(1)))
+        return sorted(numbers)
+
+    def latest_checkpoint(self,directory):
+        r"""
+        Number of the most recent complete checkpoint in *directory*, or None.
+        """
+        numbers = self.checkpoint_numbers(directory)
+        if len(numbers) == 0:
+            return None
+        return numbers[-1]
+
+    def start_checkpointing(self):
+        r"""
+        Install the checkpointing hook in the solver.
+
+        The checkpoints of this run are numbered after those already in
+        checkpoint_path, so that a restart uses the most recent checkpoint
+        of this run once one is written.  Checkpoints written before, by a
+        previous run or before a restart, are left in place.
+        """
+        latest = self.latest_checkpoint(self.checkpoint_path)
+        self._checkpoint_number = -1 if latest is None else latest
+        self._first_checkpoint_number = self._checkpoint_number + 1
+        self._last_checkpoint_time = time.time()
+        self._steps_since_checkpoint = 0
+        self._user_after_step = self.solver.after_step
+        self.solver.after_step = self._checkpoint_after_step
+
+    def _checkpoint_after_step(self,solver,solution):
+        if self._user_after_step is not None:
+            self._user_after_step(solver,solution)
+        self._steps_since_checkpoint += 1
+        if self.output_style == 3:
+            self._steps_in_frame += 1
+        if (self.checkpoint_interval is not None and 
+                self._steps_since_checkpoint >= self.checkpoint_interval) or \
+           (self.checkpoint_wall_interval is not None and 
+                time.time()-self._last_checkpoint_time >= self.checkpoint_wall_interval):
+            self.write_checkpoint()
+
+    def write_checkpoint(self):
+        r"""
+        Write a checkpoint of the run to checkpoint_path.
+
+        The checkpoint holds the solution values, time and problem_data of
+        each state, the solver time step, CFL number and status, the frame
+        counter and output times and the sizes of the gauge and functional
+        files.  The Runge-Kutta stage registers of method-of-lines solvers
+        hold no data between steps and are not saved.
+
+        The file is written under a temporary name and then renamed, so the
+        write is atomic: an interrupted write never leaves a partial
+        checkpoint.  The num_checkpoints most recent checkpoints written by
+        this run are kept and the older ones are deleted.
+
+        This is called automatically by :meth:`run` when checkpoint_interval
+        or checkpoint_wall_interval is set; it must be called between time
+        steps of :meth:`run`.
+
+        :Output:
+         - (string) - Name of the checkpoint file
+        """
+        import pickle
+
+        self.solver.timings.start('checkpoint')
+        # Frames output before the checkpoint must be on disk when it is
+        # used to restart
+        self.wait_for_output()
+        self.solver.flush_gauge_values()
+
+        data = {'version' : self.checkpoint_version,
+                't' : self.solution.t,
+                'start_frame' : self.start_frame,
+                'frame' : self._frame.get_counter(),
+                'output_times' : self._output_times,
+                'output_index' : self._output_index,
+                'steps_in_frame' : self._steps_in_frame,
+                'states' : [],
+                'solver' : {'dt' : self.solver.dt,
+                            'cfl' : self.solver.cfl.get_cached_max(),
+                            'status' : dict(self.solver.status)},
+                'gauge_sizes' : [os.path.getsize(gfile.name) for gfile 
+                                    in self.solution.state.grid.gauge_files],
+                'F_size' : None}
+        for state in self.solution.states:
+            state_data = {'t' : state.t,
+                          'q' : state.q.copy(),
+                          'problem_data' : state.problem_data}
+            if state.num_aux > 0:
+                state_data['aux'] = state.aux.copy()
+            data['states'].append(state_data)
+        if self.compute_F is not None and self.is_proc_0():
+            data['F_size'] = os.path.getsize(self.F_path)
+
+        directory = self.checkpoint_path
+        if not os.path.exists(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                pass # Created by another process
+
+        self._checkpoint_number += 1
+        file_name = self.checkpoint_file(directory,self._checkpoint_number)
+        tmp_name = file_name + '.tmp'
+        checkpoint_file = open(tmp_name,'wb')
+        pickle.dump(data,checkpoint_file,pickle.HIGHEST_PROTOCOL)
+        checkpoint_file.flush()
+        os.fsync(checkpoint_file.fileno())
+        checkpoint_file.close()
+        os.rename(tmp_name,file_name)
+
+        for number in self.checkpoint_numbers(directory):
+            if self._first_checkpoint_number <= number <= \
+                    self._checkpoint_number - self.num_checkpoints:
+                os.remove(self.checkpoint_file(directory,number))
+
+        self._last_checkpoint_time = time.time()
+        self._steps_since_checkpoint = 0
+        self.log_info("Checkpoint %s written at time t=%f" 
+                        % (self._checkpoint_number,self.solution.t))
+        self.solver.timings.stop()
+        return file_name
+
+    def read_checkpoint(self,path):
+        r"""
+        Read a checkpoint file and return its contents as a dictionary.
+        """
+        import pickle
+        checkpoint_file = open(path,'rb')
+        data = pickle.load(checkpoint_file)
+        checkpoint_file.close()
+        if data.get('version') != self.checkpoint_version:
+            raise IOError('Unsupported checkpoint version %s in %s' 
+                            % (data.get('version'),path))
+        return data
+
+    def load_checkpoint(self,data):
+        r"""
+        Restore the solution and solver from checkpoint data returned by
+        :meth:`read_checkpoint`.  The solver must already be set up.
+        """
+        if len(data['states']) != len(self.solution.states):
+            raise Exception('Checkpoint has %i states but the solution has %i'
+                            % (len(data['states']),len(self.solution.states)))
+        for state,state_data in zip(self.solution.states,data['states']):
+            if state.q.shape != state_data['q'].shape:
+                raise Exception('Checkpoint does not match the solution: q has shape %s instead of %s'
+                                % (state_data['q'].shape,state.q.shape))
+            state.q[...] = state_data['q']
+            if 'aux' in state_data:
+                state.aux[...] = state_data['aux']
+            state.t = state_data['t']
+            state.problem_data.update(state_data['problem_data'])
+
+        solver_data = data['solver']
+        self.solver.dt = solver_data['dt']
+        self.solver.cfl.update_global_max(solver_data['cfl'])
+        self.solver.status.update(solver_data['status'])
+
+        if data['F_size'] is not None and self.is_proc_0():
+            F_file = open(self.F_path,'a')
+            F_file.truncate(data['F_size'])
+            F_file.close()
     
     # ========== Advanced output methods ==================================
 
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# encoding: utf-8
+r"""
+Ensembles of runs of an application, such as parameter sweeps.
+
+:func:`run_ensemble` runs an application function (for instance one of those
+in apps/, which take keyword arguments and return a Controller) once for each
+member of an ensemble, given as a list of keyword-argument dicts; the list
+can be built with :func:`parameter_grid` or
+:func:`~pyclaw.util.build_variant_arg_dicts`.  The members run in a pool of
+worker processes, each member in a new process, so that nothing (such as the
+common blocks of the Fortran modules) is shared between runs.  The results
+are yielded as they arrive, and can be recorded in a journal file from which
+an interrupted sweep is resumed::
+
+    from clawpack.pyclaw import ensemble
+    members = ensemble.parameter_grid(kernel_language=['Fortran','Python'],
+                                      weno_order=[5,7])
+    for result in ensemble.run_ensemble(acoustics,members,
+                                        journal='sweep.journal'):
+        print result.kwargs, result.error or result.value['q'].max()
+
+The application, and the function reducing its output, are inherited by the
+worker processes when they are forked, so they need not be picklable; the
+keyword arguments and the reduced outputs must be.  A Controller is not
+picklable, so by default (:func:`default_reduce_output`) the final solution
+and the status of the solver are sent back instead.
+"""
+
+import os
+import time
+import logging
+import itertools
+import cPickle as pickle
+
+logger = logging.getLogger('pyclaw')
+
+def parameter_grid(**values):
+    r"""
+    Return the list of the keyword-argument dicts of all the combinations of
+    the values given for each argument::
+
+        >>> parameter_grid(a=[1,2],b=['x'])
+        [{'a': 1, 'b': 'x'}, {'a': 2, 'b': 'x'}]
+    """
+    names = sorted(values.keys())
+    return [dict(zip(names,combination)) for combination in
+            itertools.product(*[values[name] for name in names])]
+
+def default_reduce_output(output):
+    r"""
+    Return the picklable part of the output of an application: for a
+    :class:`~pyclaw.controller.Controller`, the dict with the final solution
+    q (gathered on the first process in PetClaw), its time t and the status
+    of the solver; other outputs are returned unchanged.
+    """
+    from .controller import Controller
+    if isinstance(output,Controller):
+        return {'q':output.solution.state.get_q_global(),
+                't':output.solution.t,
+                'status':dict(output.solver.status)}
+    return output
+
+def member_key(kwargs):
+    r"""Return the string identifying the member with arguments kwargs."""
+    return repr(sorted(kwargs.items()))
+
+class MemberResult(object):
+    r"""
+    Result of one member of an ensemble.
+
+    .. attribute:: index
+
+        Position of the member in the list of members.
+
+    .. attribute:: kwargs
+
+        Keyword arguments the application was called with.
+
+    .. attribute:: value
+
+        Output of the application, or the value of reduce_output for it;
+        None if the run failed.
+
+    .. attribute:: error
+
+        Traceback of the exception raised by the run, or None.
+
+    .. attribute:: elapsed
+
+        Wall-clock time of the run in seconds.
+
+    .. attribute:: resumed
+
+        Whether the result was read from the journal rather than computed.
+    """
+    def __init__(self,index,kwargs,value=None,error=None,elapsed=0.):
+        self.index = index
+        self.kwargs = kwargs
+        self.value = value
+        self.error = error
+        self.elapsed = elapsed
+        self.resumed = False
+
+    def __repr__(self):
+        status = 'failed' if self.error else 'done'
+        return 'MemberResult(%i, %s, %s)' % (self.index,self.kwargs,status)
+
+def read_journal(path):
+    r"""
+    Return the dict, indexed by :func:`member_key`, of the results of the
+    successful runs recorded in the journal file at path.  A record left
+    incomplete by an interrupted sweep is ignored.
+    """
+    results = {}
+    if path is None or not os.path.exists(path):
+        return results
+    journal = open(path,'rb')
+    try:
+        while True:
+            try:
+                result = pickle.load(journal)
+            except EOFError:
+                break
+            except Exception:
+                logger.warning('Ignoring the incomplete end of the journal %s' % path)
+                break
+            results[member_key(result.kwargs)] = result
+    finally:
+        journal.close()
+    return results
+
+# Application and reduce_output function of the ensemble being run, set in each
+# worker process by _initialize_worker
+_worker_task = None
+
+def _initialize_worker(application,reduce_output):
+    global _worker_task
+    _worker_task = (application,reduce_output)
+
+def _run_member(member):
+    import traceback
+    index,kwargs = member
+    application,reduce_output = _worker_task
+    start = time.time()
+    try:
+        output = application(**kwargs)
+        if reduce_output is not None:
+            output = reduce_output(output)
+        else:
+            from .controller import Controller
+            if isinstance(output,Controller):
+                raise TypeError('A Controller cannot be sent back by the worker '
+                                'processes; use the default reduce_output')
+        # Report an output that cannot be sent back as a failure of the run
+        pickle.dumps(output,pickle.HIGHEST_PROTOCOL)
+        return MemberResult(index,kwargs,output,None,time.time()-start)
+    except Exception:
+        return MemberResult(index,kwargs,None,traceback.format_exc(),time.time()-start)
+
+def run_ensemble(application,members,reduce_output=default_reduce_output,
+                 processes=None,journal=None,outdir=None):
+    r"""
+    Run application(\*\*kwargs) for each dict kwargs of members, in a pool of
+    worker processes, and yield a :class:`MemberResult` for each member as
+    soon as it is finished (not in the order of members).
+
+    :Input:
+     - *application* - (func) Function running the application
+     - *members* - (list) Keyword-argument dicts of the members
+     - *reduce_output* - (func) Function of the output of application
+       (typically a Controller) returning the value sent back, for instance
+       diagnostics or the final solution; a verifier as used by
+       :func:`~pyclaw.util.test_app` can be used as reduce_output.  If None,
+       the output itself is sent back, which must then not be a Controller.
+       ``default`` is :func:`default_reduce_output`
+     - *processes* - (int) Number of worker processes, ``default`` is the
+       number of cores
+     - *journal* - (string) If given, path of the file in which the results
+       of the successful runs are appended.  The members already recorded
+       in it are not run again; their results are yielded first, with
+       resumed set to True.  Failed runs are not recorded, so they are run
+       again when the sweep is resumed.
+     - *outdir* - (string) If given, and if application accepts an outdir
+       argument that members do not set, each member writes its output to
+       the subdirectory member_<index> of outdir, instead of all members
+       writing to the same directory.
+
+    Each member is run in a new process, which exits at the end of the run.
+    """
+    import inspect
+    import multiprocessing
+
+    members = [dict(kwargs) for kwargs in members]
+    if outdir is not None:
+        try:
+            accepts_outdir = 'outdir' in inspect.getargspec(application).args
+        except TypeError:
+            accepts_outdir = False
+        if accepts_outdir:
+            for index,kwargs in enumerate(members):
+                kwargs.setdefault('outdir',os.path.join(outdir,'member_%i' % index))
+
+    done = read_journal(journal)
+    todo = []
+    for index,kwargs in enumerate(members):
+        key = member_key(kwargs)
+        if key in done:
+            result = done[key]
+            result.index = index
+            result.resumed = True
+            yield result
+        else:
+            todo.append((index,kwargs))
+    if len(todo) == 0:
+        return
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    processes = max(1,min(processes,len(todo)))
+    pool = multiprocessing.Pool(processes,_initialize_worker,
+                                (application,reduce_output),maxtasksperchild=1)
+    journal_file = open(journal,'ab') if journal is not None else None
+    finished = False
+    try:
+        for result in pool.imap_unordered(_run_member,todo):
+            if result.error is not None:
+                logger.warning('Member %i %s failed:\n%s' % (result.index,result.kwargs,result.error))
+            elif journal_file is not None:
+                pickle.dump(result,journal_file,pickle.HIGHEST_PROTOCOL)
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+            yield result
+        finished = True
+    finally:
+        # Stop the runs still going on if the sweep is interrupted
+        if finished:
+            pool.close()
+        else:
+            pool.terminate()
+        pool.join()
+        if journal_file is not None:
+            journal_file.close()
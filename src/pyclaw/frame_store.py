@@ -0,0 +1,354 @@
+#!/usr/bin/env python
+# encoding: utf-8
+r"""
+Compact in-memory storage of the frames of a run.
+
+A :class:`FrameStore` keeps only the time and the q array of each state for
+every frame, plus the aux arrays whenever they change, instead of a deep copy
+of the whole :class:`~pyclaw.solution.Solution` with its geometry.  Frames are
+recreated as lightweight Solution objects, sharing the patches of the original
+solution, when they are first accessed::
+
+    >>> import numpy as np
+    >>> import clawpack.pyclaw as pyclaw
+    >>> x = pyclaw.Dimension('x',0.,1.,100)
+    >>> domain = pyclaw.Domain(x)
+    >>> state = pyclaw.State(domain,2)
+    >>> state.q[...] = 0.
+    >>> solution = pyclaw.Solution(state,domain)
+    >>> frames = FrameStore(dtype='float32')
+    >>> frames.append(solution)
+    >>> state.q[...] = 1.
+    >>> solution.t = 0.5
+    >>> frames.append(solution)
+    >>> len(frames), frames[-1].t, frames[0].q.max(), frames[1].q.max()
+    (2, 0.5, 0.0, 1.0)
+    >>> [frame.t for frame in frames[:1]], frames[1] is frames[-1]
+    ([0.0], True)
+    >>> frames.close()
+"""
+
+import os
+import copy
+import zlib
+import weakref
+import tempfile
+import logging
+
+import numpy as np
+
+logger = logging.getLogger('io')
+
+class FrameStore(object):
+    r"""
+    Sequence of the frames of a run, appended with :meth:`append`.
+
+    The q values of all states of a frame are stored as one row of a
+    preallocated buffer, in dtype (e.g. 'float32' to halve the memory used),
+    or as a zlib-compressed string if compression is set.  The aux arrays
+    are copied when they change and problem_data is copied for every frame.
+    If max_memory is set, only the most recent frames whose q values fit in
+    max_memory bytes, together with the aux copies, are held in memory (at
+    least one frame is); older frames are moved to a temporary file in
+    spill_dir, and are read back with :func:`numpy.memmap` (or decompressed)
+    when accessed.
+
+    Indexing the store returns a :class:`~pyclaw.solution.Solution` whose
+    states share the patches of the appended solution, and slicing it
+    returns a list of them.  Uncompressed frames in memory are returned as
+    views of the buffer when no memory cap is set, and as copies otherwise,
+    since their memory is reused by later frames.  Frames on disk are
+    copy-on-write memory maps.  The Solution of a frame is built once and
+    returned by later accesses; if its values are copies, it is only kept
+    as long as it is referenced elsewhere, so that the memory cap holds.
+
+    :Input:
+     - *dtype* - (dtype) Type used to store q, ``default = None`` (the
+       type of q)
+     - *max_memory* - (int) Maximum number of bytes of frame data held in
+       memory, ``default = None`` (no limit)
+     - *compression* - (int) zlib compression level (1-9), or None for no
+       compression, ``default = None``
+     - *spill_dir* - (string) Directory of the file holding the frames that
+       do not fit in memory, ``default = None`` (the system temporary
+       directory)
+     - *num_frames* - (int) Expected number of frames, used to preallocate
+       the buffer, ``default = None``
+    """
+    def __init__(self,dtype=None,max_memory=None,compression=None,
+                 spill_dir=None,num_frames=None):
+        self.dtype = None if dtype is None else np.dtype(dtype)
+        self.max_memory = max_memory
+        self.compression = compression
+        self.spill_dir = spill_dir
+        self.num_frames = num_frames
+
+        self.times = []
+        r"""(list) - Time of each frame"""
+        self._template = None
+        self._layout = None
+        self._frame_size = 0
+        # Uncompressed frames in memory: row n % capacity of _buffer
+        self._buffer = None
+        # Compressed frames in memory, by frame number
+        self._compressed = {}
+        self._memory_used = 0
+        # Frames moved to disk: (offset, number of bytes) of each frame
+        self._spilled = []
+        self._spill_file = None
+        self._spill_name = None
+        # Aux arrays: list of (first frame, arrays of each state)
+        self._aux = []
+        # problem_data of each state, for each frame
+        self._problem_data = []
+        # Solutions of the frames already accessed
+        if max_memory is None and compression is None:
+            self._solutions = {}
+        else:
+            self._solutions = weakref.WeakValueDictionary()
+
+    def __len__(self):
+        return len(self.times)
+
+    def __iter__(self):
+        for n in xrange(len(self)):
+            yield self[n]
+
+    def __getitem__(self,n):
+        if isinstance(n,slice):
+            return [self[i] for i in xrange(*n.indices(len(self)))]
+        n = self._frame_number(n)
+        solution = self._solutions.get(n)
+        if solution is None:
+            solution = self._solution(n)
+            self._solutions[n] = solution
+        return solution
+
+    def _frame_number(self,n):
+        r"""Return the frame number n, which may be negative, as a row number."""
+        if n < 0:
+            n += len(self)
+        if n < 0 or n >= len(self):
+            raise IndexError("Frame %s is not in the store" % n)
+        return n
+
+    @property
+    def nbytes(self):
+        r"""(int) - Number of bytes of frame data held in memory"""
+        nbytes = self._aux_nbytes()
+        if self.compression is None:
+            if self._buffer is not None:
+                nbytes += self._buffer.nbytes
+        else:
+            nbytes += self._memory_used
+        return nbytes
+
+    # ========== Storage =====================================================
+    def _setup(self,solution):
+        self._template = solution
+        self._layout = []
+        offset = 0
+        for state in solution.states:
+            self._layout.append((offset,state.q.shape))
+            offset += state.q.size
+        self._frame_size = offset
+        if self.dtype is None:
+            self.dtype = solution.states[0].q.dtype
+
+    def _aux_nbytes(self):
+        return sum(sum(a.nbytes for a in aux if a is not None)
+                   for first,aux in self._aux)
+
+    def _max_frames_in_memory(self):
+        r"""
+        Number of uncompressed frames that fit in max_memory with the aux
+        copies (at least one), or None if max_memory is not set.
+        """
+        if self.max_memory is None:
+            return None
+        frame_bytes = self._frame_size*self.dtype.itemsize
+        return max(1,int((self.max_memory-self._aux_nbytes())//frame_bytes))
+
+    def _resize_buffer(self,capacity):
+        r"""
+        Replace the buffer by one holding capacity frames, moving the oldest
+        frames in memory that do not fit to disk.  Views of the old buffer
+        remain valid.
+        """
+        buffer = np.empty((capacity,self._frame_size),dtype=self.dtype)
+        if self._buffer is not None:
+            old_capacity = self._buffer.shape[0]
+            first = len(self._spilled)
+            n = len(self.times)
+            while n-first > capacity:
+                self._spill(self._buffer[first % old_capacity])
+                first += 1
+            for m in xrange(first,n):
+                buffer[m % capacity] = self._buffer[m % old_capacity]
+        self._buffer = buffer
+
+    def _pack(self,solution,out=None):
+        r"""Copy the q values of solution into the 1D array out."""
+        if out is None:
+            out = np.empty(self._frame_size,dtype=self.dtype)
+        for (offset,shape),state in zip(self._layout,solution.states):
+            if state.q.shape != shape:
+                raise Exception("The frames of a FrameStore must have the same shape")
+            out[offset:offset+state.q.size] = state.q.ravel(order='F')
+        return out
+
+    def _in_memory(self,n):
+        return n >= len(self._spilled)
+
+    def _open_spill_file(self):
+        if self._spill_file is None:
+            fd,name = tempfile.mkstemp(prefix='frames',suffix='.bin',
+                                       dir=self.spill_dir)
+            self._spill_file = os.fdopen(fd,'w+b')
+            self._spill_name = name
+            logger.info("Frames beyond max_memory are stored in %s" % name)
+        return self._spill_file
+
+    def _spill(self,data):
+        r"""Append the string or array data to the spill file."""
+        spill_file = self._open_spill_file()
+        spill_file.seek(0,2)
+        offset = spill_file.tell()
+        if isinstance(data,np.ndarray):
+            data.tofile(spill_file)
+            nbytes = data.nbytes
+        else:
+            spill_file.write(data)
+            nbytes = len(data)
+        self._spilled.append((offset,nbytes))
+
+    def append(self,solution):
+        r"""
+        Store the time, the q values and, if they have changed since the
+        previous frame, the aux values of solution as a new frame.
+        """
+        if self._template is None:
+            self._setup(solution)
+        n = len(self.times)
+        # The aux copies count against max_memory, so they are made first
+        self._append_aux(solution,n)
+
+        if self.compression is None:
+            limit = self._max_frames_in_memory()
+            capacity = 0 if self._buffer is None else self._buffer.shape[0]
+            if limit is not None and capacity > limit:
+                # New aux values leave room for fewer frames
+                self._resize_buffer(limit)
+                capacity = limit
+            if n-len(self._spilled) >= capacity:
+                if capacity == 0:
+                    new_capacity = self.num_frames or 16
+                else:
+                    new_capacity = 2*capacity
+                if limit is not None:
+                    new_capacity = min(new_capacity,limit)
+                if new_capacity > capacity:
+                    self._resize_buffer(new_capacity)
+                else:
+                    # Move the oldest frame in memory to disk
+                    self._spill(self._buffer[len(self._spilled) % capacity])
+            self._pack(solution,self._buffer[n % self._buffer.shape[0]])
+        else:
+            data = zlib.compress(self._pack(solution).tostring(),self.compression)
+            self._compressed[n] = data
+            self._memory_used += len(data)
+            if self.max_memory is not None:
+                while self.nbytes > self.max_memory and len(self._compressed) > 1:
+                    oldest = len(self._spilled)
+                    data = self._compressed.pop(oldest)
+                    self._memory_used -= len(data)
+                    self._spill(data)
+
+        self.times.append(solution.t)
+        self._problem_data.append([copy.deepcopy(state.problem_data)
+                                   for state in solution.states])
+
+    def _append_aux(self,solution,n):
+        aux = [state.aux for state in solution.states]
+        if all(a is None for a in aux):
+            return
+        if self._aux:
+            last = self._aux[-1][1]
+            if all((a is None and b is None) or
+                   (a is not None and b is not None and np.array_equal(a,b))
+                   for a,b in zip(aux,last)):
+                return
+        self._aux.append((n,[None if a is None else a.copy(order='F') for a in aux]))
+
+    def get_q(self,n):
+        r"""
+        Return the q values of all states of frame n as a 1D array.
+        """
+        if n < 0:
+            n += len(self)
+        if not self._in_memory(n):
+            offset,nbytes = self._spilled[n]
+            self._spill_file.flush()
+            if self.compression is None:
+                return np.memmap(self._spill_name,dtype=self.dtype,mode='c',
+                                 offset=offset,shape=(self._frame_size,))
+            self._spill_file.seek(offset)
+            data = self._spill_file.read(nbytes)
+        elif self.compression is None:
+            row = self._buffer[n % self._buffer.shape[0]]
+            if self.max_memory is None:
+                return row
+            return row.copy()
+        else:
+            data = self._compressed[n]
+        return np.fromstring(zlib.decompress(data),dtype=self.dtype)
+
+    def get_aux(self,n):
+        r"""
+        Return the list of the aux arrays of the states of frame n, or None.
+        """
+        if n < 0:
+            n += len(self)
+        aux = None
+        for first,arrays in self._aux:
+            if first > n:
+                break
+            aux = arrays
+        return aux
+
+    def _solution(self,n):
+        values = self.get_q(n)
+        aux = self.get_aux(n)
+        states = []
+        for i,(offset,shape) in enumerate(self._layout):
+            template = self._template.states[i]
+            state = template.__class__(template.patch,shape[0])
+            size = np.prod(shape)
+            state.q = values[offset:offset+size].reshape(shape,order='F')
+            if aux is not None and aux[i] is not None:
+                state.aux = aux[i]
+            state.t = self.times[n]
+            state.problem_data = self._problem_data[n][i]
+            states.append(state)
+        return self._template.__class__(states,self._template.domain)
+
+    def close(self):
+        r"""Remove the file holding the frames moved to disk, if any."""
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+            os.remove(self._spill_name)
+        self._spilled = []
+        self._compressed = {}
+        self._buffer = None
+        self._aux = []
+        self._problem_data = []
+        self._solutions.clear()
+        self.times = []
+        self._template = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# encoding: utf-8
+r"""
+Recording of solution values at gauges.
+
+A :class:`GaugeRecorder` gathers the values at all gauges of a grid with one
+indexing operation per time step, evaluates the solver's
+``compute_gauge_values`` for all gauges at once if the solver's
+``gauge_values_vectorized`` is set (or for each gauge otherwise), and stores
+the results in a buffer.  The buffered values are written to the
+gauge files in blocks, every ``flush_interval`` steps and when
+:meth:`GaugeRecorder.flush` is called.
+
+By default the values of the cell containing each gauge are recorded after
+every time step.  If grid.gauge_interpolation is 'linear', the values are
+interpolated (linearly in 1D, bilinearly in 2D, trilinearly in 3D) between
+the centers of the cells around each gauge, with weights computed once by
+:func:`linear_stencil`, using the ghost cells of the solver's qbc and auxbc
+for the gauges near the edges of the grid.  If grid.gauge_time_interval is set, the values are
+recorded at the multiples of that interval, interpolating linearly in time
+between the steps around each of them.
+"""
+
+import itertools
+
+import numpy as np
+
+def linear_stencil(grid,num_ghost=0):
+    r"""
+    Return the cell indices and weights interpolating linearly between the
+    cell centers around each gauge of grid.
+
+    :Input:
+     - *grid* - (:class:`~pyclaw.geometry.Grid`) Grid with the gauges
+     - *num_ghost* - (int) Number of ghost cells of the arrays the indices
+       refer to
+
+    :Output:
+     - (tuple) - Index tuple of arrays (number of gauges, 2**num_dim) for the
+       spatial dimensions of an array with num_ghost ghost cells
+     - (ndarray(number of gauges, 2**num_dim)) - Weights of the cells
+
+    Gauges less than half a cell from the edge of the grid use the values
+    of the ghost cells next to it, so the results do not depend on how a
+    PetClaw grid is divided among processes.  Without ghost cells
+    (num_ghost = 0) they use the values of the edge cells.
+    """
+    num_dim = grid.num_dim
+    coords = np.array(grid.gauge_coords,dtype=float).reshape(-1,num_dim)
+    corners = list(itertools.product((0,1),repeat=num_dim))
+    weights = np.ones((coords.shape[0],len(corners)))
+    index = []
+    for d in xrange(num_dim):
+        s = (coords[:,d] - grid.lower[d])/grid.delta[d] - 0.5
+        left = np.floor(s)
+        w = s - left
+        left = left.astype(int)
+        n = grid.num_cells[d]
+        if num_ghost > 0:
+            cells = (left+num_ghost,left+1+num_ghost)
+        else:
+            cells = (np.clip(left,0,n-1),np.clip(left+1,0,n-1))
+        index_d = np.empty(weights.shape,dtype=int)
+        for c,corner in enumerate(corners):
+            index_d[:,c] = cells[corner[d]]
+            weights[:,c] *= w if corner[d] else 1.-w
+        index.append(index_d)
+    return tuple(index),weights
+
+class GaugeRecorder(object):
+    r"""
+    Buffer of the values recorded at the gauges of a grid.
+
+    The values are stored in an array of shape (number of rows, number of
+    gauges, 1 + number of values), where the first value of each row is the
+    time.  If keep_gauges is set, all rows are kept in memory and
+    state.gauge_data[i] is a view of the rows of gauge i; otherwise the
+    buffer only holds the rows not yet written.
+
+    The gauge files are written as text, one row per line with each value
+    in '%.16e' format, or as raw little-endian float64 values if
+    grid.gauge_file_format is 'binary'.
+    Rows are recorded at every step, or at the multiples of
+    grid.gauge_time_interval if it is set.
+
+    :Input:
+     - *grid* - (:class:`~pyclaw.geometry.Grid`) Grid with the gauges and
+       the open gauge files
+     - *flush_interval* - (int) Number of rows written to the files at once
+     - *num_ghost* - (int) Number of ghost cells of the arrays passed to
+       :meth:`record` for linear interpolation
+    """
+    def __init__(self,grid,flush_interval=100,num_ghost=0):
+        if len(grid.gauge_files) != len(grid.gauges):
+            raise Exception("Gauge files are not set up correctly. You should call \
+                       \nthe method `setup_gauge_files` of the Grid class object \
+                       \nbefore any call for `write_gauge_values` from the Solver class.")
+        self.grid = grid
+        self.files = grid.gauge_files
+        self.file_format = grid.gauge_file_format
+        self.flush_interval = max(1,flush_interval)
+        self.num_gauges = len(grid.gauges)
+        self.num_ghost = num_ghost
+        if grid.gauge_interpolation == 'linear':
+            index,self.weights = linear_stencil(grid,num_ghost)
+        elif grid.gauge_interpolation == 'nearest':
+            index = tuple(np.array(grid.gauges,dtype=int).reshape(self.num_gauges,-1).T)
+            self.weights = None
+        else:
+            raise Exception("Unknown gauge interpolation %s" % grid.gauge_interpolation)
+        self.index = (slice(None),) + index
+        self.time_interval = grid.gauge_time_interval
+        self.previous = None
+        self.sample_number = 0
+        self.values = None
+        self.num_rows = 0
+        self.num_written = 0
+        self.keep_rows = False
+
+    def gather(self,array):
+        r"""Return the values of array (q or aux) at the gauges."""
+        if array is None:
+            return None
+        values = array[self.index]
+        if self.weights is not None:
+            values = np.sum(values*self.weights,axis=-1)
+        return values
+
+    def compute_values(self,q,aux,compute_gauge_values,vectorized=False):
+        r"""
+        Return the array (number of values, number of gauges) of the values
+        of compute_gauge_values at the gauges.
+
+        If vectorized is True, compute_gauge_values is called once with the
+        arrays of the values at all gauges (column i for gauge i), otherwise
+        it is called for each gauge.
+        """
+        q_gauges = self.gather(q)
+        aux_gauges = self.gather(aux)
+        if vectorized:
+            return np.asarray(compute_gauge_values(q_gauges,aux_gauges),
+                              dtype=float).reshape(-1,self.num_gauges)
+
+        values = []
+        for i in xrange(self.num_gauges):
+            aux_i = None if aux is None else aux_gauges[:,i]
+            values.append(np.asarray(compute_gauge_values(q_gauges[:,i],aux_i),
+                                     dtype=float).ravel())
+        return np.array(values).T
+
+    def record(self,state,compute_gauge_values,record=True,vectorized=False,
+               q=None,aux=None):
+        r"""
+        Record the values of compute_gauge_values at the gauges at time
+        state.t, or, if time_interval is set, at the sample times since the
+        previous call.  See :meth:`compute_values` for vectorized.
+
+        If record is False, the values are only kept as the start of the
+        time interpolation (for instance when a run is restarted at time
+        state.t, whose values were recorded before).
+
+        q and aux are the arrays of the values of state, with num_ghost
+        ghost cells filled for linear interpolation (solver.qbc and
+        solver.auxbc); by default they are state.q and state.aux.
+        """
+        if q is None:
+            q,aux = state.q,state.aux
+        t = state.t
+        if self.time_interval is None:
+            if record:
+                values = self.compute_values(q,aux,compute_gauge_values,
+                                             vectorized)
+                self.append_row(state,t,values)
+            return
+
+        values = self.compute_values(q,aux,compute_gauge_values,vectorized)
+        tolerance = 1.e-10*self.time_interval
+        if self.previous is None:
+            self.previous = (t,values)
+            if record:
+                self.sample_number = int(np.ceil((t-tolerance)/self.time_interval))
+            else:
+                self.sample_number = int(np.floor((t+tolerance)/self.time_interval)) + 1
+        t_old,values_old = self.previous
+        while self.sample_number*self.time_interval <= t + tolerance:
+            t_sample = self.sample_number*self.time_interval
+            if t > t_old:
+                theta = min(max((t_sample-t_old)/(t-t_old),0.),1.)
+            else:
+                theta = 1.
+            self.append_row(state,t_sample,values_old + theta*(values-values_old))
+            self.sample_number += 1
+        self.previous = (t,values)
+
+    def append_row(self,state,t,values):
+        r"""Add the row (t, values) to the buffer."""
+        self.keep_rows = state.keep_gauges
+        if self.values is None:
+            self.values = np.empty((self.flush_interval,self.num_gauges,
+                                    values.shape[0]+1))
+        elif self.num_rows == self.values.shape[0]:
+            # Only reached if all rows are kept
+            values_buffer = np.empty((2*self.num_rows,)+self.values.shape[1:])
+            values_buffer[:self.num_rows] = self.values
+            self.values = values_buffer
+        row = self.values[self.num_rows]
+        row[:,0] = t
+        row[:,1:] = values.T
+        self.num_rows += 1
+
+        if state.keep_gauges:
+            state.gauge_data[:] = [self.values[:self.num_rows,i,:]
+                                   for i in xrange(self.num_gauges)]
+        if self.num_rows - self.num_written >= self.flush_interval:
+            self.write()
+
+    def write(self):
+        r"""Write the rows not yet written to the gauge files."""
+        rows = self.values[self.num_written:self.num_rows]
+        if len(rows) == 0:
+            return
+        if self.file_format == 'binary':
+            rows = rows.astype('<f8')
+            for i,gauge_file in enumerate(self.files):
+                rows[:,i,:].tofile(gauge_file)
+        else:
+            line = ' '.join(['%.16e']*rows.shape[2]) + '\n'
+            block = line*rows.shape[0]
+            for i,gauge_file in enumerate(self.files):
+                gauge_file.write(block % tuple(rows[:,i,:].ravel().tolist()))
+        self.num_written = self.num_rows
+        if not self.keep_rows:
+            self.num_rows = self.num_written = 0
+
+    def flush(self):
+        r"""Write the buffered rows and flush the gauge files."""
+        if self.values is not None:
+            self.write()
+        for gauge_file in self.files:
+            gauge_file.flush()
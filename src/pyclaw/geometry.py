@@ -176,6 +176,9 @@ class Grid(object):
         r"""(list) - List of gauges' indices to be filled by add_gauges
         method.
         """
+        self.gauge_coords = []
+        r"""(list) - List of the coordinates of the gauges added by add_gauges
+        """
         self.gauge_file_names  = []
         r"""(list) - List of file names to write gauge values to"""
         self.gauge_files = []
@@ -185,6 +188,25 @@ class Grid(object):
         `Controller` class is used to run the application, this directory by
         default will be created under the `Controller` `outdir` directory.
         """
+        self.gauge_file_format = 'ascii'
+        r"""(string) - Format of the gauge files: 'ascii' (one line of text
+        per time step, with the time followed by the gauge values, in
+        '%.16e' format) or 'binary'
+        (the same values as raw little-endian float64, in files with the
+        extension .bin).  ``default = 'ascii'``
+        """
+        self.gauge_interpolation = 'nearest'
+        r"""(string) - Values recorded at a gauge: 'nearest' (values of the
+        cell containing the gauge) or 'linear' (linear, bilinear or trilinear
+        interpolation between the centers of the surrounding cells, which
+        are ghost cells filled by the boundary conditions for the gauges
+        near the edges).  ``default = 'nearest'``
+        """
+        self.gauge_time_interval = None
+        r"""(float) - If set, gauge values are recorded at the multiples of
+        this time interval, interpolated linearly in time between time steps,
+        instead of after every time step.  ``default = None``
+        """
         # Dimension parsing
         if isinstance(dimensions,Dimension):
             dimensions = [dimensions]
@@ -381,25 +403,41 @@ class Grid(object):
                 gauge_file_name = 'gauge'+'_'.join(str(coord) for coord in gauge)+'.txt'
                 self.gauge_file_names.append(gauge_file_name)
                 self.gauges.append(gauge_index)
+                self.gauge_coords.append(list(gauge))
 
-    def setup_gauge_files(self,outdir):
+    def setup_gauge_files(self,outdir,sizes=None):
         r"""
         Creates and opens file objects for gauges
 
+        If *sizes* is given (a list with one file size per gauge, as saved
+        in a checkpoint), existing gauge files are kept and truncated to
+        those sizes instead of being removed.
         """
         import os
         gauge_path = os.path.join(outdir,self.gauge_dir_name)
+        for f in self.gauge_files:
+            f.close()
+        self.gauge_files = []
         if not os.path.exists(gauge_path):
             try:
                 os.makedirs(gauge_path)
             except OSError:
                 print "gauge directory already exists, ignoring"
         
-        for gauge in self.gauge_file_names: 
+        mode = 'a'
+        for i,gauge in enumerate(self.gauge_file_names): 
+            if self.gauge_file_format == 'binary':
+                gauge = os.path.splitext(gauge)[0] + '.bin'
+                mode = 'ab'
             gauge_file = os.path.join(gauge_path,gauge)
+            if sizes is not None:
+                f = open(gauge_file,mode)
+                f.truncate(sizes[i])
+                self.gauge_files.append(f)
+                continue
             if os.path.isfile(gauge_file): 
                  os.remove(gauge_file)
-            self.gauge_files.append(open(gauge_file,'a'))
+            self.gauge_files.append(open(gauge_file,mode))
 
 
    
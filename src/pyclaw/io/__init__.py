@@ -11,7 +11,8 @@
 import logging
 
 from .ascii import read_ascii,write_ascii
-__all__ = ['read_ascii','write_ascii']
+from .binary import read_binary,write_binary
+__all__ = ['read_ascii','write_ascii','read_binary','write_binary']
 
 # Check for HDF 5 support
 try:
@@ -6,11 +6,71 @@ Routines for reading and writing an ascii output file
 
 import os,sys
 import logging
+from StringIO import StringIO
 
 from ..util import read_data_line
 
 logger = logging.getLogger('io')
 
+def write_array(data_file,values,blank_line_after_y=True,blank_line_at_end=False):
+    r"""
+    Write the values of a q or aux array in the fort.q layout.
+
+    Each line holds the values of one cell in "%18.8e" format, cells being
+    written in Fortran order.  In 2D a blank line follows each row of cells;
+    in 3D a blank line follows each row if *blank_line_after_y* and each
+    plane of cells, and one more is written at the end if 
+    *blank_line_at_end*.  Each row (2D) or plane (3D) of cells is formatted
+    with a single string operation.
+
+    :Input:
+     - *data_file* - (file) Open file to write to
+     - *values* - (ndarray(num_eqn,...)) Array to write
+    """
+    num_dim = values.ndim - 1
+    line = "%18.8e" * values.shape[0] + "\n"
+    if num_dim == 1:
+        data_file.write((line*values.shape[1]) % tuple(values.T.ravel().tolist()))
+    elif num_dim == 2:
+        row = line*values.shape[1] + "\n"
+        for j in xrange(values.shape[2]):
+            data_file.write(row % tuple(values[:,:,j].T.ravel().tolist()))
+    elif num_dim == 3:
+        row = line*values.shape[1]
+        if blank_line_after_y:
+            row += "\n"
+        plane = row*values.shape[2] + "\n"
+        for l in xrange(values.shape[3]):
+            data_file.write(plane % tuple(values[:,:,:,l].T.ravel().tolist()))
+        if blank_line_at_end:
+            data_file.write("\n")
+    else:
+        raise Exception("Dimension Exception in writing fort file.")
+
+def read_array(text,start,shape):
+    r"""
+    Read the values of an array of the given shape, written in the fort.q
+    layout, from the string text starting at position start.
+
+    The values end at the header of the next patch (recognized by the
+    underscore in "patch_number" or "grid_number", which never appears in
+    numbers) or at the end of the text; blank lines and the number of values
+    per line do not matter.  Returns the array, in Fortran order, and the
+    position following the values.
+    """
+    import numpy as np
+    end = text.find('_',start)
+    if end == -1:
+        end = len(text)
+    else:
+        end = text.rfind('\n',start,end) + 1
+    values = np.fromstring(text[start:end],sep=' ')
+    num_cells = shape[1:]
+    if values.size != np.prod(shape):
+        raise IOError("Expected %s values but found %s" % (np.prod(shape),values.size))
+    # Values are stored cell by cell, with the first index varying fastest
+    return values.reshape(tuple(reversed(num_cells))+(shape[0],)).T, end
+
 def write_ascii(solution,frame,path,file_prefix='fort',write_aux=False,
                     options={},write_p=False):
     r"""
@@ -77,31 +137,7 @@ def write_ascii(solution,frame,path,file_prefix='fort',write_aux=False,
                 q = state.p
             else:
                 q = state.q
-
-            dims = patch.dimensions
-            if patch.num_dim == 1:
-                for k in xrange(dims[0].num_cells):
-                    for m in xrange(state.num_eqn):
-                        q_file.write("%18.8e" % q[m,k])
-                    q_file.write('\n')
-            elif patch.num_dim == 2:
-                for j in xrange(dims[1].num_cells):
-                    for k in xrange(dims[0].num_cells):
-                        for m in xrange(state.num_eqn):
-                            q_file.write("%18.8e" % q[m,k,j])
-                        q_file.write('\n')
-                    q_file.write('\n')
-            elif patch.num_dim == 3:
-                for l in xrange(dims[2].num_cells):
-                    for j in xrange(dims[1].num_cells):
-                        for k in xrange(dims[0].num_cells):
-                            for m in range(state.num_eqn):
-                                q_file.write("%18.8e" % q[m,k,j,l])
-                            q_file.write('\n')
-                    q_file.write('\n')
-                q_file.write('\n')
-            else:
-                raise Exception("Dimension Exception in writing fort file.")
+            write_array(q_file,q,blank_line_after_y=False,blank_line_at_end=True)
             
             if state.num_aux > 0 and write_aux:
                 aux = state.aux
@@ -117,28 +153,7 @@ def write_ascii(solution,frame,path,file_prefix='fort',write_aux=False,
                     aux_file.write("%18.8e     d%s\n" % (dim.delta,dim.name))
 
                 aux_file.write("\n")
-                dims = patch.dimensions
-                if patch.num_dim == 1:
-                    for k in xrange(dims[0].num_cells):
-                        for m in xrange(state.num_aux):
-                            aux_file.write("%18.8e" % aux[m,k])
-                        aux_file.write('\n')
-                elif patch.num_dim == 2:
-                    for j in xrange(dims[1].num_cells):
-                        for k in xrange(dims[0].num_cells):
-                            for m in xrange(state.num_aux):
-                                aux_file.write("%18.8e" % aux[m,k,j])
-                            aux_file.write('\n')    
-                        aux_file.write('\n')
-                elif patch.num_dim == 3:
-                    for l in xrange(dims[2].num_cells):
-                        for j in xrange(dims[1].num_cells):
-                            for k in xrange(dims[0].num_cells):
-                                for m in xrange(state.num_aux):
-                                    aux_file.write("%18.8e" % aux[m,k,j,l])
-                                aux_file.write('\n')
-                            aux_file.write('\n')    
-                        aux_file.write('\n')
+                write_array(aux_file,aux)
     
         q_file.close()
         if state.num_aux > 0 and write_aux:
@@ -192,6 +207,9 @@ def read_ascii(solution,frame,path='./',file_prefix='fort',read_aux=False,
     # Read in values from fort.q file:
     try:
         f = open(q_fname,'r')
+        text = f.read()
+        f.close()
+        f = StringIO(text)
     
         # Loop through every patch setting the appropriate information
         # for ng in range(len(solution.patchs)):
@@ -210,8 +228,6 @@ def read_ascii(solution,frame,path='./',file_prefix='fort',read_aux=False,
             for i in xrange(num_dim):
                 d[i] = read_data_line(f)
         
-            blank = f.readline()
-        
             # Construct the patch
             # Since we do not have names here, we will construct the patch with
             # the assumed dimensions x,y,z
@@ -235,40 +251,13 @@ def read_ascii(solution,frame,path='./',file_prefix='fort',read_aux=False,
                 state.aux[:]=0.
             
             # Fill in q values
-            if patch.num_dim == 1:
-                for i in xrange(patch.dimensions[0].num_cells):
-                    l = []
-                    while len(l)<state.num_eqn:
-                        line = f.readline()
-                        l = l + line.split()
-                    for m in xrange(state.num_eqn):
-                        state.q[m,i] = float(l[m])
-            elif patch.num_dim == 2:
-                for j in xrange(patch.dimensions[1].num_cells):
-                    for i in xrange(patch.dimensions[0].num_cells):
-                        l = []
-                        while len(l)<state.num_eqn:
-                            line = f.readline()
-                            l = l + line.split()
-                        for m in xrange(state.num_eqn):
-                            state.q[m,i,j] = float(l[m])
-                    blank = f.readline()
-            elif patch.num_dim == 3:
-                for k in xrange(patch.dimensions[2].num_cells):
-                    for j in xrange(patch.dimensions[1].num_cells):
-                        for i in xrange(patch.dimensions[0].num_cells):
-                            l=[]
-                            while len(l) < state.num_eqn:
-                                line = f.readline()
-                                l = l + line.split()
-                            for m in xrange(state.num_eqn):
-                                state.q[m,i,j,k] = float(l[m])
-                        blank = f.readline()
-                    blank = f.readline()
-            else:
+            if patch.num_dim > 3:
                 msg = "Read only supported up to 3d."
                 logger.critical(msg)
                 raise Exception(msg)
+            q,end = read_array(text,f.tell(),state.q.shape)
+            state.q[...] = q
+            f.seek(end)
         
             # Add AMR attributes:
             patch.patch_index = patch_index
@@ -301,6 +290,9 @@ def read_ascii(solution,frame,path='./',file_prefix='fort',read_aux=False,
         # Found a valid path, try to open and read it
         try:
             f = open(fname,'r')
+            text = f.read()
+            f.close()
+            f = StringIO(text)
             
             # Read in aux file
             for n in xrange(len(solution.states)):
@@ -321,42 +313,14 @@ def read_ascii(solution,frame,path='./',file_prefix='fort',read_aux=False,
                     if not (dim.delta == read_data_line(f,type='float')):
                         raise IOError("Dimension %s's d in aux file header did not match patch no %s." % (dim.name,patch.patch_index))
 
-                f.readline()
-        
                 # Read in auxillary array
-                if patch.num_dim == 1:
-                    for i in xrange(patch.dimensions[0].num_cells):
-                        l = []
-                        while len(l)<state.num_aux:
-                            line = f.readline()
-                            l = l + line.split()
-                        for m in xrange(state.num_aux):
-                            state.aux[m,i] = float(l[m])
-                elif patch.num_dim == 2:
-                    for j in xrange(patch.dimensions[1].num_cells):
-                        for i in xrange(patch.dimensions[0].num_cells):
-                            l = []
-                            while len(l)<state.num_aux:
-                                line = f.readline()
-                                l = l + line.split()
-                            for m in xrange(state.num_aux):
-                                state.aux[m,i,j] = float(l[m])
-                        blank = f.readline()
-                elif patch.num_dim == 3:
-                    for k in xrange(patch.dimensions[2].num_cells):
-                        for j in xrange(patch.dimensions[1].num_cells):
-                            for i in xrange(patch.dimensions[0].num_cells):
-                                l = []
-                                while len(l)<state.num_aux:
-                                    line = f.readline()
-                                    l = l + line.split()
-                                for m in xrange(state.num_aux):
-                                    state.aux[m,i,j,k] = float(l[m])
-                            blank = f.readline()
-                        blank = f.readline()
-                else:
+                if patch.num_dim > 3:
                     logger.critical("Read aux only up to 3d is supported.")
                     raise Exception("Read aux only up to 3d is supported.")
+                state = solution.states[patch_index-1]
+                aux,end = read_array(text,f.tell(),state.aux.shape)
+                state.aux[...] = aux
+                f.seek(end)
         except(IOError):
             raise
         except:
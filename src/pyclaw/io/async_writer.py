@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# encoding: utf-8
+r"""
+Background writing of output frames.
+
+:class:`AsyncWriter` copies the arrays to be written and hands them to a
+writer thread, so that time stepping continues while the frame is written to
+disk.  At most queue_size frames wait to be written: when the queue is full,
+:meth:`AsyncWriter.write` blocks until the writer catches up, which bounds the
+memory used by the copies.  An exception raised while writing is re-raised in
+the calling thread by the next call to :meth:`AsyncWriter.write`,
+:meth:`AsyncWriter.wait` or :meth:`AsyncWriter.close`.
+"""
+
+import sys
+import threading
+import Queue
+import logging
+
+logger = logging.getLogger('io')
+
+def snapshot(solution,write_aux=False,write_p=False):
+    r"""
+    Return a new Solution sharing the patches of solution and holding copies
+    of the arrays that are written: q (or p if write_p) and, if write_aux,
+    aux.  The arrays that are not written are shared, since only their shape
+    is used.
+    """
+    from clawpack.pyclaw.state import State
+    from clawpack.pyclaw.solution import Solution
+
+    states = []
+    for state in solution.states:
+        # No arrays are allocated; q and aux are set below
+        copy_state = State(state.patch,0)
+        copy_state.t = state.t
+        copy_state.problem_data = state.problem_data.copy()
+        if write_p:
+            copy_state.q = state.q
+            copy_state.p = state.p.copy(order='K')
+        else:
+            copy_state.q = state.q.copy(order='K')
+        if state.aux is not None:
+            if write_aux:
+                copy_state.aux = state.aux.copy(order='K')
+            else:
+                copy_state.aux = state.aux
+        states.append(copy_state)
+    return Solution(states,solution.domain)
+
+
+class AsyncWriter(object):
+    r"""
+    Write solutions with :meth:`Solution.write` in a background thread.
+
+    :Input:
+     - *queue_size* - (int) Maximum number of frames waiting to be written,
+       ``default = 2``
+    """
+    def __init__(self,queue_size=2):
+        self._queue = Queue.Queue(maxsize=queue_size)
+        self._error = None
+        self._thread = threading.Thread(target=self._run,name='AsyncWriter')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            try:
+                if task is None:
+                    return
+                # Once a write has failed the remaining frames are dropped
+                if self._error is None:
+                    solution,args,kargs = task
+                    solution.write(*args,**kargs)
+            except:
+                self._error = sys.exc_info()
+                logger.error("Error writing output frame %s in the background"
+                             % task[1][0])
+            finally:
+                self._queue.task_done()
+
+    def check(self):
+        r"""Re-raise the first exception raised by the writer thread, if any."""
+        if self._error is not None:
+            error = self._error
+            self._error = None
+            raise error[0],error[1],error[2]
+
+    def write(self,solution,frame,path='./',file_format='ascii',
+              file_prefix=None,write_aux=False,options={},write_p=False):
+        r"""
+        Queue a copy of solution to be written with the given arguments of
+        :meth:`Solution.write`, waiting for room in the queue if it is full.
+        """
+        self.check()
+        copy = snapshot(solution,write_aux,write_p)
+        # frame may be a FrameCounter, which changes before it is written
+        self._queue.put((copy,(int(str(frame)),path,file_format,file_prefix,
+                               write_aux,options,write_p),{}))
+
+    def wait(self):
+        r"""Wait until all queued frames have been written."""
+        self._queue.join()
+        self.check()
+
+    def close(self,raise_errors=True):
+        r"""
+        Write the queued frames and stop the writer thread.  If raise_errors
+        is False, an exception raised by the writer is only logged.
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if raise_errors:
+            self.check()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# encoding: utf-8
+r"""
+Routines for reading and writing a raw binary output file
+
+Each frame consists of a small JSON header file ``claw0000.json`` holding
+the time, the patch geometry and the layout of the data, and one file of raw
+little-endian values per patch and array (``claw0000_q_patch1.bin`` and,
+if requested, ``claw0000_aux_patch1.bin``).  The arrays are written without
+any conversion, so writing costs little more than the disk bandwidth, and
+they are read with :func:`numpy.memmap`, so frames are only loaded from disk
+when their values are used.
+
+This format writes the local data of each process, so with PetClaw the
+'petsc' format should be used instead.
+"""
+
+import os
+import json
+import logging
+
+logger = logging.getLogger('io')
+
+def _write_array(array,file_name):
+    r"""
+    Write array as raw little-endian values, without copying it if it is
+    already contiguous.  Returns the memory order used ('C' or 'F').
+    """
+    import numpy as np
+    array = np.asanyarray(array)
+    if array.dtype.byteorder == '>' or \
+            (array.dtype.byteorder == '=' and not np.little_endian):
+        array = array.astype(array.dtype.newbyteorder('<'))
+    if array.flags['F_CONTIGUOUS'] and not array.flags['C_CONTIGUOUS']:
+        array.T.tofile(file_name)
+        return 'F'
+    array.tofile(file_name)
+    return 'C'
+
+def _array_header(array,file_name,order):
+    return {'file' : os.path.basename(file_name),
+            'dtype' : array.dtype.newbyteorder('<').str,
+            'shape' : list(array.shape),
+            'order' : order}
+
+def _read_array(path,header,mmap_mode):
+    r"""Open an array described by header, as a memmap if mmap_mode is set."""
+    import numpy as np
+    file_name = os.path.join(path,header['file'])
+    shape = tuple(header['shape'])
+    if mmap_mode is None:
+        array = np.fromfile(file_name,dtype=header['dtype'])
+        if header['order'] == 'F':
+            return array.reshape(shape[::-1]).T
+        return array.reshape(shape)
+    return np.memmap(file_name,dtype=header['dtype'],mode=mmap_mode,
+                     shape=shape,order=header['order'])
+
+def header_file_name(path,frame,file_prefix='claw'):
+    r"""Name of the JSON header file of a frame."""
+    return os.path.join(path,'%s%s.json' % (file_prefix,str(frame).zfill(4)))
+
+def write_binary(solution,frame,path,file_prefix='claw',write_aux=False,
+                    options={},write_p=False):
+    r"""
+    Write out a Solution as a JSON header and raw binary data files.
+
+    :Input:
+     - *solution* - (:class:`~pyclaw.solution.Solution`) Pyclaw object to be
+       output.
+     - *frame* - (int) Frame number
+     - *path* - (string) Root path
+     - *file_prefix* - (string) Prefix for the file name.  ``default = 'claw'``
+     - *write_aux* - (bool) Boolean controlling whether the associated
+       auxiliary array should be written out.  ``default = False``
+     - *options* - (dict) Dictionary of optional arguments dependent on
+       the format being written, unused.  ``default = {}``
+     - *write_p* - (bool) Write the derived quantity p instead of q.
+       ``default = False``
+    """
+    base_name = os.path.join(path,'%s%s' % (file_prefix,str(frame).zfill(4)))
+    header = {'t' : solution.t,
+              'num_eqn' : solution.num_eqn,
+              'num_aux' : solution.num_aux,
+              'num_dim' : solution.domain.num_dim,
+              'nstates' : len(solution.states),
+              'patches' : []}
+    if write_p:
+        header['num_eqn'] = solution.mp
+    try:
+        for state in solution.states:
+            patch = state.patch
+            patch_header = {'patch_index' : patch.patch_index,
+                            'level' : patch.level,
+                            'dimensions' : [{'name' : dim.name,
+                                             'lower' : dim.lower,
+                                             'upper' : dim.upper,
+                                             'num_cells' : dim.num_cells}
+                                            for dim in patch.dimensions]}
+            if write_p:
+                q = state.p
+            else:
+                q = state.q
+            file_name = '%s_q_patch%s.bin' % (base_name,patch.patch_index)
+            order = _write_array(q,file_name)
+            patch_header['q'] = _array_header(q,file_name,order)
+
+            if state.num_aux > 0 and write_aux:
+                file_name = '%s_aux_patch%s.bin' % (base_name,patch.patch_index)
+                order = _write_array(state.aux,file_name)
+                patch_header['aux'] = _array_header(state.aux,file_name,order)
+            header['patches'].append(patch_header)
+
+        # The header is written last, so a frame whose header exists is
+        # complete
+        file_name = header_file_name(path,frame,file_prefix)
+        header_file = open(file_name,'w')
+        json.dump(header,header_file,indent=1)
+        header_file.close()
+    except IOError, (errno, strerror):
+        logger.error("Error writing file: %s" % file_name)
+        logger.error("I/O error(%s): %s" % (errno, strerror))
+        raise
+
+def read_binary_header(frame,path='./',file_prefix='claw'):
+    r"""
+    Read only the JSON header of a frame and return it as a dictionary.
+    """
+    header_file = open(header_file_name(path,frame,file_prefix),'r')
+    header = json.load(header_file)
+    header_file.close()
+    return header
+
+def read_binary(solution,frame,path='./',file_prefix='claw',read_aux=True,
+                options={}):
+    r"""
+    Read in a frame written by :func:`write_binary`.
+
+    The q and aux arrays of the states are :class:`numpy.memmap` objects, so
+    the data are only read from disk when they are accessed.  If read_aux is
+    True and the frame does not contain aux, the aux values of frame 0 are
+    used if they exist.
+
+    :Input:
+     - *solution* - (:class:`~pyclaw.solution.Solution`) Solution object to
+       read the data into.
+     - *frame* - (int) Frame number to be read in
+     - *path* - (string) Path to the current directory of the file
+     - *file_prefix* - (string) Prefix of the files to be read in.
+       ``default = 'claw'``
+     - *read_aux* (bool) Whether or not aux should be read in.
+       ``default = True``
+     - *options* - (dict) Dictionary of optional arguments, see
+       `Binary Option Table`_
+
+    .. _`Binary Option Table`:
+
+    mmap_mode : Mode passed to numpy.memmap: 'c' (default, copy-on-write:
+                the arrays can be modified without changing the files),
+                'r' (read-only) or 'r+' (changes are written to the files).
+                If None, the arrays are read into memory.
+    """
+    import clawpack.pyclaw as pyclaw
+
+    if frame < 0:
+        # Don't construct file names with negative frameno values.
+        raise IOError("Frame " + str(frame) + " does not exist ***")
+
+    mmap_mode = options.get('mmap_mode','c')
+    header = read_binary_header(frame,path,file_prefix)
+
+    aux_headers = None
+    if read_aux and header['num_aux'] > 0:
+        aux_headers = [patch_header.get('aux') for patch_header in header['patches']]
+        if None in aux_headers and frame != 0:
+            try:
+                header0 = read_binary_header(0,path,file_prefix)
+                aux_headers = [patch_header.get('aux') for patch_header in header0['patches']]
+            except IOError:
+                logger.info("Unable to find aux in frame %s or frame 0" % frame)
+
+    patches = []
+    for i,patch_header in enumerate(header['patches']):
+        dimensions = []
+        for dim in patch_header['dimensions']:
+            dimensions.append(pyclaw.geometry.Dimension(str(dim['name']),
+                                dim['lower'],dim['upper'],dim['num_cells']))
+        patch = pyclaw.geometry.Patch(dimensions)
+        patch.patch_index = patch_header['patch_index']
+        patch.level = patch_header['level']
+
+        state = pyclaw.state.State(patch,header['num_eqn'],0)
+        state.t = header['t']
+        state.q = _read_array(path,patch_header['q'],mmap_mode)
+        if header['num_aux'] > 0:
+            if aux_headers is not None and aux_headers[i] is not None:
+                state.aux = _read_array(path,aux_headers[i],mmap_mode)
+            else:
+                import numpy as np
+                state.aux = np.zeros((header['num_aux'],)+state.q.shape[1:],order='F')
+
+        solution.states.append(state)
+        patches.append(patch)
+    solution.domain = pyclaw.geometry.Domain(patches)
@@ -1,10 +1,150 @@
 #Reconstruction functions for SharpClaw
 
-def weno(k, q):
+_coefficients = {}
+
+def weno_coefficients(k):
+    r"""
+    Return the coefficients of the WENO reconstruction of order k (odd),
+    which combines the k2 = (k+1)/2 reconstructions from stencils of k2
+    cells.  Stencil r of cell i is made of cells i-r, ..., i-r+k2-1.
+
+    :Output:
+     - (ndarray(2,k2,k2)) - Coefficients of the values of each stencil in
+       the reconstruction at the left (0) and right (1) edge of the cell
+     - (ndarray(2,k2)) - Optimal weights of the stencils for the left (0) and
+       right (1) edge
+     - (ndarray(k2,k2,k2)) - Matrices of the quadratic forms giving the
+       Jiang-Shu smoothness indicator of each stencil
+
+    The coefficients are computed exactly with rational arithmetic, and
+    cached.
+    """
     import numpy as np
+    from fractions import Fraction
 
-    if k != 5:
+    if (k % 2) == 0 or k < 1:
         raise ValueError, '%d order WENO reconstruction not supported' % k
+    if k in _coefficients:
+        return _coefficients[k]
+    k2 = (k+1)/2
+    half = Fraction(1,2)
+
+    def inverse(a):
+        # Gauss-Jordan elimination
+        n = len(a)
+        a = [row[:] + [Fraction(int(i==j)) for j in xrange(n)] for i,row in enumerate(a)]
+        for col in xrange(n):
+            pivot = [i for i in xrange(col,n) if a[i][col] != 0][0]
+            a[col],a[pivot] = a[pivot],a[col]
+            p = a[col][col]
+            a[col] = [x/p for x in a[col]]
+            for i in xrange(n):
+                if i != col and a[i][col] != 0:
+                    f = a[i][col]
+                    a[i] = [x - f*y for x,y in zip(a[i],a[col])]
+        return [row[n:] for row in a]
+
+    def averages(positions,n):
+        # Matrix of the averages of x**l over the cells centered at positions
+        return [[((x+half)**(l+1) - (x-half)**(l+1))/(l+1) for l in xrange(n)]
+                for x in positions]
+
+    def edge_coefficients(positions,edge):
+        n = len(positions)
+        a_inv = inverse(averages(positions,n))
+        return [sum(edge**l * a_inv[l][j] for l in xrange(n)) for j in xrange(n)]
+
+    def power_integral(p):
+        # Integral of x**p over the cell [-1/2,1/2]
+        return 0 if p % 2 else 2*half**(p+1)/(p+1)
+
+    def falling(a,l):
+        f = 1
+        for i in xrange(l):
+            f *= a-i
+        return f
+
+    # Integral over the cell of the sum of the squares of the derivatives
+    # of the polynomial sum(a_l x**l), as a quadratic form in the a_l
+    smoothness = [[sum(falling(a,l)*falling(b,l)*power_integral(a+b-2*l)
+                       for l in xrange(1,min(a,b)+1))
+                   for b in xrange(k2)] for a in xrange(k2)]
+    coefficients = np.empty((2,k2,k2))
+    weights = np.empty((2,k2))
+    betas = np.empty((k2,k2,k2))
+    for r in xrange(k2):
+        positions = range(-r,k2-r)
+        a_inv = inverse(averages(positions,k2))
+        for j1 in xrange(k2):
+            for j2 in xrange(k2):
+                betas[r,j1,j2] = float(sum(a_inv[a][j1]*smoothness[a][b]*a_inv[b][j2]
+                                           for a in xrange(k2) for b in xrange(k2)))
+    for side,edge in enumerate((-half,half)):
+        c = [edge_coefficients(range(-r,k2-r),edge) for r in xrange(k2)]
+        big = edge_coefficients(range(-(k2-1),k2),edge)
+        # Stencil r is the only one with cell i-k2+1+m among stencils >= r
+        d = [None]*k2
+        for m in xrange(k2):
+            r = k2-1-m
+            d[r] = (big[m] - sum(d[rr]*c[rr][m-(k2-1)+rr] for rr in xrange(r+1,k2))) / c[r][0]
+        coefficients[side] = [[float(x) for x in row] for row in c]
+        weights[side] = [float(x) for x in d]
+    _coefficients[k] = (coefficients,weights,betas)
+    return _coefficients[k]
+
+def weno_numpy(k, q, ql=None, qr=None):
+    r"""
+    Return the k order WENO reconstruction (ql,qr) of q at the left and
+    right edges of the cells, for all equations at once.
+
+    The values of the first and last (k-1)/2 cells, which lack a full
+    stencil, are those of q.  The results are stored in ql and qr if they
+    are given.
+    """
+    import numpy as np
+    from numpy.lib.stride_tricks import as_strided
+
+    coefficients,weights,betas = weno_coefficients(k)
+    k2 = (k+1)/2
+    epweno = 1.e-36
+
+    if ql is None:
+        ql = np.empty(q.shape)
+    if qr is None:
+        qr = np.empty(q.shape)
+    ql[...] = q
+    qr[...] = q
+
+    num_eqn,n = q.shape
+    num_cells = n - 2*k2 + 2
+    if num_cells <= 0:
+        return ql,qr
+    # f[p,m,i] is q[m,i+p], for the cells i with a full stencil
+    f = as_strided(q,shape=(k,num_eqn,num_cells),
+                   strides=(q.strides[1],q.strides[0],q.strides[1]))
+
+    for side,qedge in enumerate((ql,qr)):
+        numerator = np.zeros((num_eqn,num_cells))
+        denominator = np.zeros((num_eqn,num_cells))
+        for r in xrange(k2):
+            f_r = f[k2-1-r:2*k2-1-r]
+            beta = np.sum(f_r*np.tensordot(betas[r],f_r,1),axis=0)
+            alpha = weights[side,r]/(epweno+beta)**2
+            numerator += alpha*np.tensordot(coefficients[side,r],f_r,1)
+            denominator += alpha
+        qedge[:,k2-1:n-k2+1] = numerator/denominator
+    return ql,qr
+
+def weno(k, q, ql=None, qr=None):
+    r"""
+    Return the k order WENO reconstruction (ql,qr) of q; see
+    :func:`weno_numpy`.  The fifth order reconstruction is computed by the
+    hand-written formulas of the Fortran code.
+    """
+    import numpy as np
+
+    if k != 5:
+        return weno_numpy(k,q,ql,qr)
 
     epweno=1.e-36
 
@@ -12,8 +152,12 @@ def weno(k, q):
 
     LL=3
     UL=q.shape[1]-2
-    qr=q.copy()
-    ql=q.copy()
+    if ql is None:
+        ql = np.empty(q.shape)
+    if qr is None:
+        qr = np.empty(q.shape)
+    qr[...] = q
+    ql[...] = q
 
     for m1 in [1,2]:
         #m1=1: construct q^-_{i+1/2} (ql)
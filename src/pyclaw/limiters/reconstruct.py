@@ -1,65 +1,112 @@
 r"""(Py)WENO based reconstructor for hyperbolic PDEs.
 
-The :py:mod:`weno.reconstruct` module needs to be built before this
-module can be used.  See 'weno/codegen.py' for details.
+The compiled :py:mod:`weno.reconstruct` module provides the reconstructions
+of order 5 to 17; it needs to be built before it can be used.  See
+'weno/codegen.py' for details.  Orders it does not provide, or all orders if
+it is not built, are reconstructed by :func:`recon.weno`, in NumPy.
 
-To build a higher order reconstruction, *k* needs to be tweaked here
-and in 'weno/codegen.py'.  Also, *num_ghost* needs to be tweaked in the
-PyClaw solver.
+The number of ghost cells used by the PyClaw solver must be (k+1)/2 for a
+reconstruction of order k.
 
 """
 
-import weno.reconstruct as recon
+try:
+    import weno.reconstruct as compiled
+except ImportError:
+    compiled = None
 
-def weno(k, q):
-    r"""Return the *k* order WENO based reconstruction of *q*.
-
-    The reconstruction is component based.
-    """
-
-    import numpy as np
-    # XXX: this should really by a class so that the workspaces (sigma
-    # and weights) can be pre-allocated and the 'getattr's can be done
-    # once instead of every call
-
-    if (k % 2) == 0:
-        raise ValueError, 'even order WENO reconstructions are not supported'
-
-    k = (k+1)/2
-    sigma = np.zeros((q.shape[1], k))
-    weights = np.zeros((q.shape[1], k))
-
-    ql = np.zeros(q.shape)
-    qr = np.zeros(q.shape)
+import recon
 
-    try:
-        smoothness    = getattr(recon, 'smoothness_k' + str(k))
-        weights_l     = getattr(recon, 'weights_left_k' + str(k))
-        weights_r     = getattr(recon, 'weights_right_k' + str(k))
-        reconstruct_l = getattr(recon, 'reconstruct_left_k' + str(k))
-        reconstruct_r = getattr(recon, 'reconstruct_right_k' + str(k))
-    except:
-        raise ValueError, '%d order WENO reconstructions are not supported' % (2*k-1)
 
+class WENOReconstructor(object):
+    r"""
+    Reconstruction of order k (odd) of arrays q of shape (num_eqn, n), at
+    the left (ql) and right (qr) edges of the cells.
 
-    for m in range(q.shape[0]):
-        smoothness(q[m,:], sigma)
+    The reconstruction is component based.  The functions of the compiled
+    module are looked up once, and are applied to all equations at once by
+    laying the rows of q end to end; the workspaces and the ql and qr arrays
+    are allocated once for each shape of q and reused by every call.  The
+    values of the first and last (k-1)/2 cells of each row, which lack a
+    full stencil, are those of q.
 
-        weights_l(sigma, weights)
-        reconstruct_l(q[m,:], weights, ql[m,:])
-
-        weights_r(sigma, weights)
-        reconstruct_r(q[m,:], weights, qr[m,:])
-
-
-    # XXX: copy ghost-cells.  i'm not sure why this is necessary, but
-    # it make the acoustics examples in the implicit time-stepping
-    # branch work properly.
+    :Input:
+     - *k* - (int) Order of the reconstruction
+     - *use_compiled* - (bool) Whether to use the compiled module if it is
+       available, ``default = True``
+    """
+    def __init__(self,k,use_compiled=True):
+        if (k % 2) == 0:
+            raise ValueError, 'even order WENO reconstructions are not supported'
+        self.order = k
+        self.functions = None
+        k2 = (k+1)/2
+        if use_compiled and compiled is not None:
+            try:
+                self.functions = [getattr(compiled,name + str(k2)) for name in
+                                  ('smoothness_k','weights_left_k','reconstruct_left_k',
+                                   'weights_right_k','reconstruct_right_k')]
+            except AttributeError:
+                self.functions = None
+        self.shape = None
+        self.q = None
+        self.ql = None
+        self.qr = None
+        self.sigma = None
+        self.weights = None
+
+    @property
+    def compiled(self):
+        r"""(bool) - Whether the compiled module is used"""
+        return self.functions is not None
+
+    def allocate(self,shape):
+        import numpy as np
+        self.shape = shape
+        self.ql = np.empty(shape)
+        self.qr = np.empty(shape)
+        if self.compiled:
+            k2 = (self.order+1)/2
+            size = shape[0]*shape[1]
+            self.q = np.empty(shape)
+            self.sigma = np.empty((size,k2))
+            self.weights = np.empty((size,k2))
+
+    def __call__(self,q):
+        r"""
+        Return the reconstruction (ql,qr) of q.  The arrays are overwritten
+        by the next call.
+        """
+        if q.shape != self.shape:
+            self.allocate(q.shape)
+        if not self.compiled:
+            return recon.weno(self.order,q,self.ql,self.qr)
+
+        smoothness,weights_l,reconstruct_l,weights_r,reconstruct_r = self.functions
+        # Contiguous copy of q, with the equations end to end
+        self.q[...] = q
+        f = self.q.reshape(-1)
+        ql = self.ql.reshape(-1)
+        qr = self.qr.reshape(-1)
+
+        smoothness(f,self.sigma)
+        weights_l(self.sigma,self.weights)
+        reconstruct_l(f,self.weights,ql)
+        weights_r(self.sigma,self.weights)
+        reconstruct_r(f,self.weights,qr)
+
+        # The stencils of the cells at the ends of each row overlap the
+        # next row
+        k2 = (self.order+1)/2
+        for qedge in (self.ql,self.qr):
+            qedge[:,:k2-1] = q[:,:k2-1]
+            qedge[:,q.shape[1]-k2+1:] = q[:,q.shape[1]-k2+1:]
+        return self.ql,self.qr
 
-    ql[:,:k-1]  = ql[:,-2*k+2:-k+1]
-    ql[:,-k+1:] = ql[:,k-1:2*k-2]
 
-    qr[:,:k-1]  = qr[:,-2*k+2:-k+1]
-    qr[:,-k+1:] = qr[:,k-1:2*k-2]
+def weno(k, q):
+    r"""Return the *k* order WENO based reconstruction of *q*.
 
-    return ql, qr
+    The reconstruction is component based.
+    """
+    return WENOReconstructor(k)(q)
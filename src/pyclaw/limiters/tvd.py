@@ -83,119 +83,96 @@ def limit(num_eqn,wave,s,limiter,dtdx):
     Apply a limiter to the waves
 
     Function that limits the given waves using the methods contained
-    in limiter.  This is the vectorized version of the function acting on a 
-    row of waves at a time.
+    in limiter.  The ratio r, the local CFL number and the limiter values
+    are computed once for each wave over the whole array, waves sharing a
+    limiter are limited by a single call, and the waves are multiplied by
+    the limiter values in one operation.  The waves are limited in place.
+
+    The interfaces are along the last axis of the arrays; any axes between
+    the first axes and the last one hold independent rows of interfaces,
+    e.g. the rows of a 2D grid.  The first and last interface of each row
+    are not limited.
     
     :Input:
-     - *wave* - (ndarray(:,num_eqn,num_waves)) The waves at each interface
-     - *s* - (ndarray(:,num_waves)) Speeds for each wave
+     - *wave* - (ndarray(num_eqn,num_waves,...,:)) The waves at each interface
+     - *s* - (ndarray(num_waves,...,:)) Speeds for each wave
      - *limiter* - (``int`` list) Array of type ``int`` determining which 
          limiter to use
-     - *dtdx* - (ndarray(:)) :math:`\Delta t / \Delta x` ratio, used for CFL 
-        dependent limiters
+     - *dtdx* - (ndarray(...,:)) :math:`\Delta t / \Delta x` ratio at each
+        cell (one more than the interfaces), used for CFL dependent limiters
         
     :Output:
-     - (ndarray(:,num_eqn,num_waves)) - Returns the limited waves
+     - (ndarray(num_eqn,num_waves,...,:)) - Returns the limited waves
 
     :Version: 1.1 (2009-07-05)
     """
-    
-    # wave_norm2 is the sum of the squares along the num_eqn axis,
-    # so the norm of the cell i for wave number j is addressed 
-    # as wave_norm2[i,j]
-    wave_norm2 = np.sum(np.square(wave),axis=0)
-    wave_zero_mask = np.array((wave_norm2 == 0), dtype=float)
-    wave_nonzero_mask = (1.0-wave_zero_mask)
-
-    # dotls contains the products of adjacent cell values summed
-    # along the num_eqn axis.  For reference, dotls[0,:,:] is the dot
-    # product of the 0 cell and the 1 cell.
-    dotls = np.sum(wave[:,:,1:]*wave[:,:,:-1],axis=0)
-
-    # array containing ones where s > 0, zeros elsewhere
-    spos = np.array(s > 0.0, dtype=float)[:,1:-1]
-
-    # Here we construct a masked array, then fill the empty values with 0,
-    # this is done in case wave_norm2 is 0 or close to it
-    # Take upwind dot product
-    r = np.ma.array((spos*dotls[:,:-1] + (1-spos)*dotls[:,1:]))
-    # Divide it by the norm**2
-    r /= np.ma.array(wave_norm2[:,1:-1])
-    # Fill the rest of the array
-    r.fill_value = 0
-    r = r.filled()
-    
-    for mw in xrange(wave.shape[1]):
-        # skip waves that are marked as not needing a limiter
-        limit_func = limiter_functions.get(limiter[mw])
-        if limit_func is not None:
-            for m in xrange(num_eqn):
-                cfl = np.abs(s[mw,1:-1]*(dtdx[1:-2]*spos[mw,:] 
-                                        + (1-spos[mw,:])*dtdx[2:-1]))
-                wlimitr = limit_func(r[mw,:],cfl)
-                wave[m,mw,1:-1] = wave[m,mw,1:-1]*wave_zero_mask[mw,1:-1] \
-                    + wlimitr * wave[m,mw,1:-1] * wave_nonzero_mask[mw,1:-1]
+    limiter = np.array(limiter,ndmin=1)
+    num_waves = wave.shape[1]
 
+    # wave_norm2 is the sum of the squares along the num_eqn axis,
+    # so the norm of wave mw at interface i is wave_norm2[mw,...,i]
+    wave_norm2 = np.sum(np.square(wave[...,1:-1]),axis=0)
+    nonzero = wave_norm2 > 0.0
+
+    # dotls contains the products of adjacent waves summed along the
+    # num_eqn axis: dotls[mw,...,i] is the product of waves i and i+1
+    dotls = np.sum(wave[...,1:]*wave[...,:-1],axis=0)
+
+    # Take upwind dot product and divide it by the norm**2, with r = 0
+    # where the wave is zero
+    spos = s[...,1:-1] > 0.0
+    r = np.where(spos,dotls[...,:-1],dotls[...,1:])
+    r /= np.where(nonzero,wave_norm2,1.0)
+    r[~nonzero] = 0.0
+
+    cfl = np.abs(s[...,1:-1]) * np.where(spos,dtdx[...,1:-2],dtdx[...,2:-1])
+
+    # Limit the waves sharing each limiter together; waves marked as not
+    # needing a limiter are left unchanged
+    phi = np.ones(r.shape)
+    for method in np.unique(limiter):
+        limit_func = limiter_functions.get(method)
+        if limit_func is None:
+            continue
+        waves = np.nonzero(limiter == method)[0]
+        if len(waves) == num_waves:
+            phi[...] = limit_func(r,cfl)
+        else:
+            phi[waves] = limit_func(r[waves],cfl[waves])
+    phi[~nonzero] = 1.0
+
+    wave[...,1:-1] *= phi
     return wave
 
+
+# ============================================================================
+#  Limiter functions
+# ============================================================================
 def minmod_limiter(r,cfl):
     r"""
     Minmod vectorized limiter
     """
-    a = np.ones((2,len(r)))
-    b = np.zeros((2,len(r)))
-    
-    a[1,:] = r
-    
-    b[1,:] = np.min(a,axis=0)
-    
-    return np.max(b,axis=0)
-    
+    return np.maximum(0.0,np.minimum(1.0,r))
 
 def superbee_limiter(r,cfl):
     r"""
     Superbee vectorized limiter
     """
-    a = np.ones((2,len(r)))
-    b = np.zeros((2,len(r)))
-    c = np.zeros((3,len(r)))
-
-    a[1,:] = 2.0*r
-    
-    b[1,:] = r
-
-    c[1,:] = np.min(a,axis=0)
-    c[2,:] = np.min(b,axis=0)
+    return np.maximum(0.0,np.maximum(np.minimum(1.0,2.0*r),np.minimum(2.0,r)))
 
-    return np.max(c,axis=0)
-    
 def mc_limiter(r,cfl):
     r"""
     MC vectorized limiter
     """
-    a = np.empty((3,len(r)))
-    b = np.zeros((2,len(r)))
-
-    a[0,:] = (1.0 + r) / 2.0
-    a[1,:] = 2
-    a[2,:] = 2.0 * r
-    
-    b[1,:] = np.min(a,axis=0)
+    return np.maximum(0.0,np.minimum(np.minimum((1.0 + r) / 2.0,2.0),2.0 * r))
 
-    return np.max(b,axis=0)
-    
 def van_leer_klein_sharpening_limiter(r,cfl):
     r"""
     van Leer with Klein sharpening, k=2
     """
-    a = np.ones((2,len(r))) * 1.e-5
-    a[0,:] = r
-    
-    rcorr = np.max(a,axis=0)
-    a[1,:] = 1/rcorr
-    sharg = np.min(a,axis=0)
+    rcorr = np.maximum(r,1.e-5)
+    sharg = np.minimum(r,1.0/rcorr)
     sharp = 1.0 + sharg * (1.0 - sharg) * (1.0 - sharg**2)
-    
     return (r+np.abs(r)) / (1.0 + np.abs(r)) * sharp
 
 def arora_roe(r,cfl):
@@ -203,20 +180,11 @@ def arora_roe(r,cfl):
     Arora-Roe limiter, limited version of the linear third order scheme
     """
     caut = 0.99
-    
-    a = np.empty((3,len(r)))
-    b = np.zeros((2,len(r)))
-    
     s1 = (caut * 2.0 / cfl)
     s2 = (1.0 + cfl) / 3.0
     phimax = caut * 2.0 / (1.0 - cfl)
-    
-    a[0,:] = s1 * r
-    a[1,:] = 1.0 + s2 * (r - 1.0)
-    a[2,:] = phimax
-    b[1,:] = np.min(a,axis=0)
-    
-    return np.max(b,axis=0)
+    return np.maximum(0.0,np.minimum(np.minimum(s1 * r,1.0 + s2 * (r - 1.0)),
+                                     phimax))
 
 def theta_limiter(r,cfl,theta=0.95):
     r"""
@@ -225,80 +193,35 @@ def theta_limiter(r,cfl,theta=0.95):
     Additional Input:
      - *theta* =
     """
-    a = np.empty((2,len(r)))
-    b = np.empty((3,len(r)))
-    
-    a[0,:] = 0.001
-    a[1,:] = cfl
-    cfmod1 = np.max(a,axis=0)
-    a[0,:] = 0.999
-    cfmod2 = np.min(a,axis=0)
+    cfmod1 = np.maximum(0.001,cfl)
+    cfmod2 = np.minimum(0.999,cfl)
     s1 = 2.0 / cfmod1
     s2 = (1.0 + cfl) / 3.0
     phimax = 2.0 / (1.0 - cfmod2)
-    
-    a[0,:] = (1.0 - theta) * s1
-    a[1,:] = 1.0 + s2 * (r - 1.0)
-    left = np.max(a,axis=0)
-    a[0,:] = (1.0 - theta) * phimax * r
-    a[1,:] = theta * s1 * r
-    middle = np.max(a,axis=0)
-    
-    b[0,:] = left
-    b[1,:] = middle
-    b[2,:] = theta*phimax
-    
-    return np.min(b,axis=0)
-    
+
+    left = np.maximum((1.0 - theta) * s1,1.0 + s2 * (r - 1.0))
+    middle = np.maximum((1.0 - theta) * phimax * r,theta * s1 * r)
+    return np.minimum(np.minimum(left,middle),theta*phimax)
+
 def cfl_superbee(r,cfl):
     r"""
     CFL-Superbee (Roe's Ultrabee) without theta parameter
     """
-    a = np.empty((2,len(r)))
-    b = np.zeros((3,len(r)))
-    
-    a[0,:] = 0.001
-    a[1,:] = cfl
-    cfmod1 = np.max(a,axis=0)
-    a[0,:] = 0.999
-    cfmod2 = np.min(a,axis=0)
-    
-    a[0,:] = 1.0
-    a[1,:] = 2.0 * r / cfmod1
-    b[1,:] = np.min(a,axis=0)
-    a[0,:] = 2.0/(1-cfmod2)
-    a[1,:] = r
-    b[2,:] = np.min(a,axis=0)
-    
-    return np.max(b,axis=0)
+    cfmod1 = np.maximum(0.001,cfl)
+    cfmod2 = np.minimum(0.999,cfl)
+    return np.maximum(0.0,np.maximum(np.minimum(1.0,2.0 * r / cfmod1),
+                                     np.minimum(2.0/(1-cfmod2),r)))
 
-    
 def cfl_superbee_theta(r,cfl,theta=0.95):
     r"""
     CFL-Superbee (Roe's Ultrabee) with theta parameter
     """
-    a = np.empty((2,len(r)))
-    b = np.zeros((2,len(r)))
-    
-    a[0,:] = 0.001
-    a[1,:] = cfl
-    cfmod1 = np.max(a,axis=0)
-    a[0,:] = 0.999
-    cfmod2 = np.min(a,axis=0)
-
+    cfmod1 = np.maximum(0.001,cfl)
+    cfmod2 = np.minimum(0.999,cfl)
     s1 = theta * 2.0 / cfmod1
     phimax = theta * 2.0 / (1.0 - cfmod2)
-
-    a[0,:] = s1*r
-    a[1,:] = phimax
-    b[1,:] = np.min(a,axis=0)
-    ultra = np.max(b,axis=0)
-    
-    a[0,:] = ultra
-    b[0,:] = 1.0
-    b[1,:] = r
-    a[1,:] = np.max(b,axis=0)
-    return np.min(a,axis=0)
+    ultra = np.maximum(0.0,np.minimum(s1*r,phimax))
+    return np.minimum(ultra,np.maximum(1.0,r))
 
 def beta_limiter(r,cfl,theta=0.95,beta=0.66666666666666666):
     r"""
@@ -308,54 +231,30 @@ def beta_limiter(r,cfl,theta=0.95,beta=0.66666666666666666):
      - *theta*
      - *beta*
     """
-    a = np.empty((2,len(r)))
-    b = np.zeros((2,len(r)))
-    
-    a[0,:] = 0.001
-    a[1,:] = cfl
-    cfmod1 = np.max(a,axis=0)
-    a[0,:] = 0.999
-    cfmod2 = np.min(a,axis=0)
-    
+    cfmod1 = np.maximum(0.001,cfl)
+    cfmod2 = np.minimum(0.999,cfl)
     s1 = theta * 2.0 / cfmod1
     s2 = (1.0 + cfl) / 3.0
     phimax = theta * 2.0 / (1.0 - cfmod2)
+    ultra = np.maximum(0.0,np.minimum(s1*r,phimax))
     
-    a[0,:] = s1*r
-    a[1,:] = phimax
-    b[1,:] = np.min(a)
-    ultra = np.max(b)
-    
-    a[0,:] = 1.0 + (s2 - beta/2.0) * (r-1.0)
-    a[1,:] = 1.0 + (s2 + beta/2.0) * (r-1.0)
-    b[0,:] = ultra
-    b[1,:] = np.max(a)
-    a[0,:] = 0.0
-    a[1,:] = np.min(b)
-    
-    return np.max(a)
+    linear = np.maximum(1.0 + (s2 - beta/2.0) * (r-1.0),
+                        1.0 + (s2 + beta/2.0) * (r-1.0))
+    return np.maximum(0.0,np.minimum(ultra,linear))
 
 
 def hyperbee_limiter(r,cfl):
     r"""Hyperbee"""
-    a = np.empty((2,len(r)))
-    
-    a[0,:] = 0.001
-    a[1,:] = cfl
-    cfmod1 = np.max(a,axis=0)
-    a[0,:] = 0.999
-    cfmod2 = np.min(a,axis=0)
-    
-    index1 = r < 0.0
-    index2 = np.abs(r-1.0) < 1.0e-6
-    index3 = np.abs(index1 + index2 - 1)
-    master_index = index1 * 0 + index2 * 1 + index3 * 2
-
-    rmin = r-1.0
-    rdur = r/rmin
-    return np.choose(master_index,[0.0,1.0,
-                                    2.0 * rdur * (cfl * rmin + 1.0 - r**cfl) 
-                                    / (cfmod1 * (1.0 - cfmod2) * rmin)])
+    cfmod1 = np.maximum(0.001,cfl)
+    cfmod2 = np.minimum(0.999,cfl)
+
+    # The formula is only used where r >= 0 and r != 1
+    with np.errstate(divide='ignore',invalid='ignore'):
+        rmin = r-1.0
+        rdur = r/rmin
+        phi = (2.0 * rdur * (cfl * rmin + 1.0 - r**cfl)
+               / (cfmod1 * (1.0 - cfmod2) * rmin))
+    return np.where(r < 0.0,0.0,np.where(np.abs(r-1.0) < 1.0e-6,1.0,phi))
     
 def superpower_limiter(r,cfl,caut=1.0):
     r"""
@@ -383,40 +282,27 @@ def cada_torrilhon_limiter(r,cfl,epsilon=1.0e-3):
     Additional Input:
      - *epsilon* = 
     """
-    a = np.ones((2,len(r))) * 0.95
-    b = np.empty((3,len(r)))
+    cfl = np.maximum(0.05,np.minimum(0.95,cfl))
+    rabs = np.abs(r)
 
-    a[0,:] = cfl
-    cfl = np.min(a)
-    a[1,:] = 0.05
-    cfl = np.max(a)
-    
-    # Multiply all parts except b[0,:] by (1.0 - epsilon) as well
-    b[0,:] = 1.0 + (1+cfl) / 3.0 * (r - 1)
-    b[1,:] = 2.0 * np.abs(r) / (cfl + epsilon)
-    b[2,:] = (8.0 - 2.0 * cfl) / (np.abs(r) * (cfl - 1.0 - epsilon)**2)
-    b[1,::2] *= (1.0 - epsilon)
-    a[0,:] = np.min(b)
-    a[1,:] = (-2.0 * (cfl**2 - 3.0 * cfl + 8.0) * (1.0-epsilon)
-                    / (np.abs(r) * (cfl**3 - cfl**2 - cfl + 1.0 + epsilon)))
-    
-    return np.max(a)
+    # Multiply all parts except the first one by (1.0 - epsilon) as well
+    upper = np.minimum(1.0 + (1+cfl) / 3.0 * (r - 1),
+                       np.minimum(2.0 * rabs / (cfl + epsilon),
+                                  (8.0 - 2.0 * cfl) / (rabs * (cfl - 1.0 - epsilon)**2))
+                       * (1.0 - epsilon))
+    lower = (-2.0 * (cfl**2 - 3.0 * cfl + 8.0) * (1.0-epsilon)
+             / (rabs * (cfl**3 - cfl**2 - cfl + 1.0 + epsilon)))
+    return np.maximum(upper,lower)
     
 def cada_torrilhon_limiter_nonlinear(r,cfl):
     r"""
     Cada-Torrilhon modified, version for nonlinear waves
     """
-    a = np.empty((3,len(r)))
-    b = np.empty((2,len(r)))
-    
     s2 = (1.0 + cfl) / 3.0
-    a[0,:] = 1.0 + s2 * (r - 1.0)
-    a[1,:] = 2.0 * np.abs(r) / (0.6 + np.abs(r))
-    a[2,:] = 5.0 / np.abs(r)
-    b[0,:] = np.min(a)
-    b[1,:] = -3.0 / np.abs(r)
-    
-    return np.max(b)
+    rabs = np.abs(r)
+    upper = np.minimum(np.minimum(1.0 + s2 * (r - 1.0),2.0 * rabs / (0.6 + rabs)),
+                       5.0 / rabs)
+    return np.maximum(upper,-3.0 / rabs)
     
 def upper_bound_limiter(r,cfl,theta=1.0):
     r"""
@@ -425,23 +311,11 @@ def upper_bound_limiter(r,cfl,theta=1.0):
     Additional Input:
      - *theta* =
      """
-    a = np.empty((2,len(r)))
-    b = np.zeros((2,len(r)))
-    
-    a[0,:] = 0.001
-    a[1,:] = cfl
-    cfmod1 = np.max(a,axis=0)
-    a[0,:] = 0.999
-    cfmod2 = np.min(a,axis=0)
-    
+    cfmod1 = np.maximum(0.001,cfl)
+    cfmod2 = np.minimum(0.999,cfl)
     s1 = theta * 2.0 / cfmod1
     phimax = theta * 2.0 / (1.0 - cfmod2)
-    
-    a[0,:] = s1*r
-    a[1,:] = phimax
-    b[1,:] = np.min(a)
-    
-    return np.max(b)
+    return np.maximum(0.0,np.minimum(s1*r,phimax))
 
 
 # ============================================================================
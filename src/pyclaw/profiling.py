@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# encoding: utf-8
+r"""
+Timers for the phases of the time steps of a solver.
+
+Each solver has a :class:`Timings` object, ``solver.timings``, in which the
+time stepping routines record the wall-clock time and the number of calls of
+each phase of a step: the boundary conditions, the hyperbolic kernel, the
+source terms, the user functions, the CFL reduction, the gauges, and, when the
+solver is run by a :class:`~pyclaw.controller.Controller`, the output.  The
+time of a phase excludes the time of the phases it calls (for instance the
+boundary conditions applied by the kernel), so the times add up to the total
+time.  The time spent on steps that were rejected and taken again is
+counted separately::
+
+    >>> from clawpack import pyclaw
+    >>> solver = pyclaw.ClawSolver1D()
+    >>> solver.timings.start('hyperbolic')
+    >>> solver.timings.start('q_bcs')
+    >>> t = solver.timings.stop()
+    >>> t = solver.timings.stop()
+    >>> sorted(solver.timings.calls.items())
+    [('hyperbolic', 1), ('q_bcs', 1)]
+
+A run is summarized by :meth:`Timings.report` (or
+:meth:`~pyclaw.controller.Controller.profile_report`); if ``trace`` is set,
+each timed call is also recorded and can be written as a Chrome trace file
+(see :meth:`Timings.write_chrome_trace`), to be viewed in chrome://tracing
+or Perfetto.
+"""
+
+import os
+from timeit import default_timer
+
+# Phases recorded by the solvers and the controller, in the order they are
+# reported
+phases = ['q_bcs','aux_bcs','hyperbolic','source','before_step','cfl',
+          'step','gauges','after_step','checkpoint','evolve_to_time',
+          'output','run']
+
+class Timings(object):
+    r"""
+    Wall-clock times and call counts of the phases of the time steps of a
+    solver.
+
+    Phases are timed by pairs of calls to :meth:`start` and :meth:`stop`,
+    which may be nested; the time of the nested phases is subtracted from
+    that of the enclosing one.  The phases timed by PyClaw are:
+
+     - ``q_bcs``, ``aux_bcs`` - :meth:`~pyclaw.solver.Solver.apply_q_bcs`
+       and :meth:`~pyclaw.solver.Solver.apply_aux_bcs` (including the halo
+       exchange in PetClaw)
+     - ``hyperbolic`` - the kernel (step_hyperbolic or dq_hyperbolic)
+     - ``source`` - step_source or dq_src
+     - ``before_step``, ``after_step`` - the user functions
+     - ``cfl`` - the reduction of the CFL number (and of the error
+       estimate) over the processes
+     - ``step`` - the rest of the step, such as the Runge-Kutta stage
+       combinations
+     - ``gauges`` - recording the gauge values
+     - ``checkpoint`` - writing checkpoints
+     - ``evolve_to_time`` - the rest of the time stepping loop, such as the
+       copies of q kept to retake rejected steps
+     - ``output`` - writing the output frames, functionals and copies kept
+       in memory by :meth:`~pyclaw.controller.Controller.run`
+     - ``run`` - the rest of :meth:`~pyclaw.controller.Controller.run`
+
+    .. attribute:: enabled
+
+        Whether the phases are timed, ``default = True``.  The cost is a
+        few microseconds per step.
+
+    .. attribute:: trace
+
+        Whether each timed call is recorded in :attr:`events`, for
+        :meth:`write_chrome_trace`, ``default = False``.
+
+    .. attribute:: seconds
+
+        Dictionary of the time (s) spent in each phase.
+
+    .. attribute:: calls
+
+        Dictionary of the number of calls of each phase.
+
+    .. attribute:: steps
+
+        Number of accepted time steps.
+
+    .. attribute:: rejected_steps
+
+        Number of rejected time steps.
+
+    .. attribute:: rejected_seconds
+
+        Time (s) spent on the rejected steps; it is included in the time of
+        the phases.
+
+    .. attribute:: events
+
+        List of the timed calls ``(phase,start,duration,depth)`` recorded
+        when trace is set, with times in seconds.
+    """
+    def __init__(self):
+        self.enabled = True
+        self.trace = False
+        self.reset()
+
+    def reset(self):
+        r"""Discard the recorded times, counts and events."""
+        self.seconds = {}
+        self.calls = {}
+        self.steps = 0
+        self.rejected_steps = 0
+        self.rejected_seconds = 0.
+        self.events = []
+        self._stack = []
+
+    def start(self,phase):
+        r"""Start timing a call of phase."""
+        if self.enabled:
+            self._stack.append([phase,default_timer(),0.])
+
+    def stop(self):
+        r"""
+        Stop timing the phase started last, and return the time of the call
+        (including the nested phases).
+        """
+        if not self._stack:
+            return 0.
+        phase, start, nested = self._stack.pop()
+        elapsed = default_timer() - start
+        self.seconds[phase] = self.seconds.get(phase,0.) + elapsed - nested
+        self.calls[phase] = self.calls.get(phase,0) + 1
+        if self._stack:
+            self._stack[-1][2] += elapsed
+        if self.trace:
+            self.events.append((phase,start,elapsed,len(self._stack)))
+        return elapsed
+
+    def accept_step(self):
+        r"""Count an accepted time step."""
+        self.steps += 1
+
+    def reject_step(self,seconds):
+        r"""Count a rejected time step, which took seconds."""
+        self.rejected_steps += 1
+        self.rejected_seconds += seconds
+
+    @property
+    def total_seconds(self):
+        r"""Total time (s) of the timed phases."""
+        return sum(self.seconds.values())
+
+    def summary(self):
+        r"""
+        Return the timings as a dictionary (which can be written as JSON):
+        for each phase its time, number of calls and fraction of the total
+        time, and the step counts.
+        """
+        total = self.total_seconds
+        return {'phases': dict((phase,{'seconds': seconds,
+                                       'calls': self.calls[phase],
+                                       'fraction': seconds/total if total > 0. else 0.})
+                               for phase,seconds in self.seconds.iteritems()),
+                'total_seconds': total,
+                'steps': self.steps,
+                'rejected_steps': self.rejected_steps,
+                'rejected_seconds': self.rejected_seconds}
+
+    def report(self):
+        r"""Return a table of the timings (a string)."""
+        total = self.total_seconds
+        order = [phase for phase in phases if phase in self.seconds]
+        order += sorted(phase for phase in self.seconds if phase not in phases)
+        lines = ['%-16s %12s %7s %10s %12s' % ('phase','time (s)','%','calls','time/call')]
+        for phase in order:
+            seconds = self.seconds[phase]
+            calls = self.calls[phase]
+            lines.append('%-16s %12.4e %7.2f %10d %12.4e' % (phase,seconds,
+                         100*seconds/total if total > 0. else 0.,calls,seconds/calls))
+        lines.append('%-16s %12.4e' % ('total',total))
+        lines.append('steps: %d accepted, %d rejected (%.4e s)'
+                     % (self.steps,self.rejected_steps,self.rejected_seconds))
+        return '\n'.join(lines)
+
+    def __str__(self):
+        return self.report()
+
+    def chrome_trace(self,pid=None):
+        r"""
+        Return the recorded events in the Chrome trace event format (a
+        dictionary to be written as JSON).  pid identifies the process, for
+        instance the MPI rank, so that the traces of several processes can
+        be merged; by default it is the process id.
+        """
+        if pid is None:
+            pid = os.getpid()
+        return {'traceEvents': [{'name': phase, 'ph': 'X', 'pid': pid, 'tid': 0,
+                                 'ts': 1.e6*start, 'dur': 1.e6*duration}
+                                for phase,start,duration,depth in self.events],
+                'displayTimeUnit': 'ms'}
+
+    def write_chrome_trace(self,path,pid=None):
+        r"""
+        Write the recorded events (see :attr:`trace`) to path as a Chrome
+        trace file.
+        """
+        import json
+        trace_file = open(path,'w')
+        try:
+            json.dump(self.chrome_trace(pid),trace_file)
+        finally:
+            trace_file.close()
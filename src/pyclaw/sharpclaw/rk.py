@@ -0,0 +1,274 @@
+r"""
+Runge-Kutta time integrators for method-of-lines solvers (SharpClaw).
+
+Two representations are supported:
+
+ - :class:`LowStorageRK`: methods written in the low-storage form of
+   Ketcheson [ketcheson_2010]_ (3S* with an optional embedded method).
+   These need only one or two full-size registers besides state.q,
+   whatever the number of stages.
+ - :class:`ButcherRK`: general explicit methods given by a Butcher tableau,
+   optionally with an embedded method.  These keep every stage derivative,
+   so they use (number of stages + 1) registers.
+
+Both also use a scratch array of the size of state.q, which holds the
+terms of the linear combinations of registers.
+
+The dictionary :data:`time_integrators` maps the names accepted by
+``solver.time_integrator`` to method objects.  New methods can be added
+to it by the user.  'SSP104' is not in the dictionary: it is implemented
+directly in :meth:`SharpClawSolver.step` with two registers.
+
+Methods with an embedded pair provide a local error estimate, which is
+used to choose the time step when ``solver.error_tolerance`` is set.
+
+.. [ketcheson_2010] D. I. Ketcheson, Runge-Kutta methods with minimum
+   storage implementations, J. Comput. Phys. 229 (2010), 1763-1773.
+"""
+
+import numpy as np
+
+
+def _combine(out,out_coeff,terms,scratch,increment=None,increment_coeff=0.):
+    r"""
+    Set out = out_coeff*out + sum(a*x for a,x in terms) + increment_coeff*increment
+    in place.
+
+    *scratch* (an array of the shape of out) and *increment* are
+    overwritten.  Zero coefficients are skipped, and unit coefficients are
+    not multiplied by.
+    """
+    if out_coeff != 1.:
+        out *= out_coeff
+    for a,x in terms:
+        if a == 0.: continue
+        if a == 1.:
+            out += x
+        else:
+            np.multiply(x,a,out=scratch)
+            out += scratch
+    if increment is not None and increment_coeff != 0.:
+        increment *= increment_coeff
+        out += increment
+
+
+class LowStorageRK(object):
+    r"""
+    Explicit Runge-Kutta method in Ketcheson's 3S* low-storage form.
+
+    With registers S1 (initially u^n), S2 (initially zero) and S3 = u^n,
+    stage i = 0,...,m-1 is::
+
+        S2 := S2 + delta[i]*S1
+        S1 := gamma[i,0]*S1 + gamma[i,1]*S2 + gamma[i,2]*S3 + beta[i]*dt*F(S1)
+
+    and u^{n+1} = S1.  F is evaluated at time t^n + c[i]*dt.  If
+    *delta* has m+2 entries the embedded solution is::
+
+        (S2 + delta[m]*S1 + delta[m+1]*S3) / sum(delta)
+
+    S3 is state.q itself, so the method uses one stage register (none for
+    a one-stage method), plus one more if S2 is needed (when any
+    gamma[:,1] is nonzero or when an error estimate is computed).
+
+    :Input:
+     - *gamma* - (array(m,3)) Coefficients of S1, S2 and S3
+     - *beta* - (array(m)) Coefficients of dt*F
+     - *c* - (array(m)) Stage abscissae
+     - *order* - (int) Order of the method
+     - *delta* - (array(m+2)) Coefficients of the S2 accumulation;
+       ``default = None``
+     - *embedded_order* - (int) Order of the embedded method, if *delta*
+       defines one; ``default = None``
+    """
+    def __init__(self,gamma,beta,c,order,delta=None,embedded_order=None):
+        self.gamma = np.array(gamma,dtype=float)
+        self.beta = np.array(beta,dtype=float)
+        self.c = np.array(c,dtype=float)
+        self.num_stages = len(self.beta)
+        self.order = order
+        if delta is None:
+            delta = np.zeros(self.num_stages+2)
+        self.delta = np.array(delta,dtype=float)
+        if len(self.delta) != self.num_stages+2:
+            raise Exception('delta must have (number of stages + 2) entries')
+        self.embedded_order = embedded_order
+
+    @property
+    def is_embedded(self):
+        return self.embedded_order is not None
+
+    def num_registers(self,estimate_error=False):
+        r"""Number of stage registers needed, not counting state.q."""
+        estimate_error = estimate_error and self.is_embedded
+        nregisters = 0
+        if self.num_stages > 1 or estimate_error:
+            nregisters += 1
+        if (self.gamma[:,1]!=0).any() or estimate_error:
+            nregisters += 1
+        return nregisters
+
+    def step(self,solver,state,stages,scratch,estimate_error=False):
+        r"""
+        Take one step, overwriting state.q with the new solution.  *stages*
+        are the registers (at least :meth:`num_registers` of them) and
+        *scratch* an array of the shape of state.q.
+
+        Returns the maximum norm of the difference between the solution and
+        the embedded solution if *estimate_error* is True and the method has
+        an embedded pair, otherwise None.
+        """
+        m = self.num_stages
+        estimate_error = estimate_error and self.is_embedded
+        use_S2 = (self.gamma[:,1]!=0).any() or estimate_error
+        if self.num_registers(estimate_error) > 0:
+            s1 = stages[0]
+        if use_S2:
+            s2 = stages[-1]
+            s2.q[...] = 0.
+
+        for i in xrange(m):
+            # In the first stage S1 = S3 = state.q
+            stage = state if i==0 else s1
+            if i>0:
+                s1.t = state.t + self.c[i]*solver.dt
+                if solver.call_before_step_each_stage and solver.before_step is not None:
+                    solver.timings.start('before_step')
+                    solver.before_step(solver,s1)
+                    solver.timings.stop()
+            if use_S2 and self.delta[i] != 0.:
+                _combine(s2.q,1.,[(self.delta[i],stage.q)],scratch)
+            deltaq = solver.dq(stage)
+
+            g = self.gamma[i]
+            terms = []
+            if use_S2: terms.append((g[1],s2.q))
+            if i == m-1 and not estimate_error:
+                # Write the last stage directly into state.q
+                if i == 0:
+                    _combine(state.q,g[0]+g[2],terms,scratch,deltaq,self.beta[i])
+                else:
+                    terms.append((g[0],s1.q))
+                    _combine(state.q,g[2],terms,scratch,deltaq,self.beta[i])
+            elif i == 0:
+                np.multiply(state.q,g[0]+g[2],out=s1.q)
+                _combine(s1.q,1.,terms,scratch,deltaq,self.beta[i])
+            else:
+                terms.append((g[2],state.q))
+                _combine(s1.q,g[0],terms,scratch,deltaq,self.beta[i])
+
+        if not estimate_error:
+            return None
+
+        # Embedded solution, then error estimate, in S2
+        _combine(s2.q,1.,[(self.delta[m],s1.q),(self.delta[m+1],state.q)],scratch)
+        s2.q *= 1./np.sum(self.delta)
+        s2.q -= s1.q
+        error = np.max(np.abs(s2.q))
+        state.q[...] = s1.q
+        return error
+
+
+class ButcherRK(object):
+    r"""
+    Explicit Runge-Kutta method given by its Butcher tableau.
+
+    The stage derivatives dt*F(Y_j) are kept for the whole step, so this
+    uses one stage register plus one register per stage.
+
+    :Input:
+     - *A* - (array(s,s)) Strictly lower-triangular coefficient matrix
+     - *b* - (array(s)) Weights
+     - *order* - (int) Order of the method
+     - *bhat* - (array(s)) Weights of the embedded method; ``default = None``
+     - *embedded_order* - (int) Order of the embedded method
+    """
+    def __init__(self,A,b,order,bhat=None,embedded_order=None):
+        self.A = np.array(A,dtype=float)
+        self.b = np.array(b,dtype=float)
+        self.c = np.sum(self.A,1)
+        self.num_stages = len(self.b)
+        self.order = order
+        self.bhat = None if bhat is None else np.array(bhat,dtype=float)
+        self.embedded_order = embedded_order
+
+    @property
+    def is_embedded(self):
+        return self.bhat is not None
+
+    def num_registers(self,estimate_error=False):
+        r"""Number of stage registers needed, not counting state.q."""
+        return self.num_stages+1
+
+    def step(self,solver,state,stages,scratch,estimate_error=False):
+        r"""
+        Take one step, overwriting state.q with the new solution.
+
+        The stage derivatives are evaluated into stages[1:].  See
+        :meth:`LowStorageRK.step`.
+        """
+        y = stages[0]
+        K = [stage.q for stage in stages[1:self.num_stages+1]]
+        for i in xrange(self.num_stages):
+            if i == 0:
+                solver.dq(state,K[0])
+                continue
+            y.q[...] = state.q
+            _combine(y.q,1.,[(self.A[i,j],K[j]) for j in xrange(i)],scratch)
+            y.t = state.t + self.c[i]*solver.dt
+            if solver.call_before_step_each_stage and solver.before_step is not None:
+                solver.timings.start('before_step')
+                solver.before_step(solver,y)
+                solver.timings.stop()
+            solver.dq(y,K[i])
+
+        error = None
+        if estimate_error and self.is_embedded:
+            e = self.b - self.bhat
+            j0 = np.nonzero(e)[0][0]
+            np.multiply(K[j0],e[j0],out=y.q)
+            _combine(y.q,1.,[(e[j],K[j]) for j in xrange(j0+1,self.num_stages)],scratch)
+            error = np.max(np.abs(y.q))
+
+        _combine(state.q,1.,[(self.b[j],K[j]) for j in xrange(self.num_stages)],scratch)
+        return error
+
+
+def ssp_s2(s):
+    r"""
+    Optimal s-stage, second order SSP method (SSP coefficient s-1), with an
+    embedded first order method (forward Euler).
+    """
+    gamma = [[1.,0.,0.]]*(s-1) + [[(s-1.)/s,0.,1./s]]
+    beta = [1./(s-1)]*(s-1) + [1./s]
+    c = [i/(s-1.) for i in xrange(s)]
+    # Forward Euler = (s-1)*(u + dt/(s-1)*F(u)) - (s-2)*u
+    delta = [0.]*(s+2)
+    delta[1] = s-1.
+    delta[s+1] = -(s-2.)
+    return LowStorageRK(gamma,beta,c,2,delta,1)
+
+
+# ============================================================================
+#  Time integrator dictionary
+# ============================================================================
+time_integrators = {
+    'Euler'  : LowStorageRK([[1.,0.,0.]],[1.],[0.],1),
+    'SSP22'  : ssp_s2(2),
+    'SSP32'  : ssp_s2(3),
+    'SSP52'  : ssp_s2(5),
+    # Shu-Osher SSP(3,3), embedded Heun's method: 2*Y_2 - u
+    'SSP33'  : LowStorageRK([[1.,0.,0.],[0.25,0.,0.75],[2./3.,0.,1./3.]],
+                            [1.,0.25,2./3.],[0.,1.,0.5],3,
+                            [0.,0.,2.,0.,-1.],2),
+    # SSP(4,3), embedded second order method with weights (1,1,1,1)/4
+    'SSP43'  : LowStorageRK([[1.,0.,0.],[1.,0.,0.],[1./3.,0.,2./3.],[1.,0.,0.]],
+                            [0.5,0.5,1./6.,0.5],[0.,0.5,1.,0.5],3,
+                            [0.,0.,0.,1.,0.5,-0.5],2),
+    'RK44'   : ButcherRK([[0.,0.,0.,0.],[0.5,0.,0.,0.],[0.,0.5,0.,0.],[0.,0.,1.,0.]],
+                         [1./6.,1./3.,1./3.,1./6.],4),
+    # Bogacki-Shampine 3(2) pair
+    'BS32'   : ButcherRK([[0.,0.,0.,0.],[0.5,0.,0.,0.],[0.,0.75,0.,0.],[2./9.,1./3.,4./9.,0.]],
+                         [2./9.,1./3.,4./9.,0.],3,
+                         [7./24.,0.25,1./3.,0.125],2),
+}
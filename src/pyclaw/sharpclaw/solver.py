@@ -6,15 +6,12 @@ Module containing SharpClaw solvers for PyClaw/PetClaw
 #  Author:      David Ketcheson
 """
 # Solver superclass
-from ..solver import Solver, CFLError
+from ..solver import Solver, BatchedSolver, CFLError
 
-# Reconstructor
-try:
-    # load c-based WENO reconstructor (PyWENO)
-    from ..limiters import reconstruct as recon
-except ImportError:
-    # load old WENO5 reconstructor
-    from ..limiters import recon
+# Reconstructors: c-based WENO (PyWENO) with NumPy fallback, and WENO5
+# wave-based
+from ..limiters import recon
+from ..limiters.reconstruct import WENOReconstructor
 
 
 def before_step(solver,solution):
@@ -36,7 +33,7 @@ class SharpClawSolver(Solver):
 
     .. attribute:: before_step
     
-        Function called before each time step is taken.
+        Function called before each time step is taken, ``default = None``.
         The required signature for this function is:
         
         def before_step(solver,solution)
@@ -52,14 +49,27 @@ class SharpClawSolver(Solver):
     .. attribute:: weno_order
 
         Order of the WENO reconstruction. From 1st to 17th order (PyWENO)
+        With the Python kernel, the orders 5 to 17 use the compiled PyWENO
+        reconstruction if it is built, and the others (or all, if it is not
+        built) a NumPy implementation; the wave-based reconstruction
+        (char_decomp = 1) is only available at 5th order.
         ``Default = 5``
 
     .. attribute:: time_integrator
 
         Time integrator to be used.
         Euler: forward Euler method.
-        SSP33: 3-stages, 3rd-order SSP Runge-Kutta method.
+        SSP22, SSP32, SSP52: 2, 3 and 5-stages, 2nd-order SSP Runge-Kutta
+        methods (embedded Euler).
+        SSP33: 3-stages, 3rd-order SSP Runge-Kutta method (embedded SSP22).
+        SSP43: 4-stages, 3rd-order SSP Runge-Kutta method (embedded 2nd order).
         SSP104: 10-stages, 4th-order SSP Runge-Kutta method.
+        RK44: classical 4-stages, 4th-order Runge-Kutta method.
+        BS32: Bogacki-Shampine 3(2) pair.
+        All methods except RK44 and BS32 use at most two registers besides
+        state.q (three with an error estimate) and a scratch array.  Other methods can be given
+        as :class:`~clawpack.pyclaw.sharpclaw.rk.LowStorageRK` or
+        :class:`~clawpack.pyclaw.sharpclaw.rk.ButcherRK` objects.
         ``Default = 'SSP104'``
 
     .. attribute:: char_decomp
@@ -119,6 +129,15 @@ class SharpClawSolver(Solver):
         Whether to call the method `self.before_step` before each RK stage.
         ``Default = False``
 
+    .. attribute:: fuse_riemann_solves
+
+        Python kernel in 1D only: whether the Riemann problems at the cell
+        interfaces and inside the cells are solved by a single call to the
+        Riemann solver, with the states of both laid end to end.  Set it to
+        False if the Riemann solver does not treat each problem
+        independently of the others.
+        ``Default = False``
+
     """
     
     # ========================================================================
@@ -129,7 +148,7 @@ class SharpClawSolver(Solver):
         Set default options for SharpClawSolvers and call the super's __init__().
         """
         self.limiters = [1]
-        self.before_step = before_step
+        self.before_step = None
         self.lim_type = 2
         self.weno_order = 5
         self.time_integrator = 'SSP104'
@@ -146,6 +165,20 @@ class SharpClawSolver(Solver):
         self._mthlim = self.limiters
         self._method = None
         self._rk_stages = None
+        self._rk_scratch = None
+        self._reconstructor = None
+        self.fuse_riemann_solves = False
+        self._riemann_states = None
+        # Steps taken by step() (a retaken step keeps its number) and the
+        # stage of the current step, used as the key of _wave_cache
+        self._step_index = 0
+        self._stage_index = None
+        self._wave_cache = None
+        # Arrays allocated by setup: the register returned by dq(), the
+        # values of dq with ghost cells written by the kernels, and dt/dx
+        self._dq = None
+        self._dq_work = None
+        self._dtdx = None
         
 
         # Call general initialization function
@@ -176,7 +209,17 @@ class SharpClawSolver(Solver):
             state.set_cparam(self.rp)
             self.set_fortran_parameters(state,self.fmod.clawparams,self.fmod.workspace,self.fmod.reconstruct)
 
+        elif self.lim_type == 2:
+            if self.char_decomp == 1 and self.weno_order != 5:
+                raise NotImplementedError('Wave-based WENO reconstruction is only implemented for weno_order = 5')
+            self._reconstructor = WENOReconstructor(self.weno_order)
+
+        import numpy as np
         self.allocate_bc_arrays(state)
+        self._dq = np.empty(state.q.shape,order='F')
+        self._dq_work = np.empty(self.qbc.shape,order='F')
+        if self.kernel_language == 'Python':
+            self._dtdx = np.empty(self.qbc[0].size)
 
         self._is_set_up = True
 
@@ -184,74 +227,133 @@ class SharpClawSolver(Solver):
     def step(self,solution):
         """Evolve q over one time step.
 
-        Take on Runge-Kutta time step using the method specified by
-        self..time_integrator.  Currently implemented methods:
+        Take one Runge-Kutta time step using the method specified by
+        self.time_integrator: either a key of
+        :data:`~clawpack.pyclaw.sharpclaw.rk.time_integrators` (for instance
+        'Euler', 'SSP33', 'SSP43', 'BS32'), a :class:`LowStorageRK` or
+        :class:`ButcherRK` object, or
 
-        'Euler'  : 1st-order Forward Euler integration
-        'SSP33'  : 3rd-order strong stability preserving method of Shu & Osher
         'SSP104' : 4th-order strong stability preserving method Ketcheson
+
+        If the method has an embedded pair and self.error_tolerance is set,
+        the local error estimate is stored for evolve_to_time.
         """
         state = solution.states[0]
 
-        self.before_step(self,state)
-
+        if self.before_step is not None:
+            self.timings.start('before_step')
+            self.before_step(self,state)
+            self.timings.stop()
+
+        if self.time_integrator=='SSP104':
+            method = None
+            nregisters = 1
+        else:
+            method = self.get_time_integrator()
+            estimate_error = self.error_tolerance is not None
+            nregisters = method.num_registers(estimate_error)
+        if len(self._rk_stages) < nregisters or \
+                (method is not None and self._rk_scratch is None):
+            # time_integrator or error_tolerance was changed after setup
+            self.allocate_rk_stages(solution)
+
+        # The stages share (PyClaw) or hold a copy of (PetClaw) the aux
+        # array of the solution state; they take its version, so that
+        # update_aux_bcs fills auxbc once for all of them
+        if state.num_aux > 0:
+            for stage in self._rk_stages:
+                if stage._aux_version != state._aux_version:
+                    stage.aux = state.aux
+                    stage._aux_version = state._aux_version
+
+        if not self._retake_step:
+            self._step_index += 1
+        self._stage_index = 0
+
+        # All updates are done in place on state.q, the stage registers and
+        # the scratch array allocated by allocate_rk_stages and the array
+        # returned by dq(), so no full-size temporaries are created.
         try:
-            if self.time_integrator=='Euler':
-                deltaq=self.dq(state)
-                state.q+=deltaq
-
-            elif self.time_integrator=='SSP33':
-                deltaq=self.dq(state)
-                self._rk_stages[0].q=state.q+deltaq
-                self._rk_stages[0].t =state.t+self.dt
-
-                if self.call_before_step_each_stage:
-                    self.before_step(self,self._rk_stages[0])
-                deltaq=self.dq(self._rk_stages[0])
-                self._rk_stages[0].q= 0.75*state.q + 0.25*(self._rk_stages[0].q+deltaq)
-                self._rk_stages[0].t = state.t+0.5*self.dt
-
-                if self.call_before_step_each_stage:
-                    self.before_step(self,self._rk_stages[0])
-                deltaq=self.dq(self._rk_stages[0])
-                state.q = 1./3.*state.q + 2./3.*(self._rk_stages[0].q+deltaq)
-
-
-            elif self.time_integrator=='SSP104':
-                s1=self._rk_stages[0]
-                s2=self._rk_stages[1]
-                s1.q = state.q.copy()
-
-                deltaq=self.dq(state)
-                s1.q = state.q + deltaq/6.
-                s1.t = state.t + self.dt/6.
-
-                for i in xrange(4):
-                    if self.call_before_step_each_stage:
-                        self.before_step(self,s1)
-                    deltaq=self.dq(s1)
-                    s1.q=s1.q + deltaq/6.
-                    s1.t =s1.t + self.dt/6.
-
-                s2.q = state.q/25. + 9./25 * s1.q
-                s1.q = 15. * s2.q - 5. * s1.q
-                s1.t = state.t + self.dt/3.
-
-                for i in xrange(4):
-                    if self.call_before_step_each_stage:
-                        self.before_step(self,s1)
-                    deltaq=self.dq(s1)
-                    s1.q=s1.q + deltaq/6.
-                    s1.t =s1.t + self.dt/6.
-                
-                if self.call_before_step_each_stage:
-                    self.before_step(self,s1)
-                deltaq = self.dq(s1)
-                state.q = s2.q + 0.6 * s1.q + 0.1 * deltaq
+            if method is None:
+                self._local_error = None
+                self.ssp104(state)
             else:
-                raise Exception('Unrecognized time integrator')
+                self._local_error = method.step(self,state,self._rk_stages,
+                                                self._rk_scratch,estimate_error)
+                if self._local_error is not None:
+                    self._error_order = min(method.order,method.embedded_order)+1
         except CFLError:
             return False
+        finally:
+            self._stage_index = None
+
+    def ssp104(self,state):
+        r"""
+        Take a step with the 10-stage, fourth order SSP method of Ketcheson,
+        using the two-register implementation: state.q holds the
+        intermediate combination of u^n and the fifth stage.
+        """
+        import numpy as np
+
+        s1=self._rk_stages[0]
+
+        deltaq=self.dq(state)
+        deltaq*=1./6.
+        np.add(state.q,deltaq,out=s1.q)
+        s1.t = state.t + self.dt/6.
+
+        for i in xrange(4):
+            if self.call_before_step_each_stage and self.before_step is not None:
+                self.timings.start('before_step')
+                self.before_step(self,s1)
+                self.timings.stop()
+            deltaq=self.dq(s1)
+            deltaq*=1./6.
+            s1.q+=deltaq
+            s1.t =s1.t + self.dt/6.
+
+        # state.q = state.q/25. + 9./25 * s1.q
+        state.q*=1./9.
+        state.q+=s1.q
+        state.q*=9./25.
+        # s1.q = 15. * state.q - 5. * s1.q
+        s1.q*=-1./3.
+        s1.q+=state.q
+        s1.q*=15.
+        s1.t = state.t + self.dt/3.
+
+        for i in xrange(4):
+            if self.call_before_step_each_stage and self.before_step is not None:
+                self.timings.start('before_step')
+                self.before_step(self,s1)
+                self.timings.stop()
+            deltaq=self.dq(s1)
+            deltaq*=1./6.
+            s1.q+=deltaq
+            s1.t =s1.t + self.dt/6.
+
+        if self.call_before_step_each_stage and self.before_step is not None:
+            self.timings.start('before_step')
+            self.before_step(self,s1)
+            self.timings.stop()
+        deltaq = self.dq(s1)
+        # state.q = state.q + 0.6 * s1.q + 0.1 * deltaq
+        deltaq*=0.1
+        s1.q*=0.6
+        state.q+=s1.q
+        state.q+=deltaq
+
+    def get_time_integrator(self):
+        r"""
+        Return the Runge-Kutta method object selected by self.time_integrator.
+        """
+        from .rk import time_integrators
+        if isinstance(self.time_integrator,basestring):
+            try:
+                return time_integrators[self.time_integrator]
+            except KeyError:
+                raise Exception('Unrecognized time integrator')
+        return self.time_integrator
 
 
     def set_mthlim(self):
@@ -262,12 +364,22 @@ class SharpClawSolver(Solver):
             raise Exception('Length of solver.limiters is not equal to 1 or to solver.num_waves')
  
        
-    def dq(self,state):
+    def dq(self,state,out=None):
         """
-        Evaluate dq/dt * (delta t)
+        Evaluate dq/dt * (delta t) into *out*, an array of the shape of
+        state.q, and return it.
+
+        By default *out* is an array allocated once by :meth:`setup` and
+        overwritten by each call, which the caller may use as scratch space
+        until the next call (the Runge-Kutta updates in :meth:`step` do).
         """
+        if out is None: out = self._dq
 
-        deltaq = self.dq_hyperbolic(state)
+        self.timings.start('hyperbolic')
+        deltaq = self.dq_hyperbolic(state,out)
+        self.timings.stop()
+        if self._stage_index is not None:
+            self._stage_index += 1
 
         # Check here if we violated the CFL condition, if we did, return 
         # immediately to evolve_to_time and let it deal with picking a new
@@ -276,11 +388,13 @@ class SharpClawSolver(Solver):
             raise CFLError('cfl_max exceeded')
 
         if self.dq_src is not None:
+            self.timings.start('source')
             deltaq+=self.dq_src(self,state,self.dt)
+            self.timings.stop()
 
         return deltaq
 
-    def dq_hyperbolic(self,state):
+    def dq_hyperbolic(self,state,out=None):
         raise NotImplementedError('You must subclass SharpClawSolver.')
 
          
@@ -333,14 +447,26 @@ class SharpClawSolver(Solver):
         This routine is only used by method-of-lines solvers (SharpClaw),
         not by the Classic solvers.  It allocates additional State objects
         to store the intermediate stages used by Runge--Kutta time integrators.
+        :meth:`step` updates these registers in place, so together with
+        state.q, the scratch array used by the methods of
+        :mod:`~clawpack.pyclaw.sharpclaw.rk` and the arrays of dq allocated
+        by :meth:`setup` they are the only full-size arrays used by a time
+        step.
 
         If we create a MethodOfLinesSolver subclass, this should be moved there.
         """
-        if self.time_integrator   == 'Euler':  nregisters=1
-        elif self.time_integrator == 'SSP33':  nregisters=2
-        elif self.time_integrator == 'SSP104': nregisters=3
+        import numpy as np
+        if self.time_integrator == 'SSP104':
+            nregisters=2
+        else:
+            method = self.get_time_integrator()
+            nregisters = method.num_registers(self.error_tolerance is not None)+1
  
         state = solution.states[0]
+        if self.time_integrator == 'SSP104':
+            self._rk_scratch = None
+        else:
+            self._rk_scratch = np.empty(state.q.shape,order='F')
         # use the same class constructor as the solution for the Runge Kutta stages
         State = type(state)
         self._rk_stages = []
@@ -385,9 +511,10 @@ class SharpClawSolver1D(SharpClawSolver):
             del self.fmod
 
 
-    def dq_hyperbolic(self,state):
+    def dq_hyperbolic(self,state,out=None):
         r"""
-        Compute dq/dt * (delta t) for the hyperbolic hyperbolic system.
+        Compute dq/dt * (delta t) for the hyperbolic hyperbolic system into
+        *out* (by default the array returned by :meth:`dq`) and return it.
 
         Note that the capa array, if present, should be located in the aux
         variable.
@@ -419,7 +546,7 @@ class SharpClawSolver1D(SharpClawSolver):
 
         self.apply_q_bcs(state)
         if state.num_aux > 0:
-            self.apply_aux_bcs(state)
+            self.update_aux_bcs(state)
         q = self.qbc 
 
         grid = state.grid
@@ -427,51 +554,24 @@ class SharpClawSolver1D(SharpClawSolver):
 
         ixy=1
 
+        dq = self._dq_work
         if self.kernel_language=='Fortran':
             rp1 = self.rp.rp1._cpointer
-            dq,cfl=self.fmod.flux1(q,self.auxbc,self.dt,state.t,ixy,mx,self.num_ghost,mx,rp1)
+            dq.fill(0.)
+            dq,cfl=self.fmod.flux1(q,self.auxbc,self.dt,state.t,ixy,mx,self.num_ghost,mx,rp1,
+                                   dq1d=dq)
 
         elif self.kernel_language=='Python':
 
-            dtdx = np.zeros( (mx+2*self.num_ghost) ,order='F')
-            dq   = np.zeros( (state.num_eqn,mx+2*self.num_ghost) ,order='F')
-
             # Find local value for dt/dx
+            dtdx = self._dtdx
             if state.index_capa>=0:
-                dtdx = self.dt / (grid.delta[0] * state.aux[state.index_capa,:])
+                np.multiply(self.auxbc[state.index_capa,:],grid.delta[0],out=dtdx)
+                np.divide(self.dt,dtdx,out=dtdx)
             else:
-                dtdx += self.dt/grid.delta[0]
- 
-            aux=self.auxbc
-            if aux.shape[0]>0:
-                aux_l=aux[:,:-1]
-                aux_r=aux[:,1: ]
-            else:
-                aux_l = None
-                aux_r = None
-
-            #Reconstruct (wave reconstruction uses a Riemann solve)
-            if self.lim_type==-1: #1st-order Godunov
-                ql=q; qr=q
-            elif self.lim_type==0: #Unlimited reconstruction
-                raise NotImplementedError('Unlimited reconstruction not implemented')
-            elif self.lim_type==1: #TVD Reconstruction
-                raise NotImplementedError('TVD reconstruction not implemented')
-            elif self.lim_type==2: #WENO Reconstruction
-                if self.char_decomp==0: #No characteristic decomposition
-                    ql,qr=recon.weno(5,q)
-                elif self.char_decomp==1: #Wave-based reconstruction
-                    q_l=q[:,:-1]
-                    q_r=q[:,1: ]
-                    wave,s,amdq,apdq = self.rp(q_l,q_r,aux_l,aux_r,state.problem_data)
-                    ql,qr=recon.weno5_wave(q,wave,s)
-                elif self.char_decomp==2: #Characteristic-wise reconstruction
-                    raise NotImplementedError
+                dtdx.fill(self.dt/grid.delta[0])
 
-            # Solve Riemann problem at each interface
-            q_l=qr[:,:-1]
-            q_r=ql[:,1: ]
-            wave,s,amdq,apdq = self.rp(q_l,q_r,aux_l,aux_r,state.problem_data)
+            s = self.python_dq1(state,q,self.auxbc,dtdx,dq)
 
             # Loop limits for local portion of grid
             # THIS WON'T WORK IN PARALLEL!
@@ -485,20 +585,199 @@ class SharpClawSolver1D(SharpClawSolver):
                 smax2 = np.max(-dtdx[LL-1:UL-1]*s[mw,LL-1:UL-1])
                 cfl = max(cfl,smax1,smax2)
 
-            #Find total fluctuation within each cell
-            wave,s,amdq2,apdq2 = self.rp(ql,qr,aux,aux,state.problem_data)
-
-            # Compute dq
-            for m in xrange(state.num_eqn):
-                dq[m,LL:UL] = -dtdx[LL:UL]*(amdq[m,LL:UL] + apdq[m,LL-1:UL-1] \
-                                + apdq2[m,LL:UL] + amdq2[m,LL:UL])
-
         else: 
             raise Exception('Unrecognized value of solver.kernel_language.')
 
+        self.timings.start('cfl')
         self.cfl.update_global_max(cfl)
-        return dq[:,self.num_ghost:-self.num_ghost]
-    
+        self.timings.stop()
+        if out is None: out = self._dq
+        out[...] = dq[:,self.num_ghost:-self.num_ghost]
+        return out
+
+    def python_dq1(self,state,q,aux,dtdx,dq):
+        r"""
+        Compute dq/dt * (delta t) with the Python kernel on the array q,
+        which includes the ghost cells, into dq, of the shape of q (only
+        the cells of q and one ghost cell on each side are set).  Return
+        the wave speeds s at the interfaces between the cells of q.
+
+        :Input:
+         - *state* - (:class:`~pyclaw.state.State`) State whose time and
+           problem_data are passed on to the Riemann solves
+         - *q* - (ndarray(num_eqn,n)) Solution with ghost cells
+         - *aux* - (ndarray(num_aux,n)) Auxiliary fields with ghost cells
+         - *dtdx* - (ndarray(n)) :math:`\Delta t / \Delta x` at each cell
+         - *dq* - (ndarray(num_eqn,n)) Output
+        """
+        import numpy as np
+
+        if aux.shape[0]>0:
+            aux_l=aux[:,:-1]
+            aux_r=aux[:,1: ]
+        else:
+            aux_l = None
+            aux_r = None
+
+        #Reconstruct (wave reconstruction uses a Riemann solve)
+        if self.lim_type==-1: #1st-order Godunov
+            ql=q; qr=q
+        elif self.lim_type==0: #Unlimited reconstruction
+            raise NotImplementedError('Unlimited reconstruction not implemented')
+        elif self.lim_type==1: #TVD Reconstruction
+            raise NotImplementedError('TVD reconstruction not implemented')
+        elif self.lim_type==2: #WENO Reconstruction
+            if self.char_decomp==0: #No characteristic decomposition
+                ql,qr=self._reconstructor(q)
+            elif self.char_decomp==1: #Wave-based reconstruction
+                wave,s = self.reconstruction_waves(state,q,aux)
+                ql,qr=recon.weno5_wave(q,wave,s)
+            elif self.char_decomp==2: #Characteristic-wise reconstruction
+                raise NotImplementedError
+
+        if self.fuse_riemann_solves:
+            # Solve the Riemann problems at each interface and within
+            # each cell at once
+            s,amdq,apdq,amdq2,apdq2 = self.fused_riemann_solve(state,ql,qr,aux)
+        else:
+            # Solve Riemann problem at each interface
+            q_l=qr[:,:-1]
+            q_r=ql[:,1: ]
+            wave,s,amdq,apdq = self.rp(q_l,q_r,aux_l,aux_r,state.problem_data)
+
+        # Loop limits, which include the Riemann problems just outside the
+        # grid
+        LL = self.num_ghost - 1
+        UL = q.shape[1] - self.num_ghost + 1
+
+        #Find total fluctuation within each cell
+        if not self.fuse_riemann_solves:
+            wave,s2,amdq2,apdq2 = self.rp(ql,qr,aux,aux,state.problem_data)
+
+        # Compute dq
+        for m in xrange(q.shape[0]):
+            dq[m,LL:UL] = -dtdx[LL:UL]*(amdq[m,LL:UL] + apdq[m,LL-1:UL-1] \
+                            + apdq2[m,LL:UL] + amdq2[m,LL:UL])
+
+        return s
+
+    def reconstruction_waves(self,state,q,aux):
+        r"""
+        Return the waves and speeds (wave,s) of the Riemann problems between
+        the cells of q (with ghost cells), used by the wave-based WENO
+        reconstruction.
+
+        The waves of the first stage of a step are kept, and returned again
+        without solving the Riemann problems when the step is retaken after
+        being rejected (the first stage is then evaluated on the same
+        solution) and aux has not changed, as recorded by
+        state._aux_version.  The problem_data is assumed not to change
+        between the attempts at a step.
+        """
+        key = (self._step_index,state._aux_version)
+        first_stage = self._stage_index == 0
+        if first_stage and self._wave_cache is not None \
+                and self._wave_cache[0] == key:
+            return self._wave_cache[1:]
+
+        if aux.shape[0]>0:
+            aux_l=aux[:,:-1]
+            aux_r=aux[:,1: ]
+        else:
+            aux_l = None
+            aux_r = None
+        wave,s,amdq,apdq = self.rp(q[:,:-1],q[:,1:],aux_l,aux_r,state.problem_data)
+
+        if first_stage:
+            self._wave_cache = (key,wave,s)
+        return wave,s
+
+    def fused_riemann_solve(self,state,ql,qr,aux):
+        r"""
+        Solve the Riemann problems between the reconstructed states at the
+        interfaces (qr of cell i-1 and ql of cell i) and within the cells
+        (ql and qr of cell i) with one call to the Riemann solver.
+
+        The states are interleaved, in the order in which they appear along
+        the grid (ql and qr of cell 0, ql and qr of cell 1, ...), in an
+        array allocated once, so that the problems between consecutive
+        entries are alternately those within cell i and at its right
+        interface.
+
+        :Output:
+         - (s,amdq,apdq,amdq2,apdq2) - Speeds and fluctuations at the
+           interfaces, and fluctuations within the cells
+        """
+        import numpy as np
+
+        num_eqn,n = ql.shape
+        num_aux = aux.shape[0]
+        buffers = self._riemann_states
+        if buffers is None or buffers[0].shape != (num_eqn,2*n) \
+                or buffers[1].shape[0] != num_aux:
+            buffers = (np.empty((num_eqn,2*n)),np.empty((num_aux,2*n)))
+            self._riemann_states = buffers
+        q_edges,aux_edges = buffers
+
+        q_edges[:,0::2] = ql
+        q_edges[:,1::2] = qr
+        if num_aux>0:
+            aux_edges[:,0::2] = aux
+            aux_edges[:,1::2] = aux
+            aux_l = aux_edges[:,:-1]
+            aux_r = aux_edges[:,1:]
+        else:
+            aux_l = None
+            aux_r = None
+
+        wave,s,amdq,apdq = self.rp(q_edges[:,:-1],q_edges[:,1:],aux_l,aux_r,
+                                   state.problem_data)
+        return (s[:,1::2],amdq[:,1::2],apdq[:,1::2],
+                amdq[:,0::2],apdq[:,0::2])
+
+
+# ========================================================================
+class BatchedSharpClawSolver1D(BatchedSolver,SharpClawSolver1D):
+# ========================================================================
+    """
+    SharpClaw solver advancing a batch of independent 1D problems at once.
+
+    The problems, held by a :class:`~pyclaw.state.BatchedState`, share the
+    grid and the solver settings, and differ in their initial data, aux
+    arrays and problem_data.  Each evaluation of dq with the Python kernel
+    of :class:`SharpClawSolver1D` reconstructs and solves the Riemann
+    problems of the whole batch at once.  See
+    :class:`~pyclaw.solver.BatchedSolver` for the choice of step sizes.
+    """
+    def allocate_rk_stages(self,solution):
+        r"""
+        Instantiate the Runge--Kutta stages, with a q for each member.
+        """
+        super(BatchedSharpClawSolver1D,self).allocate_rk_stages(solution)
+        state = solution.states[0]
+        for stage in self._rk_stages:
+            stage.batch_size = state.batch_size
+            stage.q = stage.new_array(state.num_eqn)
+
+    def dq_hyperbolic(self,state,out=None):
+        r"""
+        Compute dq/dt * (delta t) for the hyperbolic system, for all the
+        members of the batch, into *out* and return it.
+        """
+        self.apply_q_bcs(state)
+        if state.num_aux > 0:
+            self.update_aux_bcs(state)
+
+        dtdx = self.batch_dtdx(state,self._dtdx)
+        dq = self._dq_work
+        s = self.python_dq1(state,self.batch_view(self.qbc),
+                            self.batch_view(self.auxbc),dtdx,self.batch_view(dq))
+        self.update_batch_cfl(s,dtdx)
+
+        if out is None: out = self._dq
+        out[...] = dq[:,self.num_ghost:-self.num_ghost]
+        return out
+
 
 # ========================================================================
 class SharpClawSolver2D(SharpClawSolver):
@@ -531,8 +810,10 @@ class SharpClawSolver2D(SharpClawSolver):
             del self.fmod
 
 
-    def dq_hyperbolic(self,state):
+    def dq_hyperbolic(self,state,out=None):
         """Compute dq/dt * (delta t) for the hyperbolic hyperbolic system
+        into *out* (by default the array returned by :meth:`dq`) and return
+        it.
 
         Note that the capa array, if present, should be located in the aux
         variable.
@@ -561,7 +842,7 @@ class SharpClawSolver2D(SharpClawSolver):
         """
         self.apply_q_bcs(state)
         if state.num_aux > 0:    
-            self.apply_aux_bcs(state)
+            self.update_aux_bcs(state)
         q = self.qbc 
 
         grid = state.grid
@@ -573,9 +854,16 @@ class SharpClawSolver2D(SharpClawSolver):
 
         if self.kernel_language=='Fortran':
             rpn2 = self.rp.rpn2._cpointer
-            dq,cfl=self.fmod.flux2(q,self.auxbc,self.dt,state.t,num_ghost,maxm,mx,my,rpn2)
+            dq = self._dq_work
+            dq.fill(0.)
+            dq,cfl=self.fmod.flux2(q,self.auxbc,self.dt,state.t,num_ghost,maxm,mx,my,rpn2,
+                                   dq=dq)
 
         else: raise Exception('Only Fortran kernels are supported in 2D.')
 
+        self.timings.start('cfl')
         self.cfl.update_global_max(cfl)
-        return dq[:,num_ghost:-num_ghost,num_ghost:-num_ghost]
+        self.timings.stop()
+        if out is None: out = self._dq
+        out[...] = dq[:,num_ghost:-num_ghost,num_ghost:-num_ghost]
+        return out
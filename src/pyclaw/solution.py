@@ -334,11 +334,9 @@ class Solution(object):
             format_list = [file_format]
         elif isinstance(file_format,list):
             format_list = file_format
-        if 'petsc' in format_list:
-            from clawpack.petclaw import io
         # Loop over list of formats requested
         for form in format_list:
-            write_func = eval('io.write_%s' % form)
+            write_func = self._get_io_function('write',form)
             if file_prefix is None:
                 write_func(self,frame,path,write_aux=write_aux,
                             options=options,write_p=write_p)
@@ -381,10 +379,8 @@ class Solution(object):
          - (bool) - True if read was successful, False otherwise
         """
         
-        if file_format=='petsc':
-            from clawpack.petclaw import io
         path = os.path.expandvars(os.path.expanduser(path))
-        read_func = eval('io.read_%s' % file_format)
+        read_func = self._get_io_function('read',file_format)
         if file_prefix is None:
             read_func(self,frame,path,read_aux=read_aux,options=options)
         else:
@@ -393,6 +389,19 @@ class Solution(object):
         logging.getLogger('io').info("Read in solution for time t=%s" % self.t)
         
         
+    def _get_io_function(self,kind,file_format):
+        r"""
+        Return the function read_<file_format> or write_<file_format>, as
+        given by kind.  The parallel formats of PetClaw (such as petsc, or
+        hdf5 for a PetClaw solution) are taken from the petclaw io package.
+        """
+        name = '%s_%s' % (kind,file_format)
+        if file_format == 'petsc' or self.claw_package.__name__ == 'clawpack.petclaw':
+            from clawpack.petclaw import io as petclaw_io
+            if hasattr(petclaw_io,name):
+                return getattr(petclaw_io,name)
+        return getattr(io,name)
+
     def plot(self):
         r"""
         Plot the solution
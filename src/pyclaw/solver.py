@@ -23,6 +23,53 @@ def default_compute_gauge_values(q,aux):
     """
     return q
 
+#################### Boundary conditions ######################
+def ghost_fill_indices(bc_type,upper,axis,num_ghost,normal=None):
+    r"""
+    Return the index tuples that fill one side of the ghost cells along
+    *axis* of an array for the boundary condition *bc_type*.
+
+    The result is a list of ``(dest,src,negate)`` tuples: ``dest`` and
+    ``src`` index the ghost cells and the interior cells they are copied
+    from (all ghost layers at once), and ``negate`` is either None or the
+    index of the ghost cells of component *normal* whose sign is flipped
+    after the copy (the normal velocity at a wall).  Each slab spans the
+    full extent of all other axes, including their ghost cells.
+    """
+    ng = num_ghost
+    if bc_type == BC.extrap:
+        if upper: dest, src = slice(-ng,None), slice(-ng-1,-ng)
+        else:     dest, src = slice(0,ng), slice(ng,ng+1)
+    elif bc_type == BC.periodic:
+        # This process owns the whole patch
+        if upper: dest, src = slice(-ng,None), slice(ng,2*ng)
+        else:     dest, src = slice(0,ng), slice(-2*ng,-ng)
+    elif bc_type == BC.wall:
+        # Ghost cells are the mirror image of the adjacent interior cells
+        if upper: dest, src = slice(-1,-ng-1,-1), slice(-2*ng,-ng)
+        else:     dest, src = slice(ng-1,None,-1), slice(ng,2*ng)
+    elif bc_type is None:
+        raise Exception("One or more of the boundary conditions has not been specified.")
+    else:
+        raise NotImplementedError("Boundary condition %s not implemented" % bc_type)
+
+    lead = (slice(None),)*axis
+    negate = None
+    if bc_type == BC.wall and normal is not None:
+        negate = (normal,) + (slice(None),)*(axis-1) + (dest,Ellipsis)
+    return [(lead+(dest,Ellipsis), lead+(src,Ellipsis), negate)]
+
+def _bc_not_specified(aux,upper):
+    name = ('aux_bc_' if aux else 'bc_') + ('upper' if upper else 'lower')
+    raise Exception("One or more of the %sboundary conditions %s has not been specified."
+                    % ('aux ' if aux else '',name))
+
+def _fill_ghost_cells(qbc,fill):
+    for dest,src,negate in fill:
+        qbc[dest] = qbc[src]
+        if negate is not None:
+            qbc[negate] *= -1
+
 class Solver(object):
     r"""
     Pyclaw solver superclass.
@@ -65,12 +112,36 @@ class Solver(object):
 
         solver.status is reset each time solver.evolve_to_time is called, and
         it is also returned by solver.evolve_to_time.
+
+    .. attribute:: timings
+
+        (:class:`~pyclaw.profiling.Timings`) Wall-clock times and call counts
+        of the phases of the time steps (boundary conditions, kernel, source
+        terms, CFL reduction, gauges, ...), accumulated over the calls of
+        evolve_to_time.
     
     .. attribute:: dt_variable
     
         Whether to allow the time step to vary, ``default = True``.
         If false, the initial time step size is used for all steps.
         
+    .. attribute:: error_tolerance
+
+        Tolerance on the local error estimate (maximum norm) provided by
+        time integrators with an embedded method, ``default = None``.
+        If set and dt_variable is True, steps whose error estimate exceeds
+        the tolerance are rejected, and dt is the smaller of the step sizes
+        chosen from the CFL number and from the error estimate.
+        Solvers that cannot estimate the error ignore it.
+
+    .. attribute:: after_step
+
+        Function called by evolve_to_time after each accepted time step,
+        once the next time step size has been chosen, ``default = None``.
+        The required signature for this function is:
+
+        def after_step(solver,solution)
+
     .. attribute:: max_steps
     
         The maximum number of time steps allowd to reach the end time 
@@ -151,12 +222,22 @@ class Solver(object):
         self.dt_max = 1e99
         self.max_steps = 10000
         self.dt_variable = True
+        self.error_tolerance = None
+        self.after_step = None
         self.num_waves = None #Must be set later to agree with Riemann solver
         self.qbc = None
         self.auxbc = None
         self.rp = None
         self.fmod = None
         self._is_set_up = False
+        self._q_bc_plan = None
+        self._aux_bc_plan = None
+        # What the ghost cells of auxbc were last filled for (see
+        # update_aux_bcs)
+        self._aux_bc_key = None
+        # Whether the next step retakes a rejected step from the same
+        # solution (set by evolve_to_time)
+        self._retake_step = False
 
         # select package to build solver objects from, by default this will be
         # the package that contains the module implementing the derived class
@@ -177,12 +258,19 @@ class Solver(object):
         # Initialize time stepper values
         self.dt = self.dt_initial
         self.cfl = self.claw_package.CFL(self.cfl_desired)
+        # Local error estimate of the last step and the order used to pick
+        # the next step size; set by step() when available
+        self._local_error = None
+        self._error_order = None
+        self._error_max = self.claw_package.CFL(0.)
        
         # Status Dictionary
         self.status = {'cflmax':self.cfl.get_cached_max(),
                        'dtmin':self.dt, 
                        'dtmax':self.dt,
                        'numsteps':0 }
+        from .profiling import Timings
+        self.timings = Timings()
         
         # No default BCs; user must set them
         self.bc_lower =    [None]*self.num_dim
@@ -197,7 +285,18 @@ class Solver(object):
         self.user_aux_bc_upper = None
 
         self.compute_gauge_values = default_compute_gauge_values
-        r"""(function) - Function that computes quantities to be recorded at gauges"""
+        r"""(function) - Function that computes quantities to be recorded at
+        gauges.  It is called with the q and aux values at a gauge, or, if
+        gauge_values_vectorized is set, once with arrays holding in column i
+        the values at gauge i"""
+        self.gauge_values_vectorized = False
+        r"""(bool) - Whether compute_gauge_values computes the values at all
+        gauges at once, from the arrays of the values at the gauges
+        (the default compute_gauge_values always does), ``default = False``"""
+        self.gauge_flush_interval = 100
+        r"""(int) - Number of time steps between writes of the recorded gauge
+        values to the gauge files, ``default = 100``"""
+        self._gauge_recorder = None
 
         self.qbc          = None
         r""" Array to hold ghost cell values.  This is the one that gets passed
@@ -282,6 +381,7 @@ class Solver(object):
         r"""
         Create numpy arrays for q and aux with ghost cells attached.
         These arrays are referred to throughout the code as qbc and auxbc.
+        Also precomputes the boundary condition fills for q and aux.
 
         This is typically called by solver.setup().
         """
@@ -289,6 +389,8 @@ class Solver(object):
         qbc_dim = [n+2*self.num_ghost for n in state.grid.num_cells]
         qbc_dim.insert(0,state.num_eqn)
         self.qbc = np.zeros(qbc_dim,order='F')
+        self._q_bc_plan = self.build_bc_plan(state,self.bc_lower,self.bc_upper)
+        self._aux_bc_plan = None
 
         auxbc_dim = [n+2*self.num_ghost for n in state.grid.num_cells]
         auxbc_dim.insert(0,state.num_aux)
@@ -312,6 +414,12 @@ class Solver(object):
         - 'periodic'   or 2: Periodic boundary conditions.
         - 'wall' or 3: Wall boundary conditions. It is assumed that the second 
             component of q represents velocity or momentum.
+
+        The index slices for every boundary are computed once (see
+        :meth:`build_bc_plan`) and each boundary is then filled with a
+        single array copy.  Dimensions are filled in order and each ghost
+        slab spans the ghost cells of the preceding dimensions, so corner
+        ghost cells in 2D and 3D are set as well.
     
         :Input:
          -  *grid* - (:class:`Patch`) The grid being operated on.
@@ -330,39 +438,119 @@ class Solver(object):
             the boundary condition has not been rolled. 
         """
         
-        import numpy as np
-        
+        self.timings.start('q_bcs')
         self.qbc = state.get_qbc_from_q(self.num_ghost,self.qbc)
+        if self._overrides('qbc_lower','qbc_upper'):
+            self._apply_bc_hooks(state,self.qbc,self.bc_lower,self.bc_upper,
+                                 self.qbc_lower,self.qbc_upper)
+            self.timings.stop()
+            return
+        plan = self._q_bc_plan
+        if plan is None or plan[0] != self._bc_plan_key(state,self.bc_lower,self.bc_upper):
+            plan = self._q_bc_plan = self.build_bc_plan(state,self.bc_lower,
+                                                        self.bc_upper)
+        grid = state.grid
+        for idim,upper,fill in plan[1]:
+            if fill is None:
+                dim = grid.dimensions[idim]
+                if upper:
+                    self.user_bc_upper(state,dim,state.t,self.qbc,self.num_ghost)
+                else:
+                    self.user_bc_lower(state,dim,state.t,self.qbc,self.num_ghost)
+            else:
+                _fill_ghost_cells(self.qbc,fill)
+        self.timings.stop()
+
+
+    def start_q_bcs(self,state):
+        r"""
+        Start the exchange of the ghost cell values of q between processes
+        (in PetClaw), so that work needing only the values of q owned by
+        this process can be done while they arrive.  :meth:`apply_q_bcs`
+        completes the exchange and fills solver.qbc.
+        """
+        self.timings.start('q_bcs')
+        state.start_ghost_exchange()
+        self.timings.stop()
+
+    def build_bc_plan(self,state,bc_lower,bc_upper,aux=False):
+        r"""
+        Precompute the ghost cell fills for the given boundary conditions.
+
+        Returns a tuple ``(key,fills)``; *key* identifies the settings the
+        plan was built for and *fills* is a list of ``(idim,upper,fill)``
+        in the order the boundaries must be applied.  *fill* is None for
+        custom boundary conditions, otherwise it is a list of index tuples
+        as returned by :func:`ghost_fill_indices`.  Boundaries that are
+        not on this process' part of the domain, or that are periodic but
+        handled by PETSc, are omitted.  The normal velocity is negated at
+        walls unless *aux* is True.
+
+        This is called by :meth:`apply_q_bcs` and :meth:`apply_aux_bcs`
+        whenever the boundary conditions or the array shapes change, so it
+        normally runs only once per run.
+        """
+        grid = state.grid
+        fills = []
+        for idim in xrange(grid.num_dim):
+            normal = None if aux else idim+1
+            for upper,bcs,on_boundary,on_opposite in \
+                    ((False,bc_lower,grid.on_lower_boundaries,grid.on_upper_boundaries),
+                     (True, bc_upper,grid.on_upper_boundaries,grid.on_lower_boundaries)):
+                # First check if we are actually on the boundary
+                # (in case of a parallel run)
+                if not on_boundary[idim]:
+                    continue
+                bc_type = bcs[idim]
+                if bc_type is None:
+                    _bc_not_specified(aux,upper)
+                if bc_type == BC.custom:
+                    fills.append((idim,upper,None))
+                elif bc_type == BC.periodic and not on_opposite[idim]:
+                    pass #Handled automatically by PETSc
+                else:
+                    fill = ghost_fill_indices(bc_type,upper,idim+1,
+                                              self.num_ghost,normal)
+                    fills.append((idim,upper,fill))
+        return self._bc_plan_key(state,bc_lower,bc_upper), fills
+
+    def _bc_plan_key(self,state,bc_lower,bc_upper):
+        return (tuple(bc_lower),tuple(bc_upper),self.num_ghost,state.grid.num_dim)
+
+    def _overrides(self,*names):
+        r"""
+        Return whether any of the Solver methods *names* is overridden, by
+        a subclass or on this solver.
+        """
+        return any(getattr(getattr(self,name),'im_func',None) is not
+                   getattr(Solver,name).im_func for name in names)
+
+    def _apply_bc_hooks(self,state,array,bc_lower,bc_upper,lower,upper):
+        r"""
+        Fill the ghost cells of *array* by calling the methods *lower* and
+        *upper* (:meth:`qbc_lower` and :meth:`qbc_upper`, or
+        :meth:`auxbc_lower` and :meth:`auxbc_upper`) for each boundary, as
+        the boundary conditions were applied before the fills were
+        precomputed.  This is used when a subclass overrides these methods.
+        """
+        import numpy as np
         grid = state.grid
-       
         for idim,dim in enumerate(grid.dimensions):
-            # First check if we are actually on the boundary
-            # (in case of a parallel run)
-            if state.grid.on_lower_boundaries[idim]:
+            for apply_bc,bcs,on_boundary,on_opposite in \
+                    ((lower,bc_lower,grid.on_lower_boundaries,grid.on_upper_boundaries),
+                     (upper,bc_upper,grid.on_upper_boundaries,grid.on_lower_boundaries)):
+                # First check if we are actually on the boundary
+                # (in case of a parallel run)
+                if not on_boundary[idim]:
+                    continue
                 # If a user defined boundary condition is being used, send it on,
                 # otherwise roll the axis to front position and operate on it
-                if self.bc_lower[idim] == BC.custom:
-                    self.qbc_lower(state,dim,state.t,self.qbc,idim)
-                elif self.bc_lower[idim] == BC.periodic:
-                    if state.grid.on_upper_boundaries[idim]:
-                        # This process owns the whole domain
-                        self.qbc_lower(state,dim,state.t,np.rollaxis(self.qbc,idim+1,1),idim)
-                    else:
-                        pass #Handled automatically by PETSc
+                if bcs[idim] == BC.custom:
+                    apply_bc(state,dim,state.t,array,idim)
+                elif bcs[idim] == BC.periodic and not on_opposite[idim]:
+                    pass #Handled automatically by PETSc
                 else:
-                    self.qbc_lower(state,dim,state.t,np.rollaxis(self.qbc,idim+1,1),idim)
-
-            if state.grid.on_upper_boundaries[idim]:
-                if self.bc_upper[idim] == BC.custom:
-                    self.qbc_upper(state,dim,state.t,self.qbc,idim)
-                elif self.bc_upper[idim] == BC.periodic:
-                    if state.grid.on_lower_boundaries[idim]: 
-                        # This process owns the whole domain
-                        self.qbc_upper(state,dim,state.t,np.rollaxis(self.qbc,idim+1,1),idim)
-                    else:
-                        pass #Handled automatically by PETSc
-                else:
-                    self.qbc_upper(state,dim,state.t,np.rollaxis(self.qbc,idim+1,1),idim)
+                    apply_bc(state,dim,state.t,np.rollaxis(array,idim+1,1),idim)
 
 
     def qbc_lower(self,state,dim,t,qbc,idim):
@@ -375,6 +563,10 @@ class Solver(object):
         that in this case the function :attr:`user_bc_lower` belongs only to 
         this dimension but :attr:`user_bc_lower` could set all user boundary 
         conditions at once with the appropriate calling sequence.
+
+        :meth:`apply_q_bcs` does not call this routine; it is kept for
+        filling a single boundary of an array rolled so that dimension
+        *idim* is the second axis.
         
         :Input:
          - *patch* - (:class:`Patch`) Patch that the dimension belongs to
@@ -385,18 +577,11 @@ class Solver(object):
         """
         if self.bc_lower[idim] == BC.custom: 
             self.user_bc_lower(state,dim,t,qbc,self.num_ghost)
-        elif self.bc_lower[idim] == BC.extrap:
-            for i in xrange(self.num_ghost):
-                qbc[:,i,...] = qbc[:,self.num_ghost,...]
-        elif self.bc_lower[idim] == BC.periodic:
-            # This process owns the whole patch
-            qbc[:,:self.num_ghost,...] = qbc[:,-2*self.num_ghost:-self.num_ghost,...]
-        elif self.bc_lower[idim] == BC.wall:
-            for i in xrange(self.num_ghost):
-                qbc[:,i,...] = qbc[:,2*self.num_ghost-1-i,...]
-                qbc[idim+1,i,...] = -qbc[idim+1,2*self.num_ghost-1-i,...] # Negate normal velocity
+        elif self.bc_lower[idim] is None:
+            _bc_not_specified(False,False)
         else:
-            raise NotImplementedError("Boundary condition %s not implemented" % self.bc_lower)
+            _fill_ghost_cells(qbc,ghost_fill_indices(self.bc_lower[idim],False,
+                                                     1,self.num_ghost,idim+1))
 
 
     def qbc_upper(self,state,dim,t,qbc,idim):
@@ -409,6 +594,8 @@ class Solver(object):
         that in this case the function :attr:`user_bc_upper` belongs only to 
         this dimension but :attr:`user_bc_upper` could set all user boundary 
         conditions at once with the appropriate calling sequence.
+
+        See :meth:`qbc_lower`.
         
         :Input:
          - *patch* - (:class:`Patch`) Patch that the dimension belongs to
@@ -420,18 +607,11 @@ class Solver(object):
  
         if self.bc_upper[idim] == BC.custom:
             self.user_bc_upper(state,dim,t,qbc,self.num_ghost)
-        elif self.bc_upper[idim] == BC.extrap:
-            for i in xrange(self.num_ghost):
-                qbc[:,-i-1,...] = qbc[:,-self.num_ghost-1,...] 
-        elif self.bc_upper[idim] == BC.periodic:
-            # This process owns the whole patch
-            qbc[:,-self.num_ghost:,...] = qbc[:,self.num_ghost:2*self.num_ghost,...]
-        elif self.bc_upper[idim] == BC.wall:
-            for i in xrange(self.num_ghost):
-                qbc[:,-i-1,...] = qbc[:,-2*self.num_ghost+i,...]
-                qbc[idim+1,-i-1,...] = -qbc[idim+1,-2*self.num_ghost+i,...] # Negate normal velocity
+        elif self.bc_upper[idim] is None:
+            _bc_not_specified(False,True)
         else:
-            raise NotImplementedError("Boundary condition %s not implemented" % self.bc_lower)
+            _fill_ghost_cells(qbc,ghost_fill_indices(self.bc_upper[idim],True,
+                                                     1,self.num_ghost,idim+1))
 
 
 
@@ -451,6 +631,9 @@ class Solver(object):
         - 'periodic'   or 2: Periodic boundary conditions.
         - 'wall' or 3: Wall boundary conditions. It is assumed that the second 
             component of q represents velocity or momentum.
+
+        As for :meth:`apply_q_bcs`, the fills are precomputed by
+        :meth:`build_bc_plan`.
     
         :Input:
          -  *patch* - (:class:`Patch`) The patch being operated on.
@@ -469,40 +652,62 @@ class Solver(object):
             the boundary condition has not been rolled. 
         """
         
-        import numpy as np
-
+        self.timings.start('aux_bcs')
         self.auxbc = state.get_auxbc_from_aux(self.num_ghost,self.auxbc)
-
-        patch = state.patch
-       
-        for idim,dim in enumerate(patch.dimensions):
-            # First check if we are actually on the boundary
-            # (in case of a parallel run)
-            if state.grid.on_lower_boundaries[idim]:
-                # If a user defined boundary condition is being used, send it on,
-                # otherwise roll the axis to front position and operate on it
-                if self.aux_bc_lower[idim] == BC.custom:
-                    self.auxbc_lower(state,dim,state.t,self.auxbc,idim)
-                elif self.aux_bc_lower[idim] == BC.periodic:
-                    if state.grid.on_upper_boundaries[idim]:
-                        # This process owns the whole patch
-                        self.auxbc_lower(state,dim,state.t,np.rollaxis(self.auxbc,idim+1,1),idim)
-                    else:
-                        pass #Handled automatically by PETSc
-                else:
-                    self.auxbc_lower(state,dim,state.t,np.rollaxis(self.auxbc,idim+1,1),idim)
-
-            if state.grid.on_upper_boundaries[idim]:
-                if self.aux_bc_upper[idim] == BC.custom:
-                    self.auxbc_upper(state,dim,state.t,self.auxbc,idim)
-                elif self.aux_bc_upper[idim] == BC.periodic:
-                    if state.grid.on_lower_boundaries[idim]:
-                        # This process owns the whole patch
-                        self.auxbc_upper(state,dim,state.t,np.rollaxis(self.auxbc,idim+1,1),idim)
+        if self._overrides('auxbc_lower','auxbc_upper'):
+            self._apply_bc_hooks(state,self.auxbc,self.aux_bc_lower,self.aux_bc_upper,
+                                 self.auxbc_lower,self.auxbc_upper)
+        else:
+            plan = self._aux_bc_plan
+            if plan is None or plan[0] != self._bc_plan_key(state,self.aux_bc_lower,self.aux_bc_upper):
+                plan = self._aux_bc_plan = self.build_bc_plan(state,self.aux_bc_lower,
+                                                              self.aux_bc_upper,aux=True)
+            patch = state.patch
+            for idim,upper,fill in plan[1]:
+                if fill is None:
+                    dim = patch.dimensions[idim]
+                    if upper:
+                        self.user_aux_bc_upper(state,dim,state.t,self.auxbc,self.num_ghost)
                     else:
-                        pass #Handled automatically by PETSc
+                        self.user_aux_bc_lower(state,dim,state.t,self.auxbc,self.num_ghost)
                 else:
-                    self.auxbc_upper(state,dim,state.t,np.rollaxis(self.auxbc,idim+1,1),idim)
+                    _fill_ghost_cells(self.auxbc,fill)
+        self._aux_bc_key = self._aux_bcs_key(state)
+        self.timings.stop()
+
+    def update_aux_bcs(self,state):
+        r"""
+        Fill solver.auxbc by :meth:`apply_aux_bcs`, unless it is already
+        filled from the current values of aux, and return whether it was
+        filled.
+
+        The values of aux are considered unchanged since the last fill
+        unless evolve_to_time was called again, aux was set, auxbc or the
+        aux boundary condition types were replaced, or
+        :meth:`~pyclaw.state.State.mark_aux_changed` was called.  auxbc is
+        filled at every call if a before_step function is set, or if the
+        aux boundary conditions are user functions (``BC.custom``, or
+        overridden auxbc_lower or auxbc_upper methods), which are passed
+        the time.  For the many problems whose aux is constant, this avoids
+        copying aux to auxbc and filling its ghost cells (including the
+        ghost cell exchange in PetClaw) at every step.  The kernels only
+        read auxbc, so it is not copied back to aux.
+        """
+        if self.before_step is not None or self._aux_bcs_depend_on_time() \
+                or self._aux_bc_key != self._aux_bcs_key(state):
+            self.apply_aux_bcs(state)
+            return True
+        return False
+
+    def _aux_bcs_depend_on_time(self):
+        return BC.custom in self.aux_bc_lower or BC.custom in self.aux_bc_upper \
+            or self._overrides('auxbc_lower','auxbc_upper')
+
+    def _aux_bcs_key(self,state):
+        # The Runge-Kutta stages of SharpClaw take the version of aux of
+        # the solution state, so the state itself is not part of the key
+        return (state._aux_version,id(self.auxbc),
+                self._bc_plan_key(state,self.aux_bc_lower,self.aux_bc_upper))
 
 
     def auxbc_lower(self,state,dim,t,auxbc,idim):
@@ -515,6 +720,8 @@ class Solver(object):
         that in this case the function :attr:`user_aux_bc_lower` belongs only to 
         this dimension but :attr:`user_aux_bc_lower` could set all user boundary 
         conditions at once with the appropriate calling sequence.
+
+        See :meth:`qbc_lower`.
         
         :Input:
          - *patch* - (:class:`Patch`) Patch that the dimension belongs to
@@ -525,19 +732,11 @@ class Solver(object):
         """
         if self.aux_bc_lower[idim] == BC.custom: 
             self.user_aux_bc_lower(state,dim,t,auxbc,self.num_ghost)
-        elif self.aux_bc_lower[idim] == BC.extrap:
-            for i in xrange(self.num_ghost):
-                auxbc[:,i,...] = auxbc[:,self.num_ghost,...]
-        elif self.aux_bc_lower[idim] == BC.periodic:
-            # This process owns the whole patch
-            auxbc[:,:self.num_ghost,...] = auxbc[:,-2*self.num_ghost:-self.num_ghost,...]
-        elif self.aux_bc_lower[idim] == BC.wall:
-            for i in xrange(self.num_ghost):
-                auxbc[:,i,...] = auxbc[:,2*self.num_ghost-1-i,...]
         elif self.aux_bc_lower[idim] is None:
-            raise Exception("One or more of the aux boundary conditions aux_bc_upper has not been specified.")
+            _bc_not_specified(True,False)
         else:
-            raise NotImplementedError("Boundary condition %s not implemented" % self.aux_bc_lower)
+            _fill_ghost_cells(auxbc,ghost_fill_indices(self.aux_bc_lower[idim],
+                                                       False,1,self.num_ghost))
 
 
     def auxbc_upper(self,state,dim,t,auxbc,idim):
@@ -550,6 +749,8 @@ class Solver(object):
         that in this case the function :attr:`user_aux_bc_upper` belongs only to 
         this dimension but :attr:`user_aux_bc_upper` could set all user boundary 
         conditions at once with the appropriate calling sequence.
+
+        See :meth:`qbc_lower`.
         
         :Input:
          - *patch* - (:class:`Patch`) Patch that the dimension belongs to
@@ -561,19 +762,11 @@ class Solver(object):
  
         if self.aux_bc_upper[idim] == BC.custom:
             self.user_aux_bc_upper(state,dim,t,auxbc,self.num_ghost)
-        elif self.aux_bc_upper[idim] == BC.extrap:
-            for i in xrange(self.num_ghost):
-                auxbc[:,-i-1,...] = auxbc[:,-self.num_ghost-1,...] 
-        elif self.aux_bc_upper[idim] == BC.periodic:
-            # This process owns the whole patch
-            auxbc[:,-self.num_ghost:,...] = auxbc[:,self.num_ghost:2*self.num_ghost,...]
-        elif self.aux_bc_upper[idim] == BC.wall:
-            for i in xrange(self.num_ghost):
-                auxbc[:,-i-1,...] = auxbc[:,-2*self.num_ghost+i,...]
-        elif self.aux_bc_lower[idim] is None:
-            raise Exception("One or more of the aux boundary conditions aux_bc_lower has not been specified.")
+        elif self.aux_bc_upper[idim] is None:
+            _bc_not_specified(True,True)
         else:
-            raise NotImplementedError("Boundary condition %s not implemented" % self.aux_bc_lower)
+            _fill_ghost_cells(auxbc,ghost_fill_indices(self.aux_bc_upper[idim],
+                                                       True,1,self.num_ghost))
 
 
     # ========================================================================
@@ -608,6 +801,10 @@ class Solver(object):
         # Parameters for time-stepping
         tstart = solution.t
 
+        # aux and q may have been changed since the last call
+        self._aux_bc_key = None
+        self._retake_step = False
+
         # Reset status dictionary
         self.status['cflmax'] = self.cfl.get_cached_max()
         self.status['dtmin'] = self.dt
@@ -628,7 +825,12 @@ class Solver(object):
             self.logger.info("Already at or beyond end time: no evolution required.")
             self.max_steps = 0
                 
+        # Number of the steps accepted since the CFL number was last known
+        # (see CFL.finish_step); they are retaken if it was too large
+        unchecked = 0
+
         # Main time-stepping loop
+        self.timings.start('evolve_to_time')
         for n in xrange(self.max_steps):
             
             state = solution.state
@@ -639,19 +841,33 @@ class Solver(object):
                     self.dt = tend - solution.t
                 if tend - solution.t - self.dt < 1.e-14:
                     self.dt = tend - solution.t
+            last_step = take_one_step or n == self.max_steps-1 \
+                        or solution.t + self.dt >= tend
 
-            # Keep a backup in case we need to retake a time step
-            if self.dt_variable:
+            # Keep a backup in case we need to retake a time step, or the
+            # steps taken since the CFL number was last known
+            if self.dt_variable and unchecked == 0:
                 q_backup = state.q.copy('F')
                 told = solution.t
             
+            self.timings.start('step')
             self.step(solution)
+            step_seconds = self.timings.stop()
 
             # Check to make sure that the Courant number was not too large
+            self.timings.start('cfl')
+            checked = self.cfl.finish_step(last_step)
             cfl = self.cfl.get_cached_max()
-            if cfl <= self.cfl_max:
+            self.timings.stop()
+            error_ratio = self.get_error_ratio()
+            if (not checked or cfl <= self.cfl_max) \
+                    and (error_ratio is None or error_ratio <= 1.):
                 # Accept this step
-                self.status['cflmax'] = max(cfl, self.status['cflmax'])
+                if checked:
+                    self.status['cflmax'] = max(cfl, self.status['cflmax'])
+                    unchecked = 0
+                else:
+                    unchecked += 1
                 if self.dt_variable==True:
                     solution.t += self.dt 
                 else:
@@ -664,33 +880,61 @@ class Solver(object):
                 self.write_gauge_values(solution)
                 # Increment number of time steps completed
                 self.status['numsteps'] += 1
+                self.timings.accept_step()
+                accepted = True
+                self._retake_step = False
             else:
-                # Reject this step
-                self.logger.debug("Rejecting time step, CFL number too large")
+                # Reject this step, and the steps accepted since the CFL
+                # number was last known
+                accepted = False
+                self._retake_step = unchecked == 0
+                self.timings.reject_step(step_seconds)
+                if checked and cfl > self.cfl_max:
+                    self.logger.debug("Rejecting time step, CFL number too large")
+                else:
+                    self.logger.debug("Rejecting time step, error estimate too large")
+                if unchecked > 0:
+                    self.logger.debug("Retaking the last %i time steps" % unchecked)
                 if self.dt_variable:
                     state.q = q_backup
                     solution.t = told
+                    self.status['numsteps'] -= unchecked
+                    unchecked = 0
+                    self.cfl.discard_steps()
                 else:
                     # Give up, we cannot adapt, abort
                     self.status['cflmax'] = \
                         max(cfl, self.status['cflmax'])
+                    self.timings.stop()
                     raise Exception('CFL too large, giving up!')
                     
             # Choose new time step
             if self.dt_variable:
-                if cfl > 0.0:
-                    self.dt = min(self.dt_max,self.dt * self.cfl_desired 
-                                    / cfl)
+                dt_max = self.dt_max
+                if error_ratio is not None:
+                    dt_max = min(dt_max,self.dt_from_error(error_ratio))
+                if not checked:
+                    # The CFL number is not known: keep the time step
+                    self.dt = min(dt_max,self.dt)
+                elif cfl > 0.0:
+                    self.dt = min(dt_max,self.dt * self.cfl_desired 
+                                    * self.cfl.step_size_factor() / cfl)
                     self.status['dtmin'] = min(self.dt, self.status['dtmin'])
                     self.status['dtmax'] = max(self.dt, self.status['dtmax'])
                 else:
-                    self.dt = self.dt_max
+                    self.dt = dt_max
+
+            if accepted and self.after_step is not None:
+                self.timings.start('after_step')
+                self.after_step(self,solution)
+                self.timings.stop()
 
             # See if we are finished yet
             if solution.t >= tend or take_one_step:
                 break
       
         # End of main time-stepping loop -------------------------------------
+        self.timings.stop()
 
         if self.dt_variable and solution.t < tend \
                 and self.status['numsteps'] == self.max_steps:
@@ -698,6 +942,33 @@ class Solver(object):
 
         return self.status
 
+    def get_error_ratio(self):
+        r"""
+        Return the ratio of the local error estimate of the last step to
+        error_tolerance, maximized over all processes, or None if no
+        estimate is used.
+        """
+        if self.error_tolerance is None or not self.dt_variable \
+                or self._local_error is None:
+            return None
+        self.timings.start('cfl')
+        self._error_max.update_global_max(self._local_error)
+        self.timings.stop()
+        return self._error_max.get_cached_max() / self.error_tolerance
+
+    def dt_from_error(self,error_ratio,safety=0.9,min_factor=0.2,max_factor=5.):
+        r"""
+        Step size for the next step, given the error ratio of the last one.
+
+        Uses the standard controller dt*safety*error_ratio**(-1/p), where p
+        is one more than the order of the embedded method; the change in dt
+        is limited to the interval [min_factor,max_factor].
+        """
+        if error_ratio == 0.:
+            return self.dt*max_factor
+        factor = safety * error_ratio**(-1./self._error_order)
+        return self.dt*min(max_factor,max(min_factor,factor))
+
     def step(self,solution):
         r"""
         Take one step
@@ -710,37 +981,324 @@ class Solver(object):
     # ========================================================================
     #  Gauges
     # ========================================================================
-    def write_gauge_values(self,solution):
-        r"""Write solution (or derived quantity) values at each gauge coordinate
-            to file.
+    def write_gauge_values(self,solution,record=True):
+        r"""Record solution (or derived quantity) values at each gauge coordinate.
+
+        The values are written to the gauge files every gauge_flush_interval
+        steps and by :meth:`flush_gauge_values` (see
+        :class:`~pyclaw.gauges.GaugeRecorder`).  If record is False the
+        values are only used as the start of the time interpolation when the
+        grid's gauge_time_interval is set.
+
+        If the grid's gauge_interpolation is 'linear', the values are
+        interpolated from qbc and auxbc, whose ghost cells are filled first
+        (on every process, since the ghost cell exchange of PetClaw is
+        collective).
+        """
+        state = solution.state
+        grid = state.grid
+        q = aux = None
+        num_ghost = 0
+        if grid.gauge_interpolation == 'linear':
+            if self.qbc is None:
+                self.allocate_bc_arrays(state)
+            self.apply_q_bcs(state)
+            q = self.qbc
+            if state.num_aux > 0:
+                self.update_aux_bcs(state)
+                aux = self.auxbc
+            num_ghost = self.num_ghost
+        if len(grid.gauges) == 0:
+            return
+        recorder = self._gauge_recorder
+        if recorder is None or recorder.grid is not grid or \
+                recorder.files is not grid.gauge_files or \
+                recorder.num_ghost != num_ghost:
+            from .gauges import GaugeRecorder
+            recorder = GaugeRecorder(grid,self.gauge_flush_interval,num_ghost)
+            self._gauge_recorder = recorder
+        vectorized = self.gauge_values_vectorized or \
+                     self.compute_gauge_values is default_compute_gauge_values
+        self.timings.start('gauges')
+        recorder.record(state,self.compute_gauge_values,record,vectorized,q,aux)
+        self.timings.stop()
+
+    def flush_gauge_values(self):
+        r"""Write the recorded gauge values to the gauge files and flush them."""
+        if self._gauge_recorder is not None:
+            self.timings.start('gauges')
+            self._gauge_recorder.flush()
+            self.timings.stop()
+
+
+# ============================================================================
+#  Batches of 1D problems
+# ============================================================================
+class BatchRiemannSolver(object):
+    r"""
+    Pointwise Riemann solver for the batch of problems of a
+    :class:`~pyclaw.state.BatchedState`, with the members laid end to end
+    along the arrays of Riemann problems.
+
+    The entries of problem_data given for each member are expanded into
+    arrays holding the value of the member at each Riemann problem (the
+    expanded arrays are kept for each number of Riemann problems), and
+    the vectorized Riemann solver rp is called once for the whole batch.
+    """
+    def __init__(self,rp,batch_size):
+        self.rp = rp
+        self.batch_size = batch_size
+        self._expanded = {}
+
+    def __call__(self,q_l,q_r,aux_l,aux_r,problem_data):
+        return self.rp(q_l,q_r,aux_l,aux_r,
+                       self.expand(problem_data,q_l.shape[1]))
+
+    def expand(self,problem_data,num_rp):
+        r"""
+        Return problem_data with the values of each member expanded over
+        num_rp Riemann problems, split evenly between the members.
         """
         import numpy as np
-        for i,gauge in enumerate(solution.state.grid.gauges):
-            if self.num_dim == 1:
-                ix=gauge[0];
-                aux=solution.state.aux[:,ix]
-                q=solution.state.q[:,ix]
-            elif self.num_dim == 2:
-                ix=gauge[0]; iy=gauge[1]
-                aux=solution.state.aux[:,ix,iy]
-                q=solution.state.q[:,ix,iy]
-            p=self.compute_gauge_values(q,aux)
-            t=solution.t
-            if solution.state.keep_gauges:
-                gauge_data = solution.state.gauge_data
-                if len(gauge_data) == len(solution.state.grid.gauges):
-                    gauge_data[i]=np.vstack((gauge_data[i],np.append(t,p)))
-                else:
-                    gauge_data.append(np.append(t,p))
-            
-            try:
-                solution.state.grid.gauge_files[i].write(str(t)+' '+' '.join(str(j) 
-                                                         for j in p)+'\n')  
-            except:
-                raise Exception("Gauge files are not set up correctly. You should call \
-                       \nthe method `setup_gauge_files` of the Grid class object \
-                       \nbefore any call for `write_gauge_values` from the Solver class.")
-                
+        from .state import is_member_value
+
+        block = (num_rp+self.batch_size-1)//self.batch_size
+        expanded = {}
+        for name,value in problem_data.iteritems():
+            if is_member_value(value,self.batch_size):
+                values = tuple(value)
+                cached = self._expanded.get((name,num_rp))
+                if cached is None or cached[0] != values:
+                    cached = (values,np.repeat(np.asarray(value),block)[:num_rp])
+                    self._expanded[(name,num_rp)] = cached
+                value = cached[1]
+            expanded[name] = value
+        return expanded
+
+class BatchedSolver(object):
+    r"""
+    Mixin class of the 1D solvers advancing all the members of a
+    :class:`~pyclaw.state.BatchedState` at once, with the Python kernel and
+    a vectorized Riemann solver (which is wrapped in a
+    :class:`BatchRiemannSolver` by setup).
+
+    The members are laid end to end, each with its own ghost cells, in
+    solver.qbc, of shape (num_eqn, mx+2*num_ghost, batch_size) and in Fortran
+    order, so that the kernel of the 1D solver handles the whole batch at
+    once as a single row of (mx+2*num_ghost)*batch_size cells.  The
+    boundary conditions are applied to all the members at once; custom
+    boundary condition functions get the qbc of the whole batch.  The
+    Riemann problems between the ghost cells of consecutive members only
+    change ghost cells, and are left out of the Courant numbers.
+
+    .. attribute:: dt_policy
+
+        How the step sizes are chosen.  With 'shared', all the members take
+        the same steps, set by the largest Courant number in the batch.
+        With 'member', each member takes steps set by its own Courant
+        number, and the members that reach the end time wait for the
+        others; if any member exceeds cfl_max, the step is taken again by
+        all members.  'member' requires dt_variable, and does not support
+        error_tolerance, source terms or boundary conditions that depend on
+        the time, since solution.t is then only the time of the members
+        that are behind.  ``default = 'shared'``
+
+    .. attribute:: member_dt
+
+        (ndarray(batch_size)) - Size of the next step of each member, with
+        dt_policy 'member'.  Initialized to dt.
+
+    .. attribute:: member_cfl
+
+        (ndarray(batch_size)) - Courant number of each member in the last
+        evaluation of the kernel.
+    """
+    def __init__(self,*args,**kwargs):
+        self.dt_policy = 'shared'
+        self.member_dt = None
+        self.member_cfl = None
+        self._member_steps = None
+        super(BatchedSolver,self).__init__(*args,**kwargs)
+        self.kernel_language = 'Python'
+
+    def setup(self,solution):
+        r"""
+        Check the settings and wrap the Riemann solver, then set up the 1D
+        solver.
+        """
+        state = solution.states[0]
+        if not hasattr(state,'batch_size'):
+            raise Exception('The batched solvers advance a BatchedState.')
+        if self.kernel_language != 'Python':
+            raise NotImplementedError('The batched solvers only have a Python kernel.')
+        if self.dt_policy not in ('shared','member'):
+            raise ValueError, "dt_policy must be 'shared' or 'member'"
+        if self.dt_policy == 'member':
+            if not self.dt_variable or self.error_tolerance is not None:
+                raise ValueError, "dt_policy = 'member' requires dt_variable and no error_tolerance"
+            if getattr(self,'step_source',None) is not None \
+                    or getattr(self,'dq_src',None) is not None:
+                raise ValueError, "dt_policy = 'member' does not support source terms"
+        rp = self.rp
+        if isinstance(rp,BatchRiemannSolver):
+            rp = rp.rp
+        self.rp = BatchRiemannSolver(rp,state.batch_size)
+        super(BatchedSolver,self).setup(solution)
+
+    def allocate_bc_arrays(self,state):
+        r"""
+        Create qbc and auxbc for the whole batch (see :class:`BatchedSolver`),
+        and precompute the boundary condition fills.
+        """
+        import numpy as np
+        num_cells = state.grid.num_cells[0]+2*self.num_ghost
+        self.qbc = np.zeros((state.num_eqn,num_cells,state.batch_size),order='F')
+        self._q_bc_plan = self.build_bc_plan(state,self.bc_lower,self.bc_upper)
+        self._aux_bc_plan = None
+        self.auxbc = np.empty((state.num_aux,num_cells,state.batch_size),order='F')
+        if state.num_aux>0:
+            self.apply_aux_bcs(state)
+
+    def batch_view(self,array):
+        r"""
+        Return the view of qbc or auxbc as a single row of cells, with the
+        members end to end.
+        """
+        return array.reshape((array.shape[0],array.shape[1]*array.shape[2]),order='F')
+
+    def batch_dtdx(self,state,out=None):
+        r"""
+        Return :math:`\Delta t / \Delta x` at each cell of the batch view of
+        qbc, with the step size of each member.  If given, the array *out*
+        (of the size of a row of the batch view) is filled and returned.
+        """
+        import numpy as np
+        num_cells = self.qbc.shape[1]
+        if out is None:
+            out = np.empty(num_cells*state.batch_size)
+        if self._member_steps is not None:
+            out.reshape((num_cells,state.batch_size),order='F')[...] = \
+                self._member_steps/state.grid.delta[0]
+        else:
+            out.fill(self.dt/state.grid.delta[0])
+        if state.index_capa>=0:
+            out /= self.batch_view(self.auxbc)[state.index_capa,:]
+        return out
+
+    def update_batch_cfl(self,s,dtdx):
+        r"""
+        Set member_cfl and the CFL object from the wave speeds s at the
+        interfaces of the batch view of qbc.
+        """
+        import numpy as np
+        num_waves = s.shape[0]
+        num_cells,batch_size = self.qbc.shape[1:]
+        speeds = np.zeros((num_waves,num_cells*batch_size))
+        speeds[:,:-1] = s
+        speeds = speeds.reshape((num_waves,num_cells,batch_size),order='F')
+        dtdx = dtdx.reshape((num_cells,batch_size),order='F')
+
+        LL = self.num_ghost - 1
+        UL = num_cells - self.num_ghost + 1
+        speeds = speeds[:,LL-1:UL-1,:]
+        cfl = np.maximum(dtdx[LL:UL,:]*speeds,-dtdx[LL-1:UL-1,:]*speeds)
+        self.member_cfl = cfl.max(axis=0).max(axis=0)
+        self.timings.start('cfl')
+        self.cfl.update_global_max(self.member_cfl.max())
+        self.timings.stop()
+
+    def evolve_to_time(self,solution,tend=None):
+        r"""
+        Evolve solution from solution.t to tend; see
+        :meth:`Solver.evolve_to_time`.  With dt_policy 'member', each member
+        takes its own steps.
+        """
+        if self.dt_policy != 'member':
+            return super(BatchedSolver,self).evolve_to_time(solution,tend)
+
+        import numpy as np
+
+        if not self._is_set_up:
+            self.setup(solution)
+        if tend is None:
+            raise ValueError, "dt_policy = 'member' requires an end time"
+        if self.cfl_desired > self.cfl_max:
+            raise Exception('Variable time-stepping and desired CFL > maximum CFL')
+
+        state = solution.state
+        if self.member_dt is None or len(self.member_dt) != state.batch_size:
+            self.member_dt = np.zeros(state.batch_size) + self.dt
+        t = np.zeros(state.batch_size) + solution.t
+        self._aux_bc_key = None
+        self._retake_step = False
+
+        self.status['cflmax'] = self.cfl.get_cached_max()
+        self.status['dtmin'] = self.member_dt.min()
+        self.status['dtmax'] = self.member_dt.max()
+        self.status['numsteps'] = 0
+
+        self.timings.start('evolve_to_time')
+        for n in xrange(self.max_steps):
+            remaining = tend - t
+            active = remaining > 0.
+            if not active.any():
+                break
+
+            # Members near tend take the rest of the way, as in
+            # Solver.evolve_to_time; those at tend do not move
+            steps = np.where(active,np.minimum(self.member_dt,remaining),0.)
+            last = active & (remaining - steps < 1.e-14)
+            steps[last] = remaining[last]
+            self._member_steps = steps
+            self.dt = steps.max()
+
+            q_backup = state.q.copy('F')
+            self.timings.start('step')
+            completed = self.step(solution) is not False
+            step_seconds = self.timings.stop()
+            cfl = self.member_cfl
+
+            if completed and cfl.max() <= self.cfl_max:
+                t[active] += steps[active]
+                t[last] = tend
+                solution.t = t.min()
+                self.status['cflmax'] = max(cfl.max(),self.status['cflmax'])
+                self.logger.debug("Step %i  CFL = %f   dt = %f   t = %f"
+                    % (n,cfl.max(),self.dt,solution.t))
+                self.status['numsteps'] += 1
+                self.timings.accept_step()
+                accepted = True
+                self._retake_step = False
+            else:
+                self.logger.debug("Rejecting time step, CFL number too large")
+                state.q = q_backup
+                accepted = False
+                self._retake_step = True
+                self.timings.reject_step(step_seconds)
+
+            # Choose the next step size of each member that moved
+            new_dt = self.dt_max*np.ones(state.batch_size)
+            moving = active & (cfl > 0.)
+            new_dt[moving] = np.minimum(self.dt_max,
+                                        steps[moving]*self.cfl_desired/cfl[moving])
+            self.member_dt[active] = new_dt[active]
+            self.status['dtmin'] = min(self.member_dt.min(),self.status['dtmin'])
+            self.status['dtmax'] = max(self.member_dt.max(),self.status['dtmax'])
+
+            if accepted and self.after_step is not None:
+                self.timings.start('after_step')
+                self.after_step(self,solution)
+                self.timings.stop()
+        self.timings.stop()
+
+        self._member_steps = None
+        self.dt = self.member_dt.min()
+        if (t < tend).any():
+            raise Exception("Maximum number of timesteps have been taken")
+        solution.t = tend
+
+        return self.status
+
 
 if __name__ == "__main__":
     import doctest
@@ -7,8 +7,13 @@ Module containing all Pyclaw solution objects
     David I. Ketcheson -- Initial version (June 2011)
 """
 
+import itertools
 import numpy as np
 
+# Versions of aux, taken by State.aux and State.mark_aux_changed; each
+# version is taken once, so that no two values of aux share one
+_aux_versions = itertools.count(1)
+
 class State(object):
     r"""
     A PyClaw State object contains the current state on a particular patch,
@@ -61,6 +66,16 @@ class State(object):
         if self.aux is not None: return self.aux.shape[0]
         else: return 0
 
+    @property
+    def aux(self):
+        r"""(ndarray(num_aux,...)) - Auxiliary coefficients.  Setting aux
+        counts as a change of its values (see :meth:`mark_aux_changed`)."""
+        return self._aux
+    @aux.setter
+    def aux(self,val):
+        self._aux = val
+        self.mark_aux_changed()
+
     @property
     def mp(self):
         r"""(int) - Number of derived quantities"""
@@ -122,6 +137,8 @@ class State(object):
         to ``True``"""
         
 
+        # Version of aux, replaced by mark_aux_changed
+        self._aux_version = 0
         self.q   = self.new_array(num_eqn)
         self.aux = self.new_array(num_aux)
 
@@ -256,6 +273,28 @@ class State(object):
             raise Exception("Assumption (1 <= num_dim <= 3) violated.")
 
         return auxbc
+
+    def mark_aux_changed(self):
+        r"""
+        Record that the values of aux were changed in place.
+
+        The solvers fill the ghost cells of aux again only when aux may have
+        changed (see :meth:`~pyclaw.solver.Solver.update_aux_bcs`): at the
+        start of each call of evolve_to_time, when aux is set, and at each
+        step if a before_step function or custom aux boundary conditions
+        are set.  Code that changes aux in place at other times during a
+        run, such as a step_source or after_step function, must call this
+        method.
+        """
+        self._aux_version = next(_aux_versions)
+
+    def start_ghost_exchange(self):
+        r"""
+        Start filling the ghost cells of q that belong to other processes;
+        the exchange is completed by get_qbc_from_q.  In PyClaw there is
+        nothing to exchange.
+        """
+        pass
         
 
     # ========== Copy functionality ==========================================
@@ -300,6 +339,94 @@ class State(object):
         """
         return self.aux.copy()
 
+
+def is_member_value(value,batch_size):
+    r"""
+    Whether the problem_data entry value of a :class:`BatchedState` gives a
+    value for each of its batch_size members.
+    """
+    return isinstance(value,(list,tuple,np.ndarray)) and np.ndim(value) == 1 \
+        and len(value) == batch_size
+
+class BatchedState(State):
+    r"""
+    A State holding a batch of independent problems on the same patch,
+    which differ in their initial data, aux arrays and problem_data.  It is
+    advanced by the batched solvers
+    (:class:`~pyclaw.classic.solver.BatchedClawSolver1D` and
+    :class:`~pyclaw.sharpclaw.solver.BatchedSharpClawSolver1D`).
+
+    The members are along the last axis of q and aux:
+
+        >>> from clawpack import pyclaw
+        >>> x = pyclaw.Dimension('x',0.,1.,100)
+        >>> state = pyclaw.BatchedState(pyclaw.Patch((x)),2,batch_size=8)
+        >>> state.q.shape
+        (2, 100, 8)
+
+    An entry of problem_data may be given for each member, as a list, tuple
+    or 1D array of length batch_size; the other entries are shared by all
+    members:
+
+        >>> state.problem_data['cc'] = [1.,2.,3.,4.,5.,6.,7.,8.]
+        >>> state.problem_data['zz'] = 1.
+        >>> state.member(2).problem_data['cc']
+        3.0
+
+    .. attribute:: batch_size
+
+        Number of members of the batch.
+    """
+    def __init__(self,geom,num_eqn,num_aux=0,batch_size=1):
+        self.batch_size = batch_size
+        super(BatchedState,self).__init__(geom,num_eqn,num_aux)
+
+    def __str__(self):
+        output = super(BatchedState,self).__str__()
+        return output + "\nBatch size: %i" % self.batch_size
+
+    def __deepcopy__(self,memo={}):
+        import copy
+        result = self.__class__(copy.deepcopy(self.patch),self.num_eqn,
+                                self.num_aux,self.batch_size)
+        result.t = self.t
+        result.index_capa = self.index_capa
+        result.q = copy.deepcopy(self.q)
+        if self.aux is not None:
+            result.aux = copy.deepcopy(self.aux)
+        result.problem_data = copy.deepcopy(self.problem_data)
+        return result
+
+    def new_array(self,dof):
+        if dof==0: return None
+        shape = [dof]
+        shape.extend(self.grid.num_cells)
+        shape.append(self.batch_size)
+        return np.empty(shape,order='F')
+
+    def member_problem_data(self,index):
+        r"""Return the problem_data of member index."""
+        problem_data = {}
+        for name,value in self.problem_data.iteritems():
+            if is_member_value(value,self.batch_size):
+                value = value[index]
+            problem_data[name] = value
+        return problem_data
+
+    def member(self,index):
+        r"""
+        Return a :class:`State` for member index of the batch.  Its q and aux
+        are views of those of the batch.
+        """
+        member = State(self.patch,self.num_eqn)
+        member.q = self.q[...,index]
+        if self.aux is not None:
+            member.aux = self.aux[...,index]
+        member.t = self.t
+        member.index_capa = self.index_capa
+        member.problem_data = self.member_problem_data(index)
+        return member
+
 if __name__ == "__main__":
     import doctest
     doctest.testmod()